@@ -0,0 +1,244 @@
+import logging
+import os
+from typing import Dict, List, Tuple
+
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+import psycopg2.extras
+
+from app.jobs import start_periodic_job, try_job_lock
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+BADGE_RECONCILE_INTERVAL_SEC = int(os.getenv("BADGE_RECONCILE_INTERVAL_SEC", "900"))
+BADGE_RECONCILE_CHUNK = max(100, int(os.getenv("BADGE_RECONCILE_CHUNK", "2000")))
+BADGE_RECONCILE_SINGLE_RETRIES = 3
+
+logger = logging.getLogger(__name__)
+
+
+def _db_conn():
+    if not DATABASE_URL:
+        return None
+    return psycopg2.connect(
+        DATABASE_URL,
+        connect_timeout=3,
+        cursor_factory=psycopg2.extras.RealDictCursor,
+    )
+
+
+def init_badge_counter_tables():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        # Okunmamış mesaj sayacı messages.send_message / record_read_advance içinde,
+        # bekleyen istek sayacı aşağıdaki trigger ile güncellenir.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mobile_badge_counters (
+                account_id INTEGER PRIMARY KEY,
+                unread_messages INTEGER NOT NULL DEFAULT 0,
+                pending_friend_requests INTEGER NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        conn.commit()
+        cur.execute(
+            """
+            CREATE OR REPLACE FUNCTION mobile_friend_request_badge() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.status = 'pending' THEN
+                    UPDATE mobile_badge_counters
+                    SET pending_friend_requests = GREATEST(0, pending_friend_requests - 1), updated_at = NOW()
+                    WHERE account_id = OLD.target_id;
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.status = 'pending' THEN
+                    INSERT INTO mobile_badge_counters (account_id, pending_friend_requests)
+                    VALUES (NEW.target_id, 1)
+                    ON CONFLICT (account_id) DO UPDATE
+                    SET pending_friend_requests = mobile_badge_counters.pending_friend_requests + 1,
+                        updated_at = NOW();
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        cur.execute(
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_mobile_friend_request_badge') THEN
+                    CREATE TRIGGER trg_mobile_friend_request_badge
+                    AFTER INSERT OR UPDATE OF status, target_id OR DELETE ON mobile_friend_requests
+                    FOR EACH ROW EXECUTE PROCEDURE mobile_friend_request_badge();
+                END IF;
+            END$$;
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def badge_counts(conn, account_id: int) -> Dict[str, int]:
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT unread_messages, pending_friend_requests
+        FROM mobile_badge_counters
+        WHERE account_id=%s
+        """,
+        (int(account_id),),
+    )
+    row = cur.fetchone() or {}
+    return {
+        "unread_messages": int(row.get("unread_messages") or 0),
+        "pending_friend_requests": int(row.get("pending_friend_requests") or 0),
+    }
+
+
+def _reconcile_chunk(cur, lo: int, hi: int) -> int:
+    # Gerçek değerler kaynak tablolardan hesaplanır; yalnızca farklı satırlar yazılır.
+    cur.execute(
+        """
+        WITH unread AS (
+            SELECT
+                LEAST(m.sender_account_id, m.receiver_account_id) AS lo,
+                GREATEST(m.sender_account_id, m.receiver_account_id) AS hi,
+                m.receiver_account_id AS reader,
+                COUNT(*)::INTEGER AS n
+            FROM mobile_direct_messages m
+            LEFT JOIN mobile_message_read_state rs
+              ON rs.account_id=m.receiver_account_id
+             AND rs.peer_account_id=m.sender_account_id
+            WHERE m.receiver_account_id >= %(lo)s AND m.receiver_account_id < %(hi)s
+              AND m.sender_account_id <> m.receiver_account_id
+              AND m.id > COALESCE(rs.last_read_message_id, 0)
+            GROUP BY 1, 2, 3
+        ),
+        conv_a AS (
+            UPDATE mobile_conversations c
+            SET unread_a = t.n
+            FROM (
+                SELECT c2.user_a_id, c2.user_b_id, COALESCE(u.n, 0) AS n
+                FROM mobile_conversations c2
+                LEFT JOIN unread u ON u.lo=c2.user_a_id AND u.hi=c2.user_b_id AND u.reader=c2.user_a_id
+                WHERE c2.user_a_id >= %(lo)s AND c2.user_a_id < %(hi)s
+            ) t
+            WHERE c.user_a_id=t.user_a_id AND c.user_b_id=t.user_b_id AND c.unread_a <> t.n
+        ),
+        conv_b AS (
+            UPDATE mobile_conversations c
+            SET unread_b = t.n
+            FROM (
+                SELECT c2.user_a_id, c2.user_b_id, COALESCE(u.n, 0) AS n
+                FROM mobile_conversations c2
+                LEFT JOIN unread u ON u.lo=c2.user_a_id AND u.hi=c2.user_b_id AND u.reader=c2.user_b_id
+                WHERE c2.user_b_id >= %(lo)s AND c2.user_b_id < %(hi)s
+            ) t
+            WHERE c.user_a_id=t.user_a_id AND c.user_b_id=t.user_b_id AND c.unread_b <> t.n
+        ),
+        pending AS (
+            SELECT target_id AS account_id, COUNT(*)::INTEGER AS n
+            FROM mobile_friend_requests
+            WHERE target_id >= %(lo)s AND target_id < %(hi)s AND status='pending'
+            GROUP BY target_id
+        ),
+        truth AS (
+            SELECT a.id AS account_id,
+                   COALESCE((SELECT SUM(u.n) FROM unread u WHERE u.reader=a.id), 0)::INTEGER AS unread_messages,
+                   COALESCE(p.n, 0) AS pending_friend_requests
+            FROM accounts a
+            LEFT JOIN pending p ON p.account_id=a.id
+            WHERE a.id >= %(lo)s AND a.id < %(hi)s
+        )
+        INSERT INTO mobile_badge_counters AS bc (account_id, unread_messages, pending_friend_requests)
+        SELECT account_id, unread_messages, pending_friend_requests FROM truth
+        ON CONFLICT (account_id) DO UPDATE
+        SET unread_messages = EXCLUDED.unread_messages,
+            pending_friend_requests = EXCLUDED.pending_friend_requests,
+            updated_at = NOW()
+        WHERE bc.unread_messages <> EXCLUDED.unread_messages
+           OR bc.pending_friend_requests <> EXCLUDED.pending_friend_requests
+        """,
+        {"lo": int(lo), "hi": int(hi)},
+    )
+    return cur.rowcount or 0
+
+
+def _reconcile_range(work, wcur, lo: int, hi: int, skipped: List[Tuple[int, int]]) -> int:
+    # Eşzamanlı güncelleme olan aralık ikiye bölünerek tekrar denenir; tek hesapta
+    # birkaç deneme sonra atlanır ve bir sonraki turda yeniden ele alınır.
+    attempts = 1 if hi - lo > 1 else BADGE_RECONCILE_SINGLE_RETRIES
+    for _ in range(attempts):
+        try:
+            repaired = _reconcile_chunk(wcur, lo, hi)
+            work.commit()
+            return repaired
+        except psycopg2.errors.SerializationFailure:
+            work.rollback()
+    if hi - lo <= 1:
+        skipped.append((lo, hi))
+        return 0
+    mid = (lo + hi) // 2
+    return _reconcile_range(work, wcur, lo, mid, skipped) + _reconcile_range(work, wcur, mid, hi, skipped)
+
+
+def reconcile_badge_counters(conn) -> int:
+    """
+    Sayaçları kaynak tablolarla karşılaştırıp kaymaları düzeltir. Her hesap aralığı
+    ayrı REPEATABLE READ transaction'ında işlenir; aynı anda güncellenen satır varsa
+    eski değerle üzerine yazılmaz, aralık küçültülerek tekrar denenir.
+    """
+    cur = conn.cursor()
+    if not try_job_lock(cur, "mobile_badge_reconcile"):
+        conn.rollback()
+        return 0
+    cur.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM accounts")
+    max_id = int((cur.fetchone() or {}).get("max_id") or 0)
+
+    # Job kilidi conn'un transaction'ına bağlı ve iş bitene kadar açık kalır;
+    # aralıklar ayrı bağlantıda işlenir.
+    repaired = 0
+    skipped: List[Tuple[int, int]] = []
+    work = _db_conn()
+    try:
+        work.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+        wcur = work.cursor()
+        lo = 0
+        while lo <= max_id:
+            hi = lo + BADGE_RECONCILE_CHUNK
+            repaired += _reconcile_range(work, wcur, lo, hi, skipped)
+            lo = hi
+    finally:
+        work.close()
+        conn.rollback()
+    if skipped:
+        logger.warning(
+            "badge reconcile: %d hesap eşzamanlı güncelleme nedeniyle atlandı: %s",
+            len(skipped),
+            ",".join(str(lo) for lo, _ in skipped[:50]),
+        )
+    return repaired
+
+
+def _reconcile_job():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        reconcile_badge_counters(conn)
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def start_badge_reconcile_job():
+    start_periodic_job("mobile_badge_reconcile", BADGE_RECONCILE_INTERVAL_SEC, _reconcile_job)
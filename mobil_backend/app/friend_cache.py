@@ -0,0 +1,200 @@
+import os
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from typing import Dict, Optional, Set
+
+import psycopg2
+import psycopg2.extras
+
+from app import pg_listener
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+FRIEND_CACHE_ACCOUNTS = int(os.getenv("FRIEND_CACHE_ACCOUNTS", "20000"))
+# Destek hesabı herkesle arkadaş; bu sınırın üstündeki listeler önbelleğe alınmaz.
+FRIEND_CACHE_MAX_IDS = int(os.getenv("FRIEND_CACHE_MAX_IDS", "50000"))
+FRIENDSHIP_CHANNEL = "mobile_friendship_changed"
+
+_CACHE: "OrderedDict[int, array]" = OrderedDict()
+_EPOCH: Dict[int, int] = {}
+# _EPOCH her sıfırlandığında artar; yükleme (nesil, epoch) çiftini karşılaştırır.
+_GEN = {"value": 0}
+# Sınırı aşan hesaplar her seferinde yeniden yüklenmeye çalışılmasın.
+_TOO_LARGE: Set[int] = set()
+_LOCK = threading.Lock()
+
+
+def _db_conn():
+    if not DATABASE_URL:
+        return None
+    return psycopg2.connect(
+        DATABASE_URL,
+        connect_timeout=3,
+        cursor_factory=psycopg2.extras.RealDictCursor,
+    )
+
+
+def _set_has(ids: array, x: int) -> bool:
+    i = bisect_left(ids, x)
+    return i < len(ids) and ids[i] == x
+
+
+def _set_put(ids: array, x: int, present: bool):
+    i = bisect_left(ids, x)
+    found = i < len(ids) and ids[i] == x
+    if present and not found:
+        insort(ids, x)
+    elif not present and found:
+        del ids[i]
+
+
+def apply_friendship_change(a: int, b: int, friends: bool):
+    with _LOCK:
+        for owner, other in ((int(a), int(b)), (int(b), int(a))):
+            _EPOCH[owner] = _EPOCH.get(owner, 0) + 1
+            ids = _CACHE.get(owner)
+            if ids is not None:
+                _set_put(ids, other, friends)
+        if len(_EPOCH) > 100000:
+            _EPOCH.clear()
+            _GEN["value"] += 1
+
+
+def _clear():
+    with _LOCK:
+        _CACHE.clear()
+        _EPOCH.clear()
+        _GEN["value"] += 1
+        _TOO_LARGE.clear()
+
+
+def _on_friendship_changed(payload: str):
+    if payload == "*":
+        _clear()
+        return
+    op, _, pair = (payload or "").partition(":")
+    a, _, b = pair.partition(":")
+    if op not in {"+", "-"} or not a.isdigit() or not b.isdigit():
+        return
+    apply_friendship_change(int(a), int(b), op == "+")
+
+
+def init_friend_cache():
+    conn = _db_conn()
+    if conn:
+        try:
+            cur = conn.cursor()
+            # Toplu eklemelerde (varsayılan arkadaşlıklar) tek tek yerine tek "*" bildirimi gider.
+            for op, table in (("+", "mobile_friendship_new_rows"), ("-", "mobile_friendship_old_rows")):
+                fn = "mobile_friendship_notify_ins" if op == "+" else "mobile_friendship_notify_del"
+                cur.execute(
+                    f"""
+                    CREATE OR REPLACE FUNCTION {fn}() RETURNS trigger AS $$
+                    BEGIN
+                        IF (SELECT COUNT(*) FROM {table}) > 500 THEN
+                            PERFORM pg_notify('{FRIENDSHIP_CHANNEL}', '*');
+                        ELSE
+                            PERFORM pg_notify('{FRIENDSHIP_CHANNEL}', '{op}:' || r.user_a_id::text || ':' || r.user_b_id::text)
+                            FROM {table} r;
+                        END IF;
+                        RETURN NULL;
+                    END;
+                    $$ LANGUAGE plpgsql
+                    """
+                )
+            cur.execute(
+                """
+                DO $$
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_mobile_friendship_notify_ins') THEN
+                        CREATE TRIGGER trg_mobile_friendship_notify_ins
+                        AFTER INSERT ON mobile_friendships
+                        REFERENCING NEW TABLE AS mobile_friendship_new_rows
+                        FOR EACH STATEMENT EXECUTE PROCEDURE mobile_friendship_notify_ins();
+                    END IF;
+                    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_mobile_friendship_notify_del') THEN
+                        CREATE TRIGGER trg_mobile_friendship_notify_del
+                        AFTER DELETE ON mobile_friendships
+                        REFERENCING OLD TABLE AS mobile_friendship_old_rows
+                        FOR EACH STATEMENT EXECUTE PROCEDURE mobile_friendship_notify_del();
+                    END IF;
+                END$$;
+                """
+            )
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        finally:
+            conn.close()
+    if FRIEND_CACHE_ACCOUNTS > 0:
+        pg_listener.subscribe(FRIENDSHIP_CHANNEL, _on_friendship_changed, on_reset=_clear)
+
+
+def _cache_ready() -> bool:
+    # Listener bağlı değilken değişiklik kaçabilir; doğrudan DB'ye gidilir.
+    return FRIEND_CACHE_ACCOUNTS > 0 and pg_listener.is_connected()
+
+
+def friend_ids(conn, account_id: int) -> Optional[array]:
+    """Hesabın arkadaş id'leri (sıralı int64 dizi); önbelleğe alınamıyorsa None."""
+    if not _cache_ready():
+        return None
+    aid = int(account_id)
+    with _LOCK:
+        cached = _CACHE.get(aid)
+        if cached is not None:
+            _CACHE.move_to_end(aid)
+            return cached
+        if aid in _TOO_LARGE:
+            return None
+        epoch = (_GEN["value"], _EPOCH.get(aid, 0))
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT friend_id AS peer_id
+        FROM mobile_friend_edges
+        WHERE account_id=%s
+        ORDER BY friend_id
+        LIMIT %s
+        """,
+        (aid, FRIEND_CACHE_MAX_IDS + 1),
+    )
+    rows = cur.fetchall() or []
+    if len(rows) > FRIEND_CACHE_MAX_IDS:
+        with _LOCK:
+            if len(_TOO_LARGE) < 1000:
+                _TOO_LARGE.add(aid)
+        return None
+    ids = array("q", (int(r["peer_id"]) for r in rows))
+    with _LOCK:
+        # Yükleme sırasında değişiklik geldiyse eski listeyi saklama.
+        if (_GEN["value"], _EPOCH.get(aid, 0)) != epoch:
+            return ids
+        _CACHE[aid] = ids
+        _CACHE.move_to_end(aid)
+        while len(_CACHE) > FRIEND_CACHE_ACCOUNTS:
+            _CACHE.popitem(last=False)
+    return ids
+
+
+def is_friend(conn, a: int, b: int) -> bool:
+    a, b = int(a), int(b)
+    if _cache_ready():
+        with _LOCK:
+            for owner, other in ((a, b), (b, a)):
+                ids = _CACHE.get(owner)
+                if ids is not None:
+                    _CACHE.move_to_end(owner)
+                    return _set_has(ids, other)
+        for owner, other in ((a, b), (b, a)):
+            ids = friend_ids(conn, owner)
+            if ids is not None:
+                return _set_has(ids, other)
+    x, y = (a, b) if a < b else (b, a)
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT 1 FROM mobile_friendships WHERE user_a_id=%s AND user_b_id=%s LIMIT 1",
+        (x, y),
+    )
+    return bool(cur.fetchone())
@@ -0,0 +1,154 @@
+import os
+
+import psycopg2
+import psycopg2.extras
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+
+# mobile_friendships (user_a_id < user_b_id) satırının iki yönü; hesap bazlı
+# arkadaş listesi/sayısı tek indeks aralığı taramasıyla okunur.
+_SYNC_FUNCTIONS = {
+    "mobile_friend_edges_ins": """
+        INSERT INTO mobile_friend_edges (account_id, friend_id, created_at)
+        SELECT user_a_id, user_b_id, created_at_ts FROM mobile_friend_edges_new
+        UNION ALL
+        SELECT user_b_id, user_a_id, created_at_ts FROM mobile_friend_edges_new
+        ON CONFLICT (account_id, friend_id) DO UPDATE SET created_at = EXCLUDED.created_at;
+    """,
+    "mobile_friend_edges_del": """
+        DELETE FROM mobile_friend_edges e USING mobile_friend_edges_old r
+        WHERE e.account_id = r.user_a_id AND e.friend_id = r.user_b_id;
+        DELETE FROM mobile_friend_edges e USING mobile_friend_edges_old r
+        WHERE e.account_id = r.user_b_id AND e.friend_id = r.user_a_id;
+    """,
+    "mobile_friend_edges_upd": """
+        DELETE FROM mobile_friend_edges e USING mobile_friend_edges_old r
+        WHERE e.account_id = r.user_a_id AND e.friend_id = r.user_b_id;
+        DELETE FROM mobile_friend_edges e USING mobile_friend_edges_old r
+        WHERE e.account_id = r.user_b_id AND e.friend_id = r.user_a_id;
+        INSERT INTO mobile_friend_edges (account_id, friend_id, created_at)
+        SELECT user_a_id, user_b_id, created_at_ts FROM mobile_friend_edges_new
+        UNION ALL
+        SELECT user_b_id, user_a_id, created_at_ts FROM mobile_friend_edges_new
+        ON CONFLICT (account_id, friend_id) DO UPDATE SET created_at = EXCLUDED.created_at;
+    """,
+}
+
+_TRIGGERS = [
+    (
+        "trg_mobile_friend_edges_ins",
+        "AFTER INSERT ON mobile_friendships REFERENCING NEW TABLE AS mobile_friend_edges_new",
+        "mobile_friend_edges_ins",
+    ),
+    (
+        "trg_mobile_friend_edges_del",
+        "AFTER DELETE ON mobile_friendships REFERENCING OLD TABLE AS mobile_friend_edges_old",
+        "mobile_friend_edges_del",
+    ),
+    (
+        "trg_mobile_friend_edges_upd",
+        "AFTER UPDATE ON mobile_friendships "
+        "REFERENCING OLD TABLE AS mobile_friend_edges_old NEW TABLE AS mobile_friend_edges_new",
+        "mobile_friend_edges_upd",
+    ),
+]
+
+
+def _db_conn():
+    if not DATABASE_URL:
+        return None
+    return psycopg2.connect(
+        DATABASE_URL,
+        connect_timeout=3,
+        cursor_factory=psycopg2.extras.RealDictCursor,
+    )
+
+
+def init_friend_edges():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mobile_friend_edges (
+                account_id INTEGER NOT NULL,
+                friend_id INTEGER NOT NULL,
+                created_at TIMESTAMPTZ,
+                PRIMARY KEY (account_id, friend_id)
+            )
+            """
+        )
+        # Eski sürüm tarihi olmayan arkadaşlıklara NOW() yazıyordu; onlar NULL'a çekilir.
+        cur.execute(
+            """
+            SELECT is_nullable FROM information_schema.columns
+            WHERE table_name='mobile_friend_edges' AND column_name='created_at'
+            """
+        )
+        if (cur.fetchone() or {}).get("is_nullable") == "NO":
+            cur.execute("ALTER TABLE mobile_friend_edges ALTER COLUMN created_at DROP NOT NULL")
+            cur.execute(
+                """
+                UPDATE mobile_friend_edges e
+                SET created_at = COALESCE(mf.created_at_ts, mobile_parse_ts(mf.created_at))
+                FROM mobile_friendships mf
+                WHERE mf.user_a_id = LEAST(e.account_id, e.friend_id)
+                  AND mf.user_b_id = GREATEST(e.account_id, e.friend_id)
+                  AND e.created_at IS DISTINCT FROM COALESCE(mf.created_at_ts, mobile_parse_ts(mf.created_at))
+                """
+            )
+        # Arkadaş listesi: en yeni arkadaşlık önce, tarihi bilinmeyenler sonda.
+        cur.execute("DROP INDEX IF EXISTS idx_mobile_friend_edges_account_created")
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_mobile_friend_edges_account_since
+            ON mobile_friend_edges (account_id, created_at DESC NULLS LAST, friend_id DESC)
+            """
+        )
+        for fn, body in _SYNC_FUNCTIONS.items():
+            cur.execute(
+                f"""
+                CREATE OR REPLACE FUNCTION {fn}() RETURNS trigger AS $$
+                BEGIN
+                    {body}
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+                """
+            )
+        conn.commit()
+
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+        cur.execute(
+            "SELECT tgname FROM pg_trigger WHERE tgrelid=to_regclass('mobile_friendships') AND tgname = ANY(%s)",
+            ([name for name, _, _ in _TRIGGERS],),
+        )
+        existing = {r["tgname"] for r in cur.fetchall() or []}
+        if all(name in existing for name, _, _ in _TRIGGERS):
+            conn.rollback()
+            return
+        for name, when, fn in _TRIGGERS:
+            if name not in existing:
+                cur.execute(f"CREATE TRIGGER {name} {when} FOR EACH STATEMENT EXECUTE PROCEDURE {fn}()")
+        # Trigger'lar aynı transaction'da kurulduğu için arada kaçan yazma olmaz
+        # (CREATE TRIGGER tabloya yazmayı commit'e kadar bekletir).
+        cur.execute(
+            """
+            INSERT INTO mobile_friend_edges (account_id, friend_id, created_at)
+            SELECT f.account_id, f.friend_id, f.created_at
+            FROM mobile_friendships mf
+            CROSS JOIN LATERAL (
+                VALUES
+                    (mf.user_a_id, mf.user_b_id, COALESCE(mf.created_at_ts, mobile_parse_ts(mf.created_at))),
+                    (mf.user_b_id, mf.user_a_id, COALESCE(mf.created_at_ts, mobile_parse_ts(mf.created_at)))
+            ) AS f(account_id, friend_id, created_at)
+            ON CONFLICT (account_id, friend_id) DO NOTHING
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
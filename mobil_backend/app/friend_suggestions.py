@@ -0,0 +1,247 @@
+import os
+from typing import List
+
+import psycopg2
+import psycopg2.extras
+
+from app.jobs import start_periodic_job, try_job_lock
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+FRIEND_SUGGESTION_INTERVAL_SEC = int(os.getenv("FRIEND_SUGGESTION_INTERVAL_SEC", "300"))
+FRIEND_SUGGESTION_TOP_N = max(1, int(os.getenv("FRIEND_SUGGESTION_TOP_N", "30")))
+# Bu sayıdan fazla arkadaşı olan hesaplar (destek hesabı vb.) ortak arkadaş sayılmaz.
+FRIEND_SUGGESTION_HUB_DEGREE = max(10, int(os.getenv("FRIEND_SUGGESTION_HUB_DEGREE", "1000")))
+FRIEND_SUGGESTION_BATCH = max(10, int(os.getenv("FRIEND_SUGGESTION_BATCH", "200")))
+FRIEND_SUGGESTION_MAX_BATCHES = 50
+
+# Hesabın arkadaş sayısı hub sınırını aşmıyor mu; en fazla sınır+1 indeks girdisi okunur.
+_NOT_HUB = """
+    (SELECT COUNT(*) FROM (
+        SELECT 1 FROM mobile_friend_edges hd WHERE hd.account_id = {col} LIMIT %(hub)s + 1
+    ) h) <= %(hub)s
+"""
+
+
+def _db_conn():
+    if not DATABASE_URL:
+        return None
+    return psycopg2.connect(
+        DATABASE_URL,
+        connect_timeout=3,
+        cursor_factory=psycopg2.extras.RealDictCursor,
+    )
+
+
+def init_friend_suggestion_tables():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT to_regclass('mobile_friend_suggestion_dirty') IS NOT NULL AS present")
+        first_run = not (cur.fetchone() or {}).get("present")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mobile_friend_suggestions (
+                account_id INTEGER NOT NULL,
+                suggested_id INTEGER NOT NULL,
+                mutual_count INTEGER NOT NULL,
+                computed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (account_id, suggested_id)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_mobile_friend_suggestions_rank
+            ON mobile_friend_suggestions (account_id, mutual_count DESC, suggested_id)
+            """
+        )
+        # expand=TRUE: hesabın kendi arkadaşlığı değişti, (hub olmayan) arkadaşlarının
+        # önerileri de etkilenir; iş bunları expand=FALSE olarak kuyruğa ekler.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mobile_friend_suggestion_dirty (
+                account_id INTEGER PRIMARY KEY,
+                expand BOOLEAN NOT NULL DEFAULT FALSE,
+                marked_at TIMESTAMPTZ NOT NULL DEFAULT clock_timestamp()
+            )
+            """
+        )
+        for fn, table in (
+            ("mobile_friend_suggestion_mark_ins", "mobile_friend_edges_added"),
+            ("mobile_friend_suggestion_mark_del", "mobile_friend_edges_removed"),
+        ):
+            cur.execute(
+                f"""
+                CREATE OR REPLACE FUNCTION {fn}() RETURNS trigger AS $$
+                BEGIN
+                    INSERT INTO mobile_friend_suggestion_dirty (account_id, expand, marked_at)
+                    SELECT DISTINCT account_id, TRUE, clock_timestamp() FROM {table}
+                    ON CONFLICT (account_id) DO UPDATE
+                    SET expand = TRUE, marked_at = EXCLUDED.marked_at;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+                """
+            )
+        cur.execute(
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_mobile_friend_suggestion_mark_ins') THEN
+                    CREATE TRIGGER trg_mobile_friend_suggestion_mark_ins
+                    AFTER INSERT ON mobile_friend_edges
+                    REFERENCING NEW TABLE AS mobile_friend_edges_added
+                    FOR EACH STATEMENT EXECUTE PROCEDURE mobile_friend_suggestion_mark_ins();
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_mobile_friend_suggestion_mark_del') THEN
+                    CREATE TRIGGER trg_mobile_friend_suggestion_mark_del
+                    AFTER DELETE ON mobile_friend_edges
+                    REFERENCING OLD TABLE AS mobile_friend_edges_removed
+                    FOR EACH STATEMENT EXECUTE PROCEDURE mobile_friend_suggestion_mark_del();
+                END IF;
+            END$$;
+            """
+        )
+        if first_run:
+            # İlk kurulumda herkes bir kez hesaplanır.
+            cur.execute(
+                """
+                INSERT INTO mobile_friend_suggestion_dirty (account_id)
+                SELECT DISTINCT account_id FROM mobile_friend_edges
+                ON CONFLICT (account_id) DO NOTHING
+                """
+            )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def _expand_dirty(cur, account_ids: List[int]):
+    if not account_ids:
+        return
+    cur.execute(
+        f"""
+        INSERT INTO mobile_friend_suggestion_dirty (account_id, expand, marked_at)
+        SELECT DISTINCT e.friend_id, FALSE, clock_timestamp()
+        FROM unnest(%(ids)s::int[]) AS x(account_id)
+        JOIN mobile_friend_edges e ON e.account_id = x.account_id
+        WHERE {_NOT_HUB.format(col="x.account_id")}
+        ON CONFLICT (account_id) DO NOTHING
+        """,
+        {"ids": account_ids, "hub": FRIEND_SUGGESTION_HUB_DEGREE},
+    )
+
+
+def _recompute(cur, account_ids: List[int]):
+    cur.execute(
+        "DELETE FROM mobile_friend_suggestions WHERE account_id = ANY(%s)",
+        (account_ids,),
+    )
+    cur.execute(
+        f"""
+        WITH targets AS (
+            SELECT t.account_id
+            FROM unnest(%(ids)s::int[]) AS t(account_id)
+            WHERE {_NOT_HUB.format(col="t.account_id")}
+        ),
+        cand AS (
+            SELECT t.account_id, f2.friend_id AS suggested_id, COUNT(*)::INTEGER AS mutual_count
+            FROM targets t
+            JOIN mobile_friend_edges f1 ON f1.account_id = t.account_id
+            JOIN mobile_friend_edges f2 ON f2.account_id = f1.friend_id
+            WHERE {_NOT_HUB.format(col="f1.friend_id")}
+              AND f2.friend_id <> t.account_id
+              AND NOT EXISTS (
+                  SELECT 1 FROM mobile_friend_edges e
+                  WHERE e.account_id = t.account_id AND e.friend_id = f2.friend_id
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM mobile_friend_requests r
+                  WHERE r.status = 'pending'
+                    AND ((r.requester_id = t.account_id AND r.target_id = f2.friend_id)
+                      OR (r.requester_id = f2.friend_id AND r.target_id = t.account_id))
+              )
+            GROUP BY t.account_id, f2.friend_id
+        ),
+        ranked AS (
+            SELECT c.*, ROW_NUMBER() OVER (
+                PARTITION BY c.account_id ORDER BY c.mutual_count DESC, c.suggested_id
+            ) AS rn
+            FROM cand c
+            JOIN accounts a ON a.id = c.suggested_id AND COALESCE(a.is_active, 1) = 1
+        )
+        INSERT INTO mobile_friend_suggestions (account_id, suggested_id, mutual_count)
+        SELECT account_id, suggested_id, mutual_count FROM ranked WHERE rn <= %(top)s
+        """,
+        {"ids": account_ids, "hub": FRIEND_SUGGESTION_HUB_DEGREE, "top": FRIEND_SUGGESTION_TOP_N},
+    )
+
+
+def refresh_friend_suggestions(conn) -> int:
+    """
+    Arkadaşlık grafiği değişen hesapların önerilerini yeniden hesaplar. İşlenen kuyruk
+    satırı, bu sırada tekrar işaretlenmediyse (marked_at aynıysa) silinir.
+    """
+    cur = conn.cursor()
+    if not try_job_lock(cur, "mobile_friend_suggestions"):
+        conn.rollback()
+        return 0
+
+    # Job kilidi conn'un transaction'ında açık kalır; parçalar ayrı bağlantıda işlenir.
+    refreshed = 0
+    work = _db_conn()
+    try:
+        wcur = work.cursor()
+        for _ in range(FRIEND_SUGGESTION_MAX_BATCHES):
+            wcur.execute(
+                """
+                SELECT account_id, expand, marked_at
+                FROM mobile_friend_suggestion_dirty
+                ORDER BY marked_at
+                LIMIT %s
+                """,
+                (FRIEND_SUGGESTION_BATCH,),
+            )
+            rows = wcur.fetchall() or []
+            if not rows:
+                break
+            ids = [int(r["account_id"]) for r in rows]
+            _expand_dirty(wcur, [int(r["account_id"]) for r in rows if r["expand"]])
+            _recompute(wcur, ids)
+            wcur.execute(
+                """
+                DELETE FROM mobile_friend_suggestion_dirty d
+                USING unnest(%s::int[], %s::timestamptz[]) AS t(account_id, marked_at)
+                WHERE d.account_id = t.account_id AND d.marked_at = t.marked_at
+                """,
+                (ids, [r["marked_at"] for r in rows]),
+            )
+            work.commit()
+            refreshed += len(ids)
+    except Exception:
+        work.rollback()
+        raise
+    finally:
+        work.close()
+        conn.rollback()
+    return refreshed
+
+
+def _refresh_job():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        refresh_friend_suggestions(conn)
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def start_friend_suggestion_job():
+    start_periodic_job("mobile_friend_suggestions", FRIEND_SUGGESTION_INTERVAL_SEC, _refresh_job)
@@ -0,0 +1,37 @@
+import random
+import threading
+import time
+from typing import Callable, Dict
+
+_STARTED: Dict[str, threading.Thread] = {}
+_STARTED_LOCK = threading.Lock()
+
+
+def try_job_lock(cur, name: str) -> bool:
+    # Aynı işi birden fazla uvicorn worker'ın aynı anda çalıştırmaması için;
+    # kilit transaction bitince kendiliğinden bırakılır.
+    cur.execute("SELECT pg_try_advisory_xact_lock(hashtext(%s)) AS locked", (name,))
+    row = cur.fetchone() or {}
+    return bool(row.get("locked"))
+
+
+def start_periodic_job(name: str, interval_sec: float, fn: Callable[[], None]):
+    if interval_sec <= 0:
+        return
+    with _STARTED_LOCK:
+        if name in _STARTED:
+            return
+
+        def _loop():
+            # Worker'lar aynı anda başlamasın.
+            time.sleep(random.uniform(0, min(interval_sec, 5.0)))
+            while True:
+                try:
+                    fn()
+                except Exception:
+                    pass
+                time.sleep(interval_sec)
+
+        t = threading.Thread(target=_loop, name=f"job-{name}", daemon=True)
+        _STARTED[name] = t
+        t.start()
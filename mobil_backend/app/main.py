@@ -1,6 +1,14 @@
 from fastapi import FastAPI
 
+from app.badge_counters import init_badge_counter_tables, start_badge_reconcile_job
+from app.friend_cache import init_friend_cache
+from app.friend_edges import init_friend_edges
+from app.friend_suggestions import init_friend_suggestion_tables, start_friend_suggestion_job
+from app.message_partitions import init_message_partitioning, start_message_partition_job
+from app.reaction_shards import init_reaction_shard_tables, start_reaction_shard_jobs
 from app.schemas import MobileMenuResponse
+from app.timestamp_columns import init_timestamp_columns, start_timestamp_backfill_job
+from app.routers.broadcasts import admin_router as admin_messages_router, init_broadcast_tables, start_broadcast_job
 from app.routers.discover import init_news_reaction_table, router as discover_router
 from app.routers.auth import ensure_default_friendships_for_all_users, router as auth_router
 from app.routers.events import (
@@ -8,9 +16,27 @@ from app.routers.events import (
     init_event_submission_tables,
     router as events_router,
 )
-from app.routers.photos import init_photo_reaction_tables, router as photos_router
-from app.routers.messages import init_message_read_state_table, router as messages_router
-from app.routers.profile import init_profile_settings_table, router as profile_router
+from app.routers.photos import (
+    init_album_stats_table,
+    init_photo_like_cache,
+    init_photo_reaction_tables,
+    init_photo_zip_tables,
+    init_trending_tables,
+    router as photos_router,
+    start_album_stats_reconcile_job,
+    start_photo_trending_job,
+)
+from app.routers.messages import (
+    init_conversation_table,
+    init_message_indexes,
+    init_message_read_state_table,
+    init_message_realtime,
+    router as messages_router,
+    start_message_index_job,
+    start_read_state_flush,
+)
+from app.routers.profile import init_notification_stream, init_profile_settings_table, router as profile_router
+from app.routers.realtime import init_realtime_gateway, router as realtime_router
 
 app = FastAPI(title="Mobil Backend")
 
@@ -20,9 +46,36 @@ def on_startup():
     init_event_submission_tables()
     init_news_reaction_table()
     init_photo_reaction_tables()
+    init_album_stats_table()
+    init_photo_zip_tables()
+    init_reaction_shard_tables()
+    init_trending_tables()
     init_profile_settings_table()
     init_message_read_state_table()
+    init_message_partitioning()
+    init_timestamp_columns()
+    init_friend_edges()
+    init_friend_suggestion_tables()
+    init_message_indexes()
+    init_conversation_table()
+    init_badge_counter_tables()
+    init_broadcast_tables()
+    init_message_realtime()
+    init_realtime_gateway()
+    init_notification_stream()
+    init_friend_cache()
     ensure_default_friendships_for_all_users()
+    start_reaction_shard_jobs()
+    start_badge_reconcile_job()
+    start_broadcast_job()
+    start_message_partition_job()
+    start_read_state_flush()
+    start_message_index_job()
+    start_timestamp_backfill_job()
+    start_friend_suggestion_job()
+    init_photo_like_cache()
+    start_photo_trending_job()
+    start_album_stats_reconcile_job()
 
 
 @app.get("/health")
@@ -49,4 +102,6 @@ app.include_router(events_router)
 app.include_router(admin_events_router)
 app.include_router(photos_router)
 app.include_router(messages_router)
+app.include_router(admin_messages_router)
 app.include_router(profile_router)
+app.include_router(realtime_router)
@@ -0,0 +1,384 @@
+import logging
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import psycopg2
+import psycopg2.extras
+
+from app.jobs import start_periodic_job, try_job_lock
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+# Mevcut tabloyu bölümlü tabloya çevirmek kısa bir ACCESS EXCLUSIVE kilidi ister; açıkça açılır.
+MESSAGE_PARTITIONING_ENABLED = os.getenv("MESSAGE_PARTITIONING_ENABLED", "0").strip().lower() in {"1", "true", "yes", "on"}
+MESSAGE_PARTITION_ID_SPAN = max(10000, int(os.getenv("MESSAGE_PARTITION_ID_SPAN", "1000000")))
+MESSAGE_ARCHIVE_AFTER_DAYS = int(os.getenv("MESSAGE_ARCHIVE_AFTER_DAYS", "365"))
+MESSAGE_PARTITION_JOB_INTERVAL_SEC = int(os.getenv("MESSAGE_PARTITION_JOB_INTERVAL_SEC", "600"))
+MESSAGE_ARCHIVE_SCHEMA = "mobile_archive"
+_PARENT = "mobile_direct_messages"
+# Bölümlü tabloya taşınırken eski tablodaki adları serbest bırakılan indeksler.
+_MOVED_INDEXES = (
+    "idx_mobile_dm_pair_id",
+    "idx_mobile_dm_receiver_sender_id",
+    "idx_mobile_dm_body_fts",
+    "idx_mobile_dm_body_trgm",
+)
+
+logger = logging.getLogger(__name__)
+
+_FLOOR_CACHE: Dict[str, Any] = {"at": 0.0, "floor": None}
+_FLOOR_CACHE_TTL_SEC = 60.0
+
+
+def _db_conn():
+    if not DATABASE_URL:
+        return None
+    return psycopg2.connect(
+        DATABASE_URL,
+        connect_timeout=3,
+        cursor_factory=psycopg2.extras.RealDictCursor,
+    )
+
+
+def messages_partitioned(cur) -> bool:
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (_PARENT,))
+    row = cur.fetchone() or {}
+    return row.get("relkind") == "p"
+
+
+def _partition_name(lo_id: int) -> str:
+    return f"{_PARENT}_p{int(lo_id) // MESSAGE_PARTITION_ID_SPAN}"
+
+
+def _ensure_meta(cur):
+    cur.execute(f"CREATE SCHEMA IF NOT EXISTS {MESSAGE_ARCHIVE_SCHEMA}")
+    cur.execute(
+        """
+        CREATE TABLE IF NOT EXISTS mobile_message_partitions (
+            name TEXT PRIMARY KEY,
+            lo_id BIGINT NOT NULL,
+            hi_id BIGINT NOT NULL,
+            schema_name TEXT NOT NULL DEFAULT 'public',
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            archived_at TIMESTAMPTZ
+        )
+        """
+    )
+
+
+def _migrate_to_partitioned(conn):
+    """
+    Düz tabloyu id aralığına göre bölümlü tabloya çevirir. Eski tablo ilk bölüm olarak
+    bağlanır; CHECK kısıtı önceden (yazmaları durdurmadan) doğrulandığından ATTACH tarama yapmaz.
+    """
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT a.attidentity
+        FROM pg_attribute a
+        WHERE a.attrelid = to_regclass(%s) AND a.attname='id'
+        """,
+        (_PARENT,),
+    )
+    if (cur.fetchone() or {}).get("attidentity"):
+        # Identity kolonları bölümlü üst tabloya LIKE ile taşınamıyor; SERIAL bekleniyor.
+        return
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) AS max_id FROM {_PARENT}")
+    max_id = int((cur.fetchone() or {}).get("max_id") or 0)
+    bound = (max_id // MESSAGE_PARTITION_ID_SPAN + 2) * MESSAGE_PARTITION_ID_SPAN
+    cur.execute(f"ALTER TABLE {_PARENT} DROP CONSTRAINT IF EXISTS mobile_dm_legacy_bound")
+    cur.execute(f"ALTER TABLE {_PARENT} ADD CONSTRAINT mobile_dm_legacy_bound CHECK (id IS NOT NULL AND id < {bound}) NOT VALID")
+    cur.execute(f"ALTER TABLE {_PARENT} VALIDATE CONSTRAINT mobile_dm_legacy_bound")
+
+    conn.autocommit = False
+    legacy = _partition_name(0)
+    try:
+        cur.execute("SET LOCAL lock_timeout = '5s'")
+        cur.execute(f"LOCK TABLE {_PARENT} IN ACCESS EXCLUSIVE MODE")
+        cur.execute("SELECT pg_get_serial_sequence(%s, 'id') AS seq", (_PARENT,))
+        seq = (cur.fetchone() or {}).get("seq")
+        cur.execute(f"ALTER TABLE {_PARENT} RENAME TO {legacy}")
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_mobile_dm_notify ON {legacy}")
+        # Tipli zaman kolonu trigger'ı üst tabloda yeniden kurulur ve bölümlere kopyalanır.
+        cur.execute(f"DROP TRIGGER IF EXISTS trg_{_PARENT}_ts_sync ON {legacy}")
+        for idx in _MOVED_INDEXES:
+            cur.execute(f"ALTER INDEX IF EXISTS {idx} RENAME TO {idx}_p0")
+        cur.execute(f"CREATE TABLE {_PARENT} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (id)")
+        cur.execute(f"ALTER TABLE {_PARENT} ADD PRIMARY KEY (id)")
+        cur.execute(f"ALTER TABLE {_PARENT} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO ({bound})")
+        cur.execute(f"ALTER TABLE {legacy} DROP CONSTRAINT mobile_dm_legacy_bound")
+        next_name = _partition_name(bound)
+        cur.execute(
+            f"CREATE TABLE {next_name} PARTITION OF {_PARENT} FOR VALUES FROM ({bound}) TO ({bound + MESSAGE_PARTITION_ID_SPAN})"
+        )
+        if seq:
+            # Eski bölüm arşivlenip silinse bile sequence yaşamaya devam etsin.
+            cur.execute(f"ALTER SEQUENCE {seq} OWNED BY {_PARENT}.id")
+        _ensure_meta(cur)
+        cur.execute(
+            """
+            INSERT INTO mobile_message_partitions (name, lo_id, hi_id)
+            VALUES (%s, 0, %s), (%s, %s, %s)
+            ON CONFLICT (name) DO NOTHING
+            """,
+            (legacy, bound, next_name, bound, bound + MESSAGE_PARTITION_ID_SPAN),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def drop_invalid_index(cur, name: str) -> bool:
+    """Yarıda kalmış CONCURRENTLY kurulumu (INVALID) varsa siler; IF NOT EXISTS ona takılmasın."""
+    cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+    row = cur.fetchone()
+    if not row or row["indisvalid"]:
+        return False
+    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+    return True
+
+
+def ensure_partitioned_index(cur, name: str, spec: str):
+    """
+    Bölümlü mesaj tablosunda indeks: üst tabloda ON ONLY (boş, geçersiz) oluşturulur,
+    her bölümde CONCURRENTLY kurulup bağlanır; tüm bölümler bağlanınca üst indeks geçerli olur.
+    Eski tablodan taşınan <ad>_p0 gibi mevcut indeksler yeniden kurulmadan bağlanır.
+    cur autocommit bağlantıda olmalı.
+    """
+    # Önceki sürüm taşımada bu adı yeniden adlandırmıyordu; ad eski bölümde kaldıysa serbest bırakılır.
+    cur.execute(
+        """
+        SELECT c.relkind, t.relname AS tbl
+        FROM pg_class c
+        JOIN pg_index x ON x.indexrelid = c.oid
+        JOIN pg_class t ON t.oid = x.indrelid
+        WHERE c.oid = to_regclass(%s)
+        """,
+        (name,),
+    )
+    row = cur.fetchone()
+    if row and row["relkind"] == "i" and row["tbl"].startswith(f"{_PARENT}_p"):
+        cur.execute(f"ALTER INDEX {name} RENAME TO {name}{row['tbl'][len(_PARENT):]}")
+    cur.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {_PARENT} {spec}")
+    cur.execute(
+        """
+        SELECT c.relname AS part
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+          AND NOT EXISTS (
+              SELECT 1
+              FROM pg_inherits ii
+              JOIN pg_index x ON x.indexrelid = ii.inhrelid
+              WHERE ii.inhparent = to_regclass(%s) AND x.indrelid = c.oid
+          )
+        ORDER BY c.relname
+        """,
+        (_PARENT, name),
+    )
+    for r in cur.fetchall() or []:
+        part = r["part"]
+        child = f"{name}{part[len(_PARENT):]}"
+        drop_invalid_index(cur, child)
+        cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {part} {spec}")
+        cur.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+
+
+def init_message_partitioning():
+    if not MESSAGE_PARTITIONING_ENABLED:
+        return
+    lock_conn = _db_conn()
+    if not lock_conn:
+        return
+    try:
+        # Diğer worker'lar dönüşüm bitene kadar bekler, sonra tabloyu bölümlü görüp geçer.
+        lock_conn.cursor().execute("SELECT pg_advisory_xact_lock(hashtext('mobile_message_partition_migrate'))")
+        conn = _db_conn()
+        try:
+            cur = conn.cursor()
+            partitioned = messages_partitioned(cur)
+            conn.rollback()
+            if not partitioned:
+                _migrate_to_partitioned(conn)
+            conn.autocommit = False
+            _ensure_meta(conn.cursor())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+        finally:
+            conn.close()
+    finally:
+        lock_conn.rollback()
+        lock_conn.close()
+
+
+def _create_partitions(work, max_id: int) -> int:
+    # Her bölüm kendi transaction'ında açılır; arşivleme hatası açılan bölümleri geri almaz.
+    wcur = work.cursor()
+    wcur.execute("SELECT COALESCE(MAX(hi_id), 0) AS hi FROM mobile_message_partitions")
+    hi = int((wcur.fetchone() or {}).get("hi") or 0)
+    work.commit()
+    created = 0
+    while hi <= max_id + MESSAGE_PARTITION_ID_SPAN:
+        name = _partition_name(hi)
+        wcur.execute("SET LOCAL lock_timeout = '5s'")
+        wcur.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {_PARENT} "
+            f"FOR VALUES FROM ({hi}) TO ({hi + MESSAGE_PARTITION_ID_SPAN})"
+        )
+        wcur.execute(
+            "INSERT INTO mobile_message_partitions (name, lo_id, hi_id) VALUES (%s, %s, %s) ON CONFLICT (name) DO NOTHING",
+            (name, hi, hi + MESSAGE_PARTITION_ID_SPAN),
+        )
+        work.commit()
+        hi += MESSAGE_PARTITION_ID_SPAN
+        created += 1
+    return created
+
+
+def _archive_partitions(work, max_id: int) -> int:
+    # Bölümler sırayla ve her biri ayrı transaction'da ayrılır. Kilit alınamazsa ya da
+    # bir hata olursa o bölümde durulur (canlı taban sıralı kalsın), sonraki turda yeniden denenir.
+    wcur = work.cursor()
+    # Yazılan son bölüme dokunulmaz; yalnızca tamamen geride kalmış bölümler arşivlenir.
+    wcur.execute(
+        """
+        SELECT name FROM mobile_message_partitions
+        WHERE archived_at IS NULL AND hi_id <= %s
+        ORDER BY lo_id
+        """,
+        (max_id,),
+    )
+    names = [r["name"] for r in wcur.fetchall() or []]
+    work.commit()
+    archived = 0
+    for name in names:
+        try:
+            wcur.execute("SET LOCAL lock_timeout = '5s'")
+            wcur.execute(
+                f"""
+                SELECT (
+                    SELECT COALESCE(created_at_ts, mobile_parse_ts(created_at)) FROM {name} ORDER BY id DESC LIMIT 1
+                ) < NOW() - make_interval(days => %s) AS old
+                """,
+                (MESSAGE_ARCHIVE_AFTER_DAYS,),
+            )
+            if not (wcur.fetchone() or {}).get("old"):
+                work.rollback()
+                break
+            wcur.execute(f"ALTER TABLE {_PARENT} DETACH PARTITION {name}")
+            wcur.execute(f"ALTER TABLE {name} SET SCHEMA {MESSAGE_ARCHIVE_SCHEMA}")
+            wcur.execute(
+                "UPDATE mobile_message_partitions SET archived_at=NOW(), schema_name=%s WHERE name=%s",
+                (MESSAGE_ARCHIVE_SCHEMA, name),
+            )
+            work.commit()
+            archived += 1
+        except Exception:
+            work.rollback()
+            logger.warning("message partitions: %s arşivlenemedi, sonraki turda denenecek", name, exc_info=True)
+            break
+    return archived
+
+
+def maintain_message_partitions(conn) -> Dict[str, int]:
+    """Yeterince ileri bölüm açar, yaşı dolan bölümleri arşiv şemasına ayırır."""
+    cur = conn.cursor()
+    if not try_job_lock(cur, "mobile_message_partitions") or not messages_partitioned(cur):
+        conn.rollback()
+        return {"created": 0, "archived": 0}
+    cur.execute(f"SELECT COALESCE(MAX(id), 0) AS max_id FROM {_PARENT}")
+    max_id = int((cur.fetchone() or {}).get("max_id") or 0)
+
+    # Job kilidi conn'un transaction'ında açık kalır; bölüm işleri ayrı bağlantıda commit edilir.
+    created = archived = 0
+    work = _db_conn()
+    try:
+        created = _create_partitions(work, max_id)
+        if MESSAGE_ARCHIVE_AFTER_DAYS > 0:
+            archived = _archive_partitions(work, max_id)
+    except Exception:
+        work.rollback()
+        raise
+    finally:
+        work.close()
+        conn.rollback()
+        if archived:
+            _FLOOR_CACHE["at"] = 0.0
+    return {"created": created, "archived": archived}
+
+
+def _partition_job():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        maintain_message_partitions(conn)
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def start_message_partition_job():
+    if MESSAGE_PARTITIONING_ENABLED:
+        start_periodic_job("mobile_message_partitions", MESSAGE_PARTITION_JOB_INTERVAL_SEC, _partition_job)
+
+
+def live_message_floor(conn) -> Optional[int]:
+    """Arşivlenmiş bölüm varsa canlı tablodaki en küçük id sınırı, yoksa None."""
+    if not MESSAGE_PARTITIONING_ENABLED:
+        return None
+    now = time.monotonic()
+    if now - _FLOOR_CACHE["at"] < _FLOOR_CACHE_TTL_SEC:
+        return _FLOOR_CACHE["floor"]
+    floor = None
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT
+            (SELECT MIN(lo_id) FROM mobile_message_partitions WHERE archived_at IS NULL) AS live_lo,
+            EXISTS (SELECT 1 FROM mobile_message_partitions WHERE archived_at IS NOT NULL) AS has_archive
+        """
+    )
+    row = cur.fetchone()
+    if row and row.get("has_archive"):
+        floor = int(row.get("live_lo") or 0)
+    _FLOOR_CACHE["at"] = now
+    _FLOOR_CACHE["floor"] = floor
+    return floor
+
+
+def archived_pair_messages(conn, a: int, b: int, before_id: int, limit: int) -> List[Dict[str, Any]]:
+    """Arşivdeki bir konuşmadan before_id'den eski mesajlar (yeniden eskiye)."""
+    cur = conn.cursor()
+    cur.execute(
+        """
+        SELECT schema_name, name FROM mobile_message_partitions
+        WHERE archived_at IS NOT NULL AND lo_id < %s
+        ORDER BY lo_id DESC
+        """,
+        (int(before_id),),
+    )
+    tables = cur.fetchall() or []
+    out: List[Dict[str, Any]] = []
+    for t in tables:
+        need = limit - len(out)
+        if need <= 0:
+            break
+        cur.execute(
+            f"""
+            SELECT id, sender_account_id, receiver_account_id, body, created_at
+            FROM {t["schema_name"]}.{t["name"]}
+            WHERE LEAST(sender_account_id, receiver_account_id)=%s
+              AND GREATEST(sender_account_id, receiver_account_id)=%s
+              AND id < %s
+            ORDER BY id DESC
+            LIMIT %s
+            """,
+            (min(a, b), max(a, b), int(before_id), need),
+        )
+        out.extend(cur.fetchall() or [])
+    return out
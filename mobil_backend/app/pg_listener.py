@@ -0,0 +1,103 @@
+import os
+import select
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Set
+
+import psycopg2
+import psycopg2.extensions
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+# Aynı worker'ın kendi yayınladığı bildirimleri ayırt etmesi için.
+WORKER_ID = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+_LOCK = threading.Lock()
+_HANDLERS: Dict[str, List[Callable[[str], None]]] = {}
+_RESET_HANDLERS: List[Callable[[], None]] = []
+_PENDING_CHANNELS: Set[str] = set()
+_STATE = {"thread": None, "connected": False}
+
+
+def subscribe(channel: str, handler: Callable[[str], None], on_reset: Callable[[], None] = None):
+    """
+    Worker başına tek LISTEN bağlantısı üzerinden kanal aboneliği.
+    handler listener thread'inde payload ile çağrılır; on_reset bağlantı koptuğunda
+    (bildirim kaçırılmış olabilir) çağrılır.
+    """
+    with _LOCK:
+        _HANDLERS.setdefault(channel, []).append(handler)
+        if on_reset is not None:
+            _RESET_HANDLERS.append(on_reset)
+        _PENDING_CHANNELS.add(channel)
+        if _STATE["thread"] is None and DATABASE_URL:
+            t = threading.Thread(target=_run, name="pg-listener", daemon=True)
+            _STATE["thread"] = t
+            t.start()
+
+
+def is_connected() -> bool:
+    return bool(_STATE["connected"])
+
+
+def notify(cur, channel: str, payload: str):
+    # Bildirim transaction commit edilince gönderilir.
+    cur.execute("SELECT pg_notify(%s, %s)", (channel, payload))
+
+
+def _dispatch(channel: str, payload: str):
+    with _LOCK:
+        handlers = list(_HANDLERS.get(channel, []))
+    for h in handlers:
+        try:
+            h(payload)
+        except Exception:
+            pass
+
+
+def _reset():
+    with _LOCK:
+        handlers = list(_RESET_HANDLERS)
+    for h in handlers:
+        try:
+            h()
+        except Exception:
+            pass
+
+
+def _run():
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(DATABASE_URL, connect_timeout=3)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            cur = conn.cursor()
+            with _LOCK:
+                channels = set(_HANDLERS.keys())
+                _PENDING_CHANNELS.clear()
+            for ch in channels:
+                cur.execute(f'LISTEN "{ch}"')
+            _STATE["connected"] = True
+            while True:
+                with _LOCK:
+                    pending = set(_PENDING_CHANNELS)
+                    _PENDING_CHANNELS.clear()
+                for ch in pending:
+                    cur.execute(f'LISTEN "{ch}"')
+                if select.select([conn], [], [], 1.0) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    n = conn.notifies.pop(0)
+                    _dispatch(n.channel, n.payload)
+        except Exception:
+            pass
+        finally:
+            _STATE["connected"] = False
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        _reset()
+        time.sleep(2.0)
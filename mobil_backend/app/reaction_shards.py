@@ -0,0 +1,220 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import psycopg2
+import psycopg2.extras
+
+from app.jobs import start_periodic_job, try_job_lock
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+REACTION_SHARDING_ENABLED = os.getenv("REACTION_SHARDING_ENABLED", "0").strip().lower() in {"1", "true", "yes", "on"}
+REACTION_SHARD_COUNT = max(1, int(os.getenv("REACTION_SHARD_COUNT", "16")))
+REACTION_HOT_WINDOW_SEC = int(os.getenv("REACTION_HOT_WINDOW_SEC", "10"))
+REACTION_HOT_WRITES_PER_WINDOW = int(os.getenv("REACTION_HOT_WRITES_PER_WINDOW", "50"))
+REACTION_HOT_TTL_SEC = int(os.getenv("REACTION_HOT_TTL_SEC", "3600"))
+REACTION_SHARD_FOLD_INTERVAL_SEC = int(os.getenv("REACTION_SHARD_FOLD_INTERVAL_SEC", "30"))
+# Yazma hızı worker başına sayılır; eşik uvicorn'un worker sayısına (WEB_CONCURRENCY) bölünür.
+REACTION_WORKER_COUNT = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+REACTION_WRITE_TRACK_MAX = 10000
+
+# kind -> (sayaç tablosu, anahtar kolonu, anahtar tipi)
+SHARDED_COUNTERS: Dict[str, Tuple[str, str, str]] = {
+    "album": ("photo_album_reactions", "album_slug", "text"),
+    "photo": ("photo_item_reactions", "photo_id", "bigint"),
+    "news": ("news_reactions", "post_id", "bigint"),
+}
+
+_WRITE_LOCK = threading.Lock()
+# Son yazma / terfi zamanına göre eskiden yeniye; süresi dolanlar baştan atılır.
+_WRITE_BUCKETS: "OrderedDict[str, List[float]]" = OrderedDict()
+_PROMOTED: "OrderedDict[str, float]" = OrderedDict()
+
+
+def _db_conn():
+    if not DATABASE_URL:
+        return None
+    return psycopg2.connect(
+        DATABASE_URL,
+        connect_timeout=3,
+        cursor_factory=psycopg2.extras.RealDictCursor,
+    )
+
+
+def init_reaction_shard_tables():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reaction_hot_items (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                promoted_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (kind, key)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS reaction_counter_shards (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                shard SMALLINT NOT NULL,
+                delta INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (kind, key, shard)
+            )
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def shard_sum_sql(kind: str, key_expr: str) -> str:
+    # Okuma tarafı: ana satırdaki önbellek toplamına henüz katlanmamış shard farkları eklenir.
+    # Sharding kapalıyken alt sorgu hiç eklenmez (kalan farkları fold işi ana satıra taşır).
+    if kind not in SHARDED_COUNTERS:
+        raise ValueError(kind)
+    if not REACTION_SHARDING_ENABLED:
+        return "0"
+    return (
+        "(SELECT COALESCE(SUM(sh.delta), 0) FROM reaction_counter_shards sh "
+        f"WHERE sh.kind='{kind}' AND sh.key=({key_expr})::text)"
+    )
+
+
+def hot_items_sql(kind_expr: str, key_cond: str) -> str:
+    """Yazma yolundaki "hot" CTE gövdesi; sharding kapalıyken boş küme döner."""
+    if not REACTION_SHARDING_ENABLED:
+        return "SELECT NULL::text AS key WHERE FALSE"
+    return f"SELECT key FROM reaction_hot_items WHERE kind={kind_expr} AND {key_cond}"
+
+
+def shard_rows_sql() -> str:
+    """Yazma yolunda shard farklarının okunduğu kaynak; sharding kapalıyken boş küme."""
+    if not REACTION_SHARDING_ENABLED:
+        return "(SELECT NULL::text AS kind, NULL::text AS key, NULL::smallint AS shard, 0 AS delta WHERE FALSE)"
+    return "reaction_counter_shards"
+
+
+def pick_shard() -> int:
+    return random.randrange(REACTION_SHARD_COUNT)
+
+
+def _prune_write_tracking(now: float, cutoff: float):
+    # _WRITE_LOCK altında çağrılır.
+    while _WRITE_BUCKETS:
+        arr = next(iter(_WRITE_BUCKETS.values()))
+        if arr and arr[-1] >= cutoff and len(_WRITE_BUCKETS) < REACTION_WRITE_TRACK_MAX:
+            break
+        _WRITE_BUCKETS.popitem(last=False)
+    while _PROMOTED:
+        at = next(iter(_PROMOTED.values()))
+        if now - at < REACTION_HOT_TTL_SEC and len(_PROMOTED) < REACTION_WRITE_TRACK_MAX:
+            break
+        _PROMOTED.popitem(last=False)
+
+
+def note_write(kind: str, key) -> bool:
+    """Yazma hızını işler; eşik ilk aşıldığında True döner."""
+    if not REACTION_SHARDING_ENABLED or REACTION_HOT_WRITES_PER_WINDOW <= 0:
+        return False
+    threshold = max(1, -(-REACTION_HOT_WRITES_PER_WINDOW // REACTION_WORKER_COUNT))
+    bucket_key = f"{kind}|{key}"
+    now = time.time()
+    cutoff = now - REACTION_HOT_WINDOW_SEC
+    with _WRITE_LOCK:
+        _prune_write_tracking(now, cutoff)
+        if bucket_key in _PROMOTED:
+            return False
+        arr = [x for x in _WRITE_BUCKETS.pop(bucket_key, []) if x >= cutoff]
+        arr.append(now)
+        if len(arr) < threshold:
+            _WRITE_BUCKETS[bucket_key] = arr
+            return False
+        _PROMOTED[bucket_key] = now
+        return True
+
+
+def promote(conn, kind: str, key):
+    cur = conn.cursor()
+    cur.execute(
+        """
+        INSERT INTO reaction_hot_items (kind, key, promoted_at)
+        VALUES (%s, %s::text, NOW())
+        ON CONFLICT (kind, key) DO UPDATE SET promoted_at = NOW()
+        """,
+        (kind, str(key)),
+    )
+    conn.commit()
+
+
+def maybe_promote(conn, kind: str, key):
+    if note_write(kind, key):
+        try:
+            promote(conn, kind, key)
+        except Exception:
+            conn.rollback()
+
+
+def fold_shards(conn) -> Optional[int]:
+    """Shard farklarını ana sayaç satırlarına taşır, süresi dolan sıcak kayıtları düşürür."""
+    cur = conn.cursor()
+    if not try_job_lock(cur, "reaction_shard_fold"):
+        conn.rollback()
+        return None
+    folded = 0
+    for kind, (table, key_col, key_type) in SHARDED_COUNTERS.items():
+        # Yeni eklenen satırlar aynı snapshot'taki UPDATE'e görünmez; iki kez sayılmaz.
+        cur.execute(
+            f"""
+            WITH moved AS (
+                DELETE FROM reaction_counter_shards WHERE kind=%s RETURNING key, delta
+            ),
+            sums AS (
+                SELECT key, SUM(delta)::INTEGER AS total FROM moved GROUP BY key
+            ),
+            ins AS (
+                INSERT INTO {table} ({key_col}, like_count)
+                SELECT key::{key_type}, GREATEST(0, total) FROM sums
+                ON CONFLICT ({key_col}) DO NOTHING
+                RETURNING {key_col}
+            )
+            UPDATE {table} t
+            SET like_count = GREATEST(0, t.like_count + sums.total), updated_at = NOW()
+            FROM sums
+            WHERE t.{key_col} = sums.key::{key_type}
+            """,
+            (kind,),
+        )
+        folded += cur.rowcount or 0
+    cur.execute(
+        "DELETE FROM reaction_hot_items WHERE promoted_at < NOW() - (%s * INTERVAL '1 second')",
+        (REACTION_HOT_TTL_SEC,),
+    )
+    conn.commit()
+    return folded
+
+
+def _fold_job():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        fold_shards(conn)
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def start_reaction_shard_jobs():
+    start_periodic_job("reaction_shard_fold", REACTION_SHARD_FOLD_INTERVAL_SEC, _fold_job)
@@ -0,0 +1,367 @@
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import psycopg2
+import psycopg2.extras
+from fastapi import APIRouter, Header, HTTPException
+from pydantic import BaseModel
+
+from app.jobs import start_periodic_job, try_job_lock
+from app.routers.messages import CONVERSATION_PREVIEW_CHARS, _support_account_id
+
+admin_router = APIRouter(prefix="/admin/messages", tags=["Admin Mesajlar"])
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+ADMIN_TOKEN = os.getenv("MOBILE_ADMIN_TOKEN", "").strip()
+# 500'ü aşan tek INSERT mesaj bildirim trigger'ında "*" (herkes yeniden eşitlensin) üretir;
+# varsayılan parti bunun altında tutulur ki bildirim yalnızca alıcılara gitsin.
+BROADCAST_BATCH_SIZE = max(1, int(os.getenv("BROADCAST_BATCH_SIZE", "500")))
+BROADCAST_BATCH_PAUSE_SEC = float(os.getenv("BROADCAST_BATCH_PAUSE_SEC", "0.2"))
+BROADCAST_POLL_INTERVAL_SEC = int(os.getenv("BROADCAST_POLL_INTERVAL_SEC", "5"))
+
+
+class BroadcastRequest(BaseModel):
+    body: str
+    role: Optional[str] = None
+    city: Optional[str] = None
+
+
+def _db_conn():
+    if not DATABASE_URL:
+        raise HTTPException(status_code=500, detail="DATABASE_URL eksik")
+    return psycopg2.connect(DATABASE_URL, cursor_factory=psycopg2.extras.RealDictCursor)
+
+
+def _require_admin(x_admin_token: Optional[str]):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=503, detail="Admin token tanımlı değil")
+    if not x_admin_token or x_admin_token.strip() != ADMIN_TOKEN:
+        raise HTTPException(status_code=401, detail="Yetkisiz")
+
+
+def _iso_now() -> str:
+    return datetime.utcnow().isoformat(timespec="seconds") + "Z"
+
+
+def init_broadcast_tables():
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        # last_account_id: işlenen son alıcı; yarıda kalan duyuru buradan devam eder.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mobile_broadcasts (
+                id BIGSERIAL PRIMARY KEY,
+                sender_account_id INTEGER NOT NULL,
+                body TEXT NOT NULL,
+                role TEXT,
+                city TEXT,
+                status TEXT NOT NULL DEFAULT 'pending',
+                total_targets INTEGER NOT NULL DEFAULT 0,
+                sent_count INTEGER NOT NULL DEFAULT 0,
+                last_account_id INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                started_at TIMESTAMPTZ,
+                finished_at TIMESTAMPTZ,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_mobile_broadcasts_active
+            ON mobile_broadcasts(id) WHERE status IN ('pending', 'running')
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def _accounts_have_city(cur) -> bool:
+    cur.execute(
+        """
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name='accounts' AND column_name='city'
+        LIMIT 1
+        """
+    )
+    return bool(cur.fetchone())
+
+
+def _target_filter(role: Optional[str], city: Optional[str]) -> tuple[str, Dict[str, Any]]:
+    where = ["a.id <> %(sender)s", "COALESCE(a.is_active,1)=1"]
+    params: Dict[str, Any] = {}
+    if role:
+        where.append("LOWER(COALESCE(a.role,'customer'))=%(role)s")
+        params["role"] = role
+    if city:
+        where.append("LOWER(COALESCE(a.city,''))=%(city)s")
+        params["city"] = city
+    return " AND ".join(where), params
+
+
+def _broadcast_out(row: Dict[str, Any]) -> Dict[str, Any]:
+    item = dict(row)
+    total = int(item.get("total_targets") or 0)
+    item["progress"] = round(min(1.0, int(item.get("sent_count") or 0) / total), 4) if total else 1.0
+    return item
+
+
+def _send_batch(conn, b: Dict[str, Any]) -> int:
+    """Tek transaction'da bir parti: mesajlar, konuşma özetleri, rozet sayaçları ve ilerleme."""
+    where, params = _target_filter(b.get("role"), b.get("city"))
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        WITH targets AS (
+            SELECT a.id
+            FROM accounts a
+            WHERE a.id > %(after)s AND {where}
+            ORDER BY a.id
+            LIMIT %(batch)s
+        ),
+        ins AS (
+            INSERT INTO mobile_direct_messages (sender_account_id, receiver_account_id, body, created_at)
+            SELECT %(sender)s, t.id, %(body)s, %(now)s
+            FROM targets t
+            RETURNING id, receiver_account_id, created_at
+        ),
+        conv AS (
+            INSERT INTO mobile_conversations AS c (
+                user_a_id, user_b_id, last_message_id, last_message_at,
+                last_sender_account_id, last_preview, unread_a, unread_b
+            )
+            SELECT
+                LEAST(%(sender)s, ins.receiver_account_id),
+                GREATEST(%(sender)s, ins.receiver_account_id),
+                ins.id, ins.created_at, %(sender)s, LEFT(%(body)s, %(preview)s),
+                CASE WHEN ins.receiver_account_id < %(sender)s THEN 1 ELSE 0 END,
+                CASE WHEN ins.receiver_account_id > %(sender)s THEN 1 ELSE 0 END
+            FROM ins
+            ON CONFLICT (user_a_id, user_b_id) DO UPDATE
+            SET last_message_id = GREATEST(c.last_message_id, EXCLUDED.last_message_id),
+                last_message_at = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                       THEN EXCLUDED.last_message_at ELSE c.last_message_at END,
+                last_sender_account_id = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                              THEN EXCLUDED.last_sender_account_id ELSE c.last_sender_account_id END,
+                last_preview = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                    THEN EXCLUDED.last_preview ELSE c.last_preview END,
+                unread_a = c.unread_a + EXCLUDED.unread_a,
+                unread_b = c.unread_b + EXCLUDED.unread_b
+        ),
+        badge AS (
+            INSERT INTO mobile_badge_counters AS bc (account_id, unread_messages)
+            SELECT receiver_account_id, 1 FROM ins
+            ON CONFLICT (account_id) DO UPDATE
+            SET unread_messages = bc.unread_messages + 1, updated_at = NOW()
+        ),
+        prog AS (
+            UPDATE mobile_broadcasts
+            SET last_account_id = COALESCE((SELECT MAX(id) FROM targets), last_account_id),
+                sent_count = sent_count + (SELECT COUNT(*) FROM ins),
+                updated_at = NOW()
+            WHERE id=%(id)s
+        )
+        SELECT COUNT(*)::INTEGER AS n FROM targets
+        """,
+        {
+            **params,
+            "id": int(b["id"]),
+            "after": int(b["last_account_id"] or 0),
+            "sender": int(b["sender_account_id"]),
+            "body": b["body"],
+            "now": _iso_now(),
+            "preview": CONVERSATION_PREVIEW_CHARS,
+            "batch": BROADCAST_BATCH_SIZE,
+        },
+    )
+    n = int((cur.fetchone() or {}).get("n") or 0)
+    if n < BROADCAST_BATCH_SIZE:
+        cur.execute(
+            "UPDATE mobile_broadcasts SET status='done', finished_at=NOW(), updated_at=NOW() WHERE id=%s",
+            (int(b["id"]),),
+        )
+    conn.commit()
+    return n
+
+
+def _run_broadcast(work, broadcast_id: int):
+    cur = work.cursor()
+    cur.execute(
+        """
+        UPDATE mobile_broadcasts
+        SET status='running', started_at=COALESCE(started_at, NOW()), error=NULL, updated_at=NOW()
+        WHERE id=%s AND status IN ('pending', 'running')
+        """,
+        (broadcast_id,),
+    )
+    work.commit()
+    while True:
+        # Her parti öncesi durum yeniden okunur; iptal bir sonraki partide etkili olur.
+        cur.execute("SELECT * FROM mobile_broadcasts WHERE id=%s FOR UPDATE", (broadcast_id,))
+        b = cur.fetchone()
+        if not b or b["status"] != "running":
+            work.rollback()
+            return
+        try:
+            n = _send_batch(work, b)
+        except Exception as e:
+            work.rollback()
+            cur.execute(
+                "UPDATE mobile_broadcasts SET status='failed', error=%s, updated_at=NOW() WHERE id=%s",
+                (str(e)[:500], broadcast_id),
+            )
+            work.commit()
+            return
+        if n < BROADCAST_BATCH_SIZE:
+            return
+        if BROADCAST_BATCH_PAUSE_SEC > 0:
+            time.sleep(BROADCAST_BATCH_PAUSE_SEC)
+
+
+def _broadcast_job():
+    if not DATABASE_URL:
+        return
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        # Kilit bu transaction açık kaldığı sürece tutulur; partiler ayrı bağlantıda commit edilir.
+        if not try_job_lock(cur, "mobile_broadcast"):
+            return
+        work = _db_conn()
+        try:
+            while True:
+                wcur = work.cursor()
+                wcur.execute(
+                    """
+                    SELECT id FROM mobile_broadcasts
+                    WHERE status IN ('pending', 'running')
+                    ORDER BY id
+                    LIMIT 1
+                    """
+                )
+                row = wcur.fetchone()
+                work.rollback()
+                if not row:
+                    return
+                _run_broadcast(work, int(row["id"]))
+        finally:
+            work.close()
+    finally:
+        conn.rollback()
+        conn.close()
+
+
+def start_broadcast_job():
+    start_periodic_job("mobile_broadcast", BROADCAST_POLL_INTERVAL_SEC, _broadcast_job)
+
+
+@admin_router.post("/broadcasts", summary="Admin: sistem hesabından toplu duyuru")
+def admin_create_broadcast(payload: BroadcastRequest, x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    body = (payload.body or "").strip()
+    if not body:
+        raise HTTPException(status_code=400, detail="Mesaj boş olamaz")
+    if len(body) > 2000:
+        raise HTTPException(status_code=400, detail="Mesaj çok uzun")
+    role = (payload.role or "").strip().lower() or None
+    city = (payload.city or "").strip().lower() or None
+
+    conn = _db_conn()
+    try:
+        sender = _support_account_id(conn)
+        if not sender:
+            raise HTTPException(status_code=503, detail="Sistem hesabı bulunamadı")
+        cur = conn.cursor()
+        if city and not _accounts_have_city(cur):
+            raise HTTPException(status_code=400, detail="Hesaplarda şehir bilgisi yok; şehir filtresi kullanılamaz")
+        where, params = _target_filter(role, city)
+        cur.execute(f"SELECT COUNT(*)::INTEGER AS n FROM accounts a WHERE {where}", {**params, "sender": sender})
+        total = int((cur.fetchone() or {}).get("n") or 0)
+        cur.execute(
+            """
+            INSERT INTO mobile_broadcasts (sender_account_id, body, role, city, total_targets)
+            VALUES (%s, %s, %s, %s, %s)
+            RETURNING *
+            """,
+            (sender, body, role, city, total),
+        )
+        row = cur.fetchone()
+        conn.commit()
+        return _broadcast_out(row)
+    finally:
+        conn.close()
+
+
+@admin_router.get("/broadcasts", summary="Admin: toplu duyurular")
+def admin_list_broadcasts(limit: int = 50, x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT * FROM mobile_broadcasts ORDER BY id DESC LIMIT %s",
+            (max(1, min(int(limit), 200)),),
+        )
+        return {"items": [_broadcast_out(r) for r in cur.fetchall() or []]}
+    finally:
+        conn.close()
+
+
+@admin_router.get("/broadcasts/{broadcast_id}", summary="Admin: duyuru ilerlemesi")
+def admin_get_broadcast(broadcast_id: int, x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM mobile_broadcasts WHERE id=%s", (int(broadcast_id),))
+        row = cur.fetchone()
+        if not row:
+            raise HTTPException(status_code=404, detail="Duyuru bulunamadı")
+        return _broadcast_out(row)
+    finally:
+        conn.close()
+
+
+def _set_broadcast_status(broadcast_id: int, status: str, from_statuses: tuple) -> Dict[str, Any]:
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            UPDATE mobile_broadcasts
+            SET status=%s, updated_at=NOW()
+            WHERE id=%s AND status = ANY(%s)
+            RETURNING *
+            """,
+            (status, int(broadcast_id), list(from_statuses)),
+        )
+        row = cur.fetchone()
+        if not row:
+            cur.execute("SELECT status FROM mobile_broadcasts WHERE id=%s", (int(broadcast_id),))
+            cur_row = cur.fetchone()
+            if not cur_row:
+                raise HTTPException(status_code=404, detail="Duyuru bulunamadı")
+            raise HTTPException(status_code=409, detail=f"Duyuru durumu uygun değil: {cur_row['status']}")
+        conn.commit()
+        return _broadcast_out(row)
+    finally:
+        conn.close()
+
+
+@admin_router.post("/broadcasts/{broadcast_id}/cancel", summary="Admin: duyuruyu durdur")
+def admin_cancel_broadcast(broadcast_id: int, x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    return _set_broadcast_status(broadcast_id, "cancelled", ("pending", "running"))
+
+
+@admin_router.post("/broadcasts/{broadcast_id}/resume", summary="Admin: duyuruya kaldığı yerden devam et")
+def admin_resume_broadcast(broadcast_id: int, x_admin_token: Optional[str] = Header(default=None)):
+    _require_admin(x_admin_token)
+    return _set_broadcast_status(broadcast_id, "pending", ("cancelled", "failed"))
@@ -9,6 +9,8 @@ import psycopg2
 import psycopg2.extras
 from fastapi import APIRouter, HTTPException, Query
 
+from app.reaction_shards import hot_items_sql, maybe_promote, pick_shard, shard_rows_sql, shard_sum_sql
+
 router = APIRouter(prefix="/discover", tags=["Keşfet"])
 
 WP_BASE = os.getenv("WP_BASE_URL", "https://www.dansmagazin.net").rstrip("/")
@@ -249,7 +251,16 @@ def _get_news_like_count(post_id: int) -> int:
         return 0
     try:
         cur = conn.cursor()
-        cur.execute("SELECT like_count FROM news_reactions WHERE post_id=%s", (int(post_id),))
+        cur.execute(
+            f"""
+            SELECT GREATEST(
+                0,
+                COALESCE((SELECT like_count FROM news_reactions WHERE post_id=%(pid)s), 0)
+                + {shard_sum_sql("news", "%(pid)s")}
+            ) AS like_count
+            """,
+            {"pid": int(post_id)},
+        )
         row = cur.fetchone()
         return int((row or {}).get("like_count") or 0)
     except Exception:
@@ -269,22 +280,47 @@ def _apply_news_like_delta(post_id: int, delta: int) -> int:
         return _get_news_like_count(post_id)
     try:
         cur = conn.cursor()
+        # Sıcak haberlerde ana satır yerine shard satırı artırılır (bkz. app.reaction_shards).
         cur.execute(
-            "INSERT INTO news_reactions (post_id, like_count) VALUES (%s, 0) ON CONFLICT (post_id) DO NOTHING",
-            (int(post_id),),
-        )
-        cur.execute(
-            """
-            UPDATE news_reactions
-            SET like_count = GREATEST(0, like_count + %s),
-                updated_at = NOW()
-            WHERE post_id = %s
-            RETURNING like_count
+            f"""
+            WITH hot AS ({hot_items_sql("'news'", "key=%(pid)s::text")}),
+            counter AS (
+                INSERT INTO news_reactions (post_id, like_count)
+                SELECT %(pid)s, GREATEST(0, %(delta)s)
+                WHERE NOT EXISTS (SELECT 1 FROM hot)
+                ON CONFLICT (post_id) DO UPDATE
+                SET like_count = GREATEST(0, news_reactions.like_count + %(delta)s),
+                    updated_at = NOW()
+                RETURNING like_count
+            ),
+            shard AS (
+                INSERT INTO reaction_counter_shards (kind, key, shard, delta)
+                SELECT 'news', %(pid)s::text, %(shard)s, %(delta)s
+                WHERE EXISTS (SELECT 1 FROM hot)
+                ON CONFLICT (kind, key, shard) DO UPDATE
+                SET delta = reaction_counter_shards.delta + EXCLUDED.delta
+                RETURNING delta
+            ),
+            base AS (
+                SELECT
+                    COALESCE((SELECT like_count FROM news_reactions WHERE post_id=%(pid)s), 0) AS main_count,
+                    COALESCE(SUM(sh.delta) FILTER (WHERE sh.shard <> %(shard)s), 0) AS other_shards,
+                    COALESCE(SUM(sh.delta), 0) AS all_shards
+                FROM {shard_rows_sql()} sh
+                WHERE sh.kind='news' AND sh.key=%(pid)s::text
+            )
+            SELECT GREATEST(0, CASE
+                WHEN EXISTS (SELECT 1 FROM shard)
+                    THEN base.main_count + base.other_shards + (SELECT delta FROM shard)
+                ELSE COALESCE((SELECT like_count FROM counter), base.main_count) + base.all_shards
+            END) AS like_count
+            FROM base
             """,
-            (int(delta), int(post_id)),
+            {"pid": int(post_id), "delta": int(delta), "shard": pick_shard()},
         )
         row = cur.fetchone() or {}
         conn.commit()
+        maybe_promote(conn, "news", int(post_id))
         return int(row.get("like_count") or 0)
     except Exception:
         conn.rollback()
@@ -371,24 +407,18 @@ def _fetch_latest_albums(limit: int = 6) -> List[Dict[str, Any]]:
         cur.execute(
             """
             SELECT
-                stats.event_id AS slug,
-                COALESCE(se.name, stats.event_id) AS name,
-                ep.file_path,
+                s.event_id AS slug,
+                COALESCE(se.name, s.event_id) AS name,
+                s.cover_path AS file_path,
                 ep.created_at,
-                stats.photo_count
-            FROM (
-                SELECT event_id, MAX(id) AS max_photo_id, COUNT(*) AS photo_count
-                FROM event_photos
-                GROUP BY event_id
-                ORDER BY MAX(id) DESC
-                LIMIT %s
-            ) stats
-            JOIN event_photos ep ON ep.id = stats.max_photo_id
-            LEFT JOIN saas_events se ON se.slug = stats.event_id
-            ORDER BY ep.id DESC
+                s.photo_count
+            FROM album_stats s
+            LEFT JOIN event_photos ep ON ep.id = s.max_photo_id
+            LEFT JOIN saas_events se ON se.slug = s.event_id
+            ORDER BY s.max_photo_id DESC
             LIMIT %s
             """,
-            (int(limit), int(limit)),
+            (int(limit),),
         )
         rows = cur.fetchall() or []
         out = []
@@ -1,13 +1,19 @@
+import mimetypes
 import os
 import uuid
 from datetime import datetime
 from decimal import Decimal, InvalidOperation
+from email.utils import formatdate
 from typing import Any, Dict, List, Optional
+from urllib.parse import quote
 
 import psycopg2
 import psycopg2.extras
 from fastapi import APIRouter, File, Form, Header, HTTPException, UploadFile
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, Response
+from starlette.concurrency import run_in_threadpool
+
+from app.timestamp_columns import timestamps_ready, ts_column
 
 router = APIRouter(prefix="/events", tags=["Etkinlikler"])
 admin_router = APIRouter(prefix="/admin/events", tags=["Admin Etkinlikler"])
@@ -18,6 +24,11 @@ ROOT_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 UPLOAD_DIR = os.path.join(ROOT_DIR, "media", "submission_covers")
 ALT_UPLOAD_DIR = "/home/ubuntu/etkinlik_fotograf_projesi/media/submission_covers"
 PUBLIC_API_BASE = os.getenv("PUBLIC_API_BASE", "https://api2.dansmagazin.net").rstrip("/")
+COVER_MAX_BYTES = 8 * 1024 * 1024
+COVER_UPLOAD_CHUNK_BYTES = 64 * 1024
+# Boş değilse dosya gövdesi nginx'e bırakılır (X-Accel-Redirect); örn. "/_internal/submission_covers".
+COVER_X_ACCEL_PREFIX = os.getenv("COVER_X_ACCEL_PREFIX", "").strip().rstrip("/")
+COVER_CACHE_CONTROL = "public, max-age=31536000, immutable"
 
 
 def _db_conn():
@@ -147,21 +158,71 @@ def _cover_exists(path: str) -> bool:
     return os.path.exists(os.path.join(UPLOAD_DIR, bn)) or os.path.exists(os.path.join(ALT_UPLOAD_DIR, bn))
 
 
-def _save_cover(upload: UploadFile) -> str:
-    filename = f"{uuid.uuid4().hex}.jpg"
+def _cover_ext_from_magic(head: bytes) -> str:
+    if head.startswith(b"\xff\xd8\xff"):
+        return ".jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return ".png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return ".webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return ".gif"
+    return ""
+
+
+def _finalize_cover(f, tmp_path: str, abs_path: str):
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+    os.replace(tmp_path, abs_path)
+
+
+def _discard_cover(f, tmp_path: str):
+    try:
+        f.close()
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+
+async def _save_cover(upload: UploadFile) -> str:
     # Kalıcı dizin olarak ana proje altını kullan; deploy sırasında silinmez.
-    abs_path = os.path.join(ALT_UPLOAD_DIR, filename)
-    raw = upload.file.read()
-    if len(raw) > 8 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Görsel çok büyük (max 8MB)")
-    with open(abs_path, "wb") as f:
-        f.write(raw)
-    return abs_path
+    # Geçici dosya aynı dizinde açılır ki os.replace atomik olsun.
+    token = uuid.uuid4().hex
+    tmp_path = os.path.join(ALT_UPLOAD_DIR, f".{token}.part")
+    f = await run_in_threadpool(open, tmp_path, "wb")
+    try:
+        total = 0
+        ext = ""
+        while True:
+            chunk = await upload.read(COVER_UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            if not ext:
+                ext = _cover_ext_from_magic(chunk[:16])
+                if not ext:
+                    raise HTTPException(status_code=400, detail="Geçersiz görsel formatı (jpg/png/webp/gif)")
+            total += len(chunk)
+            if total > COVER_MAX_BYTES:
+                raise HTTPException(status_code=400, detail="Görsel çok büyük (max 8MB)")
+            await run_in_threadpool(f.write, chunk)
+        if total == 0:
+            raise HTTPException(status_code=400, detail="Görsel boş")
+        abs_path = os.path.join(ALT_UPLOAD_DIR, f"{token}{ext}")
+        await run_in_threadpool(_finalize_cover, f, tmp_path, abs_path)
+        return abs_path
+    except BaseException:
+        await run_in_threadpool(_discard_cover, f, tmp_path)
+        raise
 
 
 @router.get("", summary="Onaylanmış etkinlik listesi")
 def list_events(limit: int = 50, city: str = "", event_kind: str = ""):
     conn = _db_conn()
+    if timestamps_ready(conn, "mobile_event_submissions"):
+        when = "COALESCE(mes.event_date_ts, mes.start_at_ts, mes.approved_at_ts, mes.created_at_ts)"
+    else:
+        when = "COALESCE(mes.event_date, mes.start_at, mes.approved_at, mes.created_at)"
     cur = conn.cursor()
     wheres = ["mes.status='approved'", "COALESCE(se.is_active, 1)=1"]
     vals: List[Any] = []
@@ -198,7 +259,7 @@ def list_events(limit: int = 50, city: str = "", event_kind: str = ""):
         FROM mobile_event_submissions mes
         LEFT JOIN saas_events se ON se.slug = mes.approved_event_slug
         WHERE {' AND '.join(wheres)}
-        ORDER BY COALESCE(mes.event_date, mes.start_at, mes.approved_at, mes.created_at) ASC
+        ORDER BY {when} ASC
         LIMIT %s
         """,
         tuple(vals + [max(1, min(int(limit), 500))]),
@@ -281,7 +342,7 @@ async def create_submission(
         raise HTTPException(status_code=400, detail="Geçersiz giriş ücreti")
     cover_path = ""
     if cover_image and getattr(cover_image, "filename", ""):
-        cover_path = _save_cover(cover_image)
+        cover_path = await _save_cover(cover_image)
     conn = _db_conn()
     cur = conn.cursor()
     cur.execute(
@@ -331,23 +392,24 @@ def admin_list_submissions(
     if status not in {"pending", "approved", "rejected", "all"}:
         status = "pending"
     conn = _db_conn()
+    created = ts_column(conn, "mobile_event_submissions", "created_at")
     cur = conn.cursor()
     if status == "all":
         cur.execute(
-            """
+            f"""
             SELECT *
             FROM mobile_event_submissions
-            ORDER BY created_at DESC
+            ORDER BY {created} DESC
             LIMIT 200
             """
         )
     else:
         cur.execute(
-            """
+            f"""
             SELECT *
             FROM mobile_event_submissions
             WHERE status=%s
-            ORDER BY created_at DESC
+            ORDER BY {created} DESC
             LIMIT 200
             """,
             (status,),
@@ -406,13 +468,34 @@ def admin_reject_submission(
     return {"ok": True}
 
 
+def _resolve_cover_file(safe_name: str) -> Optional[tuple[str, str, os.stat_result]]:
+    # Tek stat çağrısı ile hem varlık hem ETag/Last-Modified bilgisi alınır.
+    for key, base in (("main", UPLOAD_DIR), ("alt", ALT_UPLOAD_DIR)):
+        path = os.path.join(base, safe_name)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        return key, path, st
+    return None
+
+
 @router.get("/submission-cover/{filename}", include_in_schema=False)
-def get_submission_cover(filename: str):
+def get_submission_cover(filename: str, if_none_match: Optional[str] = Header(default=None)):
     safe_name = os.path.basename(filename)
-    abs_path = os.path.join(UPLOAD_DIR, safe_name)
-    if not os.path.exists(abs_path):
-        alt_path = os.path.join(ALT_UPLOAD_DIR, safe_name)
-        if os.path.exists(alt_path):
-            return FileResponse(alt_path)
+    resolved = _resolve_cover_file(safe_name) if safe_name else None
+    if not resolved:
         raise HTTPException(status_code=404, detail="Dosya bulunamadı")
-    return FileResponse(abs_path)
+    key, abs_path, st = resolved
+    # Kapak dosya adları uuid tabanlıdır, içerik asla değişmez.
+    headers = {
+        "ETag": f'"{int(st.st_mtime):x}-{st.st_size:x}"',
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": COVER_CACHE_CONTROL,
+    }
+    if if_none_match and headers["ETag"] in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    if COVER_X_ACCEL_PREFIX:
+        headers["X-Accel-Redirect"] = f"{COVER_X_ACCEL_PREFIX}/{key}/{quote(safe_name)}"
+        return Response(headers=headers, media_type=mimetypes.guess_type(safe_name)[0] or "application/octet-stream")
+    return FileResponse(abs_path, headers=headers, stat_result=st)
@@ -1,14 +1,62 @@
+import asyncio
+import json
+import logging
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 import psycopg2.extras
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Query
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
+
+from app import pg_listener
+from app.badge_counters import badge_counts
+from app.friend_cache import is_friend
+from app.jobs import start_periodic_job, try_job_lock
+from app.message_partitions import (
+    archived_pair_messages,
+    drop_invalid_index,
+    ensure_partitioned_index,
+    live_message_floor,
+    messages_partitioned,
+)
 
 router = APIRouter(prefix="/messages", tags=["Mesajlar"])
+logger = logging.getLogger(__name__)
 DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+MESSAGE_CHANNEL = "mobile_direct_message"
+# Okundu bilgisi ve "yazıyor" olayları; payload JSON.
+CHAT_EVENT_CHANNEL = "mobile_chat_event"
+MESSAGE_WAIT_MAX_SEC = 25.0
+# Listener bağlı değilken long-poll kısa aralıklı DB kontrolüne düşer.
+MESSAGE_WAIT_FALLBACK_POLL_SEC = 2.0
+CONVERSATION_PREVIEW_CHARS = 120
+CONVERSATION_BACKFILL_RETRIES = 3
+# Karşı tarafa giden okundu bilgileri bu aralıkla birleştirilip yayınlanır; 0 ise hemen gider.
+READ_STATE_FLUSH_INTERVAL_SEC = float(os.getenv("READ_STATE_FLUSH_INTERVAL_SEC", "1.0"))
+READ_STATE_CACHE_MAX = 50000
+MESSAGE_INDEX_JOB_INTERVAL_SEC = int(os.getenv("MESSAGE_INDEX_JOB_INTERVAL_SEC", "3600"))
+SUPPORT_ACCOUNT_EMAIL = os.getenv("DEFAULT_SYSTEM_FRIEND_EMAIL", "info@dansmagazin.net").strip().lower()
+# idx_mobile_dm_pair_id ile eşleşen konuşma filtresi; parametreler (küçük id, büyük id).
+_PAIR_FILTER = (
+    "LEAST(sender_account_id, receiver_account_id)=%s "
+    "AND GREATEST(sender_account_id, receiver_account_id)=%s"
+)
+# Arama indeksleriyle birebir aynı ifadeler (idx_mobile_dm_body_fts / idx_mobile_dm_body_trgm).
+_SEARCH_TSV = "to_tsvector('turkish', COALESCE(body, ''))"
+_SEARCH_FOLD = "mobile_text_fold(body)"
+_FOLD_FROM = "çğıöşüâîûÇĞİÖŞÜÂÎÛ"
+_FOLD_TO = "cgiosuaiuCGIOSUAIU"
+_FOLD_TABLE = str.maketrans(_FOLD_FROM, _FOLD_TO)
+_HL_START = "\x01"
+_HL_STOP = "\x02"
 
 
 class SendMessageRequest(BaseModel):
@@ -16,6 +64,11 @@ class SendMessageRequest(BaseModel):
     body: str
 
 
+class TypingRequest(BaseModel):
+    to_account_id: int
+    is_typing: bool = True
+
+
 def _db_conn():
     if not DATABASE_URL:
         raise HTTPException(status_code=500, detail="DATABASE_URL eksik")
@@ -60,13 +113,7 @@ def _display_name(name: str, email: str) -> str:
 
 
 def _is_friend(conn, a: int, b: int) -> bool:
-    x, y = (a, b) if a < b else (b, a)
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT 1 FROM mobile_friendships WHERE user_a_id=%s AND user_b_id=%s LIMIT 1",
-        (x, y),
-    )
-    return bool(cur.fetchone())
+    return is_friend(conn, a, b)
 
 
 def init_message_read_state_table():
@@ -97,154 +144,981 @@ def init_message_read_state_table():
         conn.close()
 
 
-def unread_messages_count(conn, account_id: int) -> int:
-    cur = conn.cursor()
+def init_conversation_table():
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        # Sıralı çift (user_a_id < user_b_id); unread_a = user_a'nın okumadığı mesaj sayısı.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mobile_conversations (
+                user_a_id INTEGER NOT NULL,
+                user_b_id INTEGER NOT NULL,
+                last_message_id BIGINT NOT NULL,
+                last_message_at TEXT,
+                last_sender_account_id INTEGER,
+                last_preview TEXT NOT NULL DEFAULT '',
+                unread_a INTEGER NOT NULL DEFAULT 0,
+                unread_b INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (user_a_id, user_b_id)
+            )
+            """
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_mobile_conversations_a ON mobile_conversations(user_a_id, last_message_id DESC)"
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_mobile_conversations_b ON mobile_conversations(user_b_id, last_message_id DESC)"
+        )
+        # Destek gelen kutusunda "okunmamışlar önce" sayfalaması için.
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_mobile_conversations_a_unread
+            ON mobile_conversations(user_a_id, last_message_id DESC) WHERE unread_a > 0
+            """
+        )
+        cur.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_mobile_conversations_b_unread
+            ON mobile_conversations(user_b_id, last_message_id DESC) WHERE unread_b > 0
+            """
+        )
+        conn.commit()
+
+        # Tek seferlik doldurma; bittiği mobile_backfill_markers'a yazılır. Tablo boş olmayabilir
+        # (yeni koda geçmiş bir worker önce mesaj göndermiş olabilir), mevcut satırlarla birleştirilir.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mobile_backfill_markers (
+                name TEXT PRIMARY KEY,
+                done_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        conn.commit()
+        # REPEATABLE READ: doldurma sırasında send_message satırı güncellerse eski sayımla
+        # üzerine yazılmaz, serialization hatası alınıp yeniden denenir.
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+        for _ in range(CONVERSATION_BACKFILL_RETRIES):
+            try:
+                if not try_job_lock(cur, "mobile_conversations_backfill"):
+                    conn.rollback()
+                    break
+                cur.execute("SELECT 1 FROM mobile_backfill_markers WHERE name='mobile_conversations'")
+                if cur.fetchone():
+                    conn.rollback()
+                    break
+                _backfill_conversations(cur)
+                cur.execute("INSERT INTO mobile_backfill_markers (name) VALUES ('mobile_conversations')")
+                conn.commit()
+                break
+            except psycopg2.errors.SerializationFailure:
+                conn.rollback()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def _backfill_conversations(cur):
     cur.execute(
         """
-        SELECT COALESCE(SUM(t.unread_count), 0) AS unread_total
-        FROM (
+        WITH m AS (
             SELECT
-                m.sender_account_id AS peer_id,
-                COUNT(*)::INTEGER AS unread_count
-            FROM mobile_direct_messages m
+                id, sender_account_id, receiver_account_id, body, created_at,
+                LEAST(sender_account_id, receiver_account_id) AS lo,
+                GREATEST(sender_account_id, receiver_account_id) AS hi
+            FROM mobile_direct_messages
+            WHERE sender_account_id <> receiver_account_id
+        ),
+        last AS (
+            SELECT DISTINCT ON (lo, hi) *
+            FROM m
+            ORDER BY lo, hi, id DESC
+        ),
+        unread AS (
+            SELECT m.lo, m.hi, m.receiver_account_id AS reader, COUNT(*)::INTEGER AS n
+            FROM m
             LEFT JOIN mobile_message_read_state rs
-              ON rs.account_id=%s
+              ON rs.account_id=m.receiver_account_id
              AND rs.peer_account_id=m.sender_account_id
-            WHERE m.receiver_account_id=%s
-              AND m.id > COALESCE(rs.last_read_message_id, 0)
-            GROUP BY m.sender_account_id
-        ) t
+            WHERE m.id > COALESCE(rs.last_read_message_id, 0)
+            GROUP BY m.lo, m.hi, m.receiver_account_id
+        )
+        INSERT INTO mobile_conversations AS c (
+            user_a_id, user_b_id, last_message_id, last_message_at,
+            last_sender_account_id, last_preview, unread_a, unread_b
+        )
+        SELECT
+            l.lo, l.hi, l.id, l.created_at, l.sender_account_id, LEFT(COALESCE(l.body, ''), %s),
+            COALESCE(ua.n, 0), COALESCE(ub.n, 0)
+        FROM last l
+        LEFT JOIN unread ua ON ua.lo=l.lo AND ua.hi=l.hi AND ua.reader=l.lo
+        LEFT JOIN unread ub ON ub.lo=l.lo AND ub.hi=l.hi AND ub.reader=l.hi
+        ON CONFLICT (user_a_id, user_b_id) DO UPDATE
+        SET last_message_id = GREATEST(c.last_message_id, EXCLUDED.last_message_id),
+            last_message_at = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                   THEN EXCLUDED.last_message_at ELSE c.last_message_at END,
+            last_sender_account_id = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                          THEN EXCLUDED.last_sender_account_id ELSE c.last_sender_account_id END,
+            last_preview = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                THEN EXCLUDED.last_preview ELSE c.last_preview END,
+            unread_a = EXCLUDED.unread_a,
+            unread_b = EXCLUDED.unread_b
         """,
-        (int(account_id), int(account_id)),
+        (CONVERSATION_PREVIEW_CHARS,),
     )
-    row = cur.fetchone() or {}
-    return int(row.get("unread_total") or 0)
 
 
-@router.get("", summary="Mesaj kutusu")
-def list_messages(with_account_id: Optional[int] = None, limit: int = 100, authorization: Optional[str] = Header(default=None)):
+# mobile_direct_messages indeksleri (ad, tanım); bölümlü tabloda ensure_partitioned_index ile kurulur.
+_MESSAGE_INDEXES = [
+    # Konuşma sayfalama / senkron (LEAST/GREATEST çifti + id).
+    (
+        "idx_mobile_dm_pair_id",
+        "(LEAST(sender_account_id, receiver_account_id), GREATEST(sender_account_id, receiver_account_id), id)",
+    ),
+    # Alıcı bazlı okunmamış hesapları (sayaç uzlaştırma) için.
+    ("idx_mobile_dm_receiver_sender_id", "(receiver_account_id, sender_account_id, id)"),
+    # Mesaj araması: Türkçe kök eşleşmesi + aksansız/parça eşleşme için trigram.
+    ("idx_mobile_dm_body_fts", f"USING gin ({_SEARCH_TSV})"),
+    ("idx_mobile_dm_body_trgm", f"USING gin ({_SEARCH_FOLD} gin_trgm_ops)"),
+]
+
+
+# Düz tablolardaki CONCURRENTLY indeksler (ad, tablo ve tanım).
+_PLAIN_INDEXES = [
+    # Destek gelen kutusunda ad/e-posta araması (LIKE '%...%').
+    ("idx_accounts_name_trgm", "accounts USING gin (LOWER(COALESCE(name, '')) gin_trgm_ops)"),
+    ("idx_accounts_email_trgm", "accounts USING gin (LOWER(COALESCE(email, '')) gin_trgm_ops)"),
+]
+
+
+def init_message_indexes():
+    # İndeks kurulumları açılışı bekletmesin diye arka plan işinde yapılır; burada yalnızca
+    # sorguların ihtiyaç duyduğu eklenti ve fonksiyon tanımlanır.
+    statements = [
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+        f"""
+        CREATE OR REPLACE FUNCTION mobile_text_fold(t TEXT) RETURNS TEXT
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE
+        AS $$ SELECT LOWER(TRANSLATE(COALESCE(t, ''), '{_FOLD_FROM}', '{_FOLD_TO}')) $$
+        """,
+    ]
     conn = _db_conn()
     try:
-        me = _require_account_id(conn, authorization)
+        conn.autocommit = True
         cur = conn.cursor()
-        if with_account_id is None:
-            cur.execute(
-                """
-                SELECT
-                    CASE WHEN m.sender_account_id=%s THEN m.receiver_account_id ELSE m.sender_account_id END AS peer_id,
-                    MAX(m.created_at) AS last_at
-                FROM mobile_direct_messages m
-                WHERE m.sender_account_id=%s OR m.receiver_account_id=%s
-                GROUP BY peer_id
-                ORDER BY MAX(m.created_at) DESC
-                LIMIT %s
-                """,
-                (me, me, me, max(1, min(int(limit), 500))),
-            )
-            rows = cur.fetchall() or []
-            by_peer: Dict[int, Dict[str, Any]] = {int(r["peer_id"]): dict(r) for r in rows}
+        for sql in statements:
+            try:
+                cur.execute(sql)
+            except Exception:
+                logger.exception("message indexes: açılış tanımı başarısız")
+    finally:
+        conn.close()
 
-            # Mesajı olmasa bile arkadaşları listeye ekle.
-            cur.execute(
-                """
-                SELECT CASE WHEN mf.user_a_id=%s THEN mf.user_b_id ELSE mf.user_a_id END AS peer_id
-                FROM mobile_friendships mf
-                WHERE mf.user_a_id=%s OR mf.user_b_id=%s
-                """,
-                (me, me, me),
-            )
-            for fr in cur.fetchall() or []:
-                pid = int(fr["peer_id"])
-                if pid not in by_peer:
-                    by_peer[pid] = {"peer_id": pid, "last_at": ""}
 
-            merged_rows = list(by_peer.values())
-            merged_rows.sort(key=lambda x: str(x.get("last_at") or ""), reverse=True)
+def build_message_indexes(conn) -> int:
+    """
+    Eksik ya da yarıda kalmış (INVALID) indeksleri kurar; tek worker çalıştırır. Hatalar
+    loglanır ve sonraki turda yeniden denenir. Kurulan/yeniden kurulan indeks sayısını döner.
+    """
+    cur = conn.cursor()
+    if not try_job_lock(cur, "mobile_message_indexes"):
+        conn.rollback()
+        return 0
+    # Job kilidi conn'un transaction'ında açık kalır. Büyük tabloda yazmaları kilitlememek için
+    # CONCURRENTLY; transaction dışında çalışması gerektiğinden ayrı autocommit bağlantı.
+    built = 0
+    work = _db_conn()
+    try:
+        work.autocommit = True
+        wcur = work.cursor()
+        for name, target in _PLAIN_INDEXES:
+            try:
+                drop_invalid_index(wcur, name)
+                wcur.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (name,))
+                if not wcur.fetchone()["present"]:
+                    wcur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {target}")
+                    built += 1
+            except Exception:
+                logger.exception("message indexes: %s kurulamadı", name)
+        # Bölümlü tabloda üst tabloya CONCURRENTLY kurulamaz; bölüm bölüm kurulup bağlanır.
+        partitioned = messages_partitioned(wcur)
+        for name, spec in _MESSAGE_INDEXES:
+            try:
+                if partitioned:
+                    ensure_partitioned_index(wcur, name, spec)
+                    continue
+                drop_invalid_index(wcur, name)
+                wcur.execute("SELECT to_regclass(%s) IS NOT NULL AS present", (name,))
+                if not wcur.fetchone()["present"]:
+                    wcur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON mobile_direct_messages {spec}")
+                    built += 1
+            except Exception:
+                logger.exception("message indexes: %s kurulamadı", name)
+    finally:
+        work.close()
+        conn.rollback()
+    return built
 
-            peer_ids = [int(r["peer_id"]) for r in merged_rows]
-            details: Dict[int, Dict[str, Any]] = {}
-            if peer_ids:
-                cur.execute(
-                    """
-                    SELECT id, COALESCE(name,'') AS name, COALESCE(email,'') AS email
-                    FROM accounts
-                    WHERE id = ANY(%s)
-                    """,
-                    (peer_ids,),
-                )
-                for r in cur.fetchall() or []:
-                    details[int(r["id"])] = dict(r)
-            unread_by_peer: Dict[int, int] = {}
+
+def _message_index_job():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        build_message_indexes(conn)
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def start_message_index_job():
+    start_periodic_job("mobile_message_indexes", MESSAGE_INDEX_JOB_INTERVAL_SEC, _message_index_job)
+
+
+def init_message_realtime():
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        # Toplu eklemelerde (duyuru vb.) tek tek bildirim yerine tek "*" bildirimi gider.
+        cur.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION mobile_dm_notify() RETURNS trigger AS $$
+            BEGIN
+                IF (SELECT COUNT(*) FROM mobile_dm_new_rows) > 500 THEN
+                    PERFORM pg_notify('{MESSAGE_CHANNEL}', '*');
+                ELSE
+                    PERFORM pg_notify(
+                        '{MESSAGE_CHANNEL}',
+                        n.id::text || ':' || n.sender_account_id::text || ':' || n.receiver_account_id::text
+                    )
+                    FROM mobile_dm_new_rows n;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        cur.execute(
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_mobile_dm_notify') THEN
+                    CREATE TRIGGER trg_mobile_dm_notify
+                    AFTER INSERT ON mobile_direct_messages
+                    REFERENCING NEW TABLE AS mobile_dm_new_rows
+                    FOR EACH STATEMENT EXECUTE PROCEDURE mobile_dm_notify();
+                END IF;
+            END$$;
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+    pg_listener.subscribe(MESSAGE_CHANNEL, _on_message_notify)
+
+
+class _Waiter:
+    __slots__ = ("loop", "event")
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+
+_WAITERS: Dict[int, Set[_Waiter]] = {}
+_WAITERS_LOCK = threading.Lock()
+
+
+def _add_waiter(account_id: int, waiter: _Waiter):
+    with _WAITERS_LOCK:
+        _WAITERS.setdefault(int(account_id), set()).add(waiter)
+
+
+def _remove_waiter(account_id: int, waiter: _Waiter):
+    with _WAITERS_LOCK:
+        ws = _WAITERS.get(int(account_id))
+        if ws is not None:
+            ws.discard(waiter)
+            if not ws:
+                _WAITERS.pop(int(account_id), None)
+
+
+def _wake_accounts(account_ids: List[int]):
+    with _WAITERS_LOCK:
+        if account_ids:
+            targets = [w for aid in account_ids for w in _WAITERS.get(int(aid), ())]
+        else:
+            targets = [w for ws in _WAITERS.values() for w in ws]
+    for w in targets:
+        try:
+            w.wake()
+        except RuntimeError:
+            pass
+
+
+def _on_message_notify(payload: str):
+    if payload == "*":
+        _wake_accounts([])
+        return
+    parts = (payload or "").split(":")
+    if len(parts) == 3 and all(p.isdigit() for p in parts):
+        _wake_accounts([int(parts[1]), int(parts[2])])
+
+
+def unread_messages_count(conn, account_id: int) -> int:
+    return badge_counts(conn, account_id)["unread_messages"]
+
+
+# (okuyan, karşı taraf) -> yazılmış okuma noktası. Okuma noktası yalnızca ilerlediği için
+# buradaki değer veritabanındakinden büyük olamaz; eşit/gerideki ilerlemeler yazılmaz.
+_READ_WATERMARKS: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+# Karşı tarafa gidecek, henüz yayınlanmamış okundu bilgileri (kısa aralıkla birleştirilir).
+_RECEIPTS_PENDING: Dict[Tuple[int, int], int] = {}
+_READ_LOCK = threading.Lock()
+
+
+def record_read_advance(conn, me: int, peer: int, last_read_message_id: int) -> bool:
+    """
+    Okuma noktasını ilerletir. Okuma durumu ve okunmamış sayaçlar hemen yazılır (rozet her
+    worker'da anında doğru); yalnızca karşı tarafa giden okundu bilgisi ertelenir.
+    """
+    key = (int(me), int(peer))
+    last = int(last_read_message_id)
+    with _READ_LOCK:
+        if _READ_WATERMARKS.get(key, 0) >= last:
+            return False
+    deferred = READ_STATE_FLUSH_INTERVAL_SEC > 0
+    advanced = _advance_read_state(conn.cursor(), me, peer, last, notify=not deferred)
+    conn.commit()
+    with _READ_LOCK:
+        _READ_WATERMARKS[key] = max(_READ_WATERMARKS.get(key, 0), last)
+        _READ_WATERMARKS.move_to_end(key)
+        while len(_READ_WATERMARKS) > READ_STATE_CACHE_MAX:
+            _READ_WATERMARKS.popitem(last=False)
+        if advanced and deferred:
+            _RECEIPTS_PENDING[key] = max(_RECEIPTS_PENDING.get(key, 0), last)
+    return advanced
+
+
+def _flush_receipts_job():
+    with _READ_LOCK:
+        if not _RECEIPTS_PENDING:
+            return
+    # Bağlantı açılamazsa kuyruk olduğu gibi kalır.
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        with _READ_LOCK:
+            items = sorted((k[0], k[1], v) for k, v in _RECEIPTS_PENDING.items())
+            _RECEIPTS_PENDING.clear()
+        try:
+            cur = conn.cursor()
+            for me, peer, last in items:
+                _publish_read_receipt(cur, me, peer, last)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            with _READ_LOCK:
+                for me, peer, last in items:
+                    _RECEIPTS_PENDING[(me, peer)] = max(_RECEIPTS_PENDING.get((me, peer), 0), last)
+            raise
+    finally:
+        conn.close()
+
+
+def start_read_state_flush():
+    start_periodic_job("mobile_read_receipt_flush", READ_STATE_FLUSH_INTERVAL_SEC, _flush_receipts_job)
+
+
+def _mark_read(conn, me: int, peer: int, rows: List[Dict[str, Any]]):
+    max_incoming_id = 0
+    for r in rows:
+        if int(r.get("sender_account_id") or 0) == peer and int(r.get("receiver_account_id") or 0) == me:
+            max_incoming_id = max(max_incoming_id, int(r.get("id") or 0))
+    if max_incoming_id > 0:
+        record_read_advance(conn, me, peer, max_incoming_id)
+
+
+def _publish_read_receipt(cur, me: int, peer: int, last_read_message_id: int):
+    # Karşı tarafın açık soketlerine okundu bilgisi gider.
+    publish_chat_event(
+        cur,
+        {"type": "read", "account_id": me, "peer_account_id": peer, "last_read_message_id": int(last_read_message_id)},
+    )
+
+
+def _advance_read_state(cur, me: int, peer: int, last_read_message_id: int, notify: bool = True) -> bool:
+    # Okunmamış sayaç, eski ve yeni okuma noktası arasındaki gelen mesaj kadar azaltılır;
+    # eşzamanlı gönderimlerin artırımıyla çakışmaz.
+    cur.execute(
+        """
+        WITH prev AS (
+            SELECT COALESCE((
+                SELECT last_read_message_id
+                FROM mobile_message_read_state
+                WHERE account_id=%(me)s AND peer_account_id=%(peer)s
+                FOR UPDATE
+            ), 0) AS id
+        ),
+        up AS (
+            INSERT INTO mobile_message_read_state (account_id, peer_account_id, last_read_message_id, last_read_at)
+            VALUES (%(me)s, %(peer)s, %(last)s, %(now)s)
+            ON CONFLICT (account_id, peer_account_id) DO UPDATE
+            SET last_read_message_id = EXCLUDED.last_read_message_id,
+                last_read_at = EXCLUDED.last_read_at
+            WHERE mobile_message_read_state.last_read_message_id < EXCLUDED.last_read_message_id
+            RETURNING last_read_message_id
+        ),
+        newly_read AS (
+            SELECT COUNT(*)::INTEGER AS n
+            FROM mobile_direct_messages, prev, up
+            WHERE LEAST(sender_account_id, receiver_account_id)=%(lo)s
+              AND GREATEST(sender_account_id, receiver_account_id)=%(hi)s
+              AND sender_account_id=%(peer)s
+              AND id > prev.id
+              AND id <= up.last_read_message_id
+        ),
+        conv AS (
+            UPDATE mobile_conversations c
+            SET unread_a = CASE WHEN c.user_a_id=%(me)s THEN GREATEST(0, c.unread_a - nr.n) ELSE c.unread_a END,
+                unread_b = CASE WHEN c.user_b_id=%(me)s THEN GREATEST(0, c.unread_b - nr.n) ELSE c.unread_b END
+            FROM newly_read nr
+            WHERE c.user_a_id=%(lo)s AND c.user_b_id=%(hi)s AND nr.n > 0
+        ),
+        badge AS (
+            UPDATE mobile_badge_counters bc
+            SET unread_messages = GREATEST(0, bc.unread_messages - nr.n), updated_at = NOW()
+            FROM newly_read nr
+            WHERE bc.account_id=%(me)s AND nr.n > 0
+        )
+        SELECT last_read_message_id FROM up
+        """,
+        {
+            "me": me,
+            "peer": peer,
+            "lo": min(me, peer),
+            "hi": max(me, peer),
+            "last": int(last_read_message_id),
+            "now": _iso_now(),
+        },
+    )
+    advanced = bool(cur.fetchone())
+    if advanced and notify:
+        _publish_read_receipt(cur, me, peer, last_read_message_id)
+    return advanced
+
+
+def publish_chat_event(cur, event: Dict[str, Any]):
+    pg_listener.notify(cur, CHAT_EVENT_CHANNEL, json.dumps(event, separators=(",", ":")))
+
+
+@router.get("", summary="Mesaj kutusu")
+def list_messages(
+    with_account_id: Optional[int] = None,
+    limit: int = 100,
+    after_id: Optional[int] = Query(default=None, ge=0),
+    before_id: Optional[int] = Query(default=None, ge=1),
+    authorization: Optional[str] = Header(default=None),
+):
+    conn = _db_conn()
+    try:
+        me = _require_account_id(conn, authorization)
+        cur = conn.cursor()
+        if with_account_id is None:
+            lim = max(1, min(int(limit), 500))
+            # İki indeks taraması (user_a / user_b) last_message_id sırasıyla birleşir.
             cur.execute(
                 """
-                SELECT
-                    m.sender_account_id AS peer_id,
-                    COUNT(*)::INTEGER AS unread_count
-                FROM mobile_direct_messages m
-                LEFT JOIN mobile_message_read_state rs
-                  ON rs.account_id=%s
-                 AND rs.peer_account_id=m.sender_account_id
-                WHERE m.receiver_account_id=%s
-                  AND m.id > COALESCE(rs.last_read_message_id, 0)
-                GROUP BY m.sender_account_id
+                SELECT c.*, COALESCE(a.name,'') AS name, COALESCE(a.email,'') AS email
+                FROM (
+                    (
+                        SELECT user_b_id AS peer_id, unread_a AS unread_count, last_message_id,
+                               last_message_at, last_sender_account_id, last_preview
+                        FROM mobile_conversations
+                        WHERE user_a_id=%(me)s AND last_message_id < %(before)s
+                        ORDER BY last_message_id DESC
+                        LIMIT %(lim)s
+                    )
+                    UNION ALL
+                    (
+                        SELECT user_a_id AS peer_id, unread_b AS unread_count, last_message_id,
+                               last_message_at, last_sender_account_id, last_preview
+                        FROM mobile_conversations
+                        WHERE user_b_id=%(me)s AND last_message_id < %(before)s
+                        ORDER BY last_message_id DESC
+                        LIMIT %(lim)s
+                    )
+                    ORDER BY last_message_id DESC
+                    LIMIT %(lim)s
+                ) c
+                LEFT JOIN accounts a ON a.id=c.peer_id
+                ORDER BY c.last_message_id DESC
                 """,
-                (me, me),
+                {"me": me, "before": int(before_id) if before_id is not None else 2**63 - 1, "lim": lim},
             )
-            for rr in cur.fetchall() or []:
-                unread_by_peer[int(rr["peer_id"])] = int(rr["unread_count"] or 0)
-
             out: List[Dict[str, Any]] = []
-            for r in merged_rows:
-                pid = int(r["peer_id"])
-                d = details.get(pid, {})
+            for r in cur.fetchall() or []:
                 out.append(
                     {
-                        "account_id": pid,
-                        "name": _display_name((d.get("name") or ""), (d.get("email") or "")),
-                        "last_at": (r.get("last_at") or ""),
-                        "unread_count": int(unread_by_peer.get(pid, 0)),
+                        "account_id": int(r["peer_id"]),
+                        "name": _display_name(r["name"], r["email"]),
+                        "last_at": (r.get("last_message_at") or ""),
+                        "last_message_id": int(r["last_message_id"]),
+                        "last_preview": r.get("last_preview") or "",
+                        "last_sender_account_id": r.get("last_sender_account_id"),
+                        "unread_count": int(r.get("unread_count") or 0),
                     }
                 )
-            return {"section": "mesajlar", "items": out, "unread_count": int(sum(unread_by_peer.values()))}
+            has_more = len(out) == lim
+            if not has_more and me != _support_account_id(conn):
+                # Son sayfada, henüz mesajlaşılmamış arkadaşlar da listelenir.
+                cur.execute(
+                    """
+                    SELECT f.peer_id, COALESCE(a.name,'') AS name, COALESCE(a.email,'') AS email
+                    FROM (
+                        SELECT friend_id AS peer_id FROM mobile_friend_edges WHERE account_id=%(me)s
+                    ) f
+                    LEFT JOIN accounts a ON a.id=f.peer_id
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM mobile_conversations c
+                        WHERE c.user_a_id=LEAST(%(me)s, f.peer_id) AND c.user_b_id=GREATEST(%(me)s, f.peer_id)
+                    )
+                    ORDER BY f.peer_id
+                    """,
+                    {"me": me},
+                )
+                for r in cur.fetchall() or []:
+                    out.append(
+                        {
+                            "account_id": int(r["peer_id"]),
+                            "name": _display_name(r["name"], r["email"]),
+                            "last_at": "",
+                            "last_message_id": None,
+                            "last_preview": "",
+                            "last_sender_account_id": None,
+                            "unread_count": 0,
+                        }
+                    )
+            return {
+                "section": "mesajlar",
+                "items": out,
+                "unread_count": unread_messages_count(conn, me),
+                "next_before_id": (out[-1]["last_message_id"] if has_more else None),
+                "has_more": has_more,
+            }
 
         peer = int(with_account_id)
         if peer == me:
             raise HTTPException(status_code=400, detail="Kendinizle mesajlaşamazsınız")
         if not _is_friend(conn, me, peer):
             raise HTTPException(status_code=403, detail="Sadece arkadaşlar arasında mesajlaşma açık")
+        lim = max(1, min(int(limit), 500))
+        where = [_PAIR_FILTER]
+        params: List[Any] = [min(me, peer), max(me, peer)]
+        if after_id is not None:
+            where.append("id > %s")
+            params.append(int(after_id))
+        if before_id is not None:
+            where.append("id < %s")
+            params.append(int(before_id))
+        # Yalnızca after_id verilirse en eskiden ileri (senkron), aksi halde en yeniden geriye (geçmiş).
+        forward = after_id is not None and before_id is None
         cur.execute(
-            """
+            f"""
             SELECT id, sender_account_id, receiver_account_id, body, created_at
             FROM mobile_direct_messages
-            WHERE (sender_account_id=%s AND receiver_account_id=%s)
-               OR (sender_account_id=%s AND receiver_account_id=%s)
-            ORDER BY id DESC
+            WHERE {" AND ".join(where)}
+            ORDER BY id {"ASC" if forward else "DESC"}
             LIMIT %s
             """,
-            (me, peer, peer, me, max(1, min(int(limit), 500))),
+            tuple(params + [lim]),
+        )
+        rows = cur.fetchall() or []
+        if not forward:
+            rows.reverse()
+        has_more = len(rows) == lim
+        floor = None if forward or has_more else live_message_floor(conn)
+        if floor is not None:
+            # Canlı bölümler bitti; arşive yalnızca kullanıcı geriye kaydırınca (before_id) inilir.
+            if before_id is not None:
+                oldest = min([int(r["id"]) for r in rows] + [int(before_id)])
+                older = archived_pair_messages(conn, me, peer, oldest, lim - len(rows))
+                rows = list(reversed(older)) + rows
+                has_more = len(rows) == lim
+            else:
+                has_more = True
+        _mark_read(conn, me, peer, rows)
+        ids = [int(r["id"]) for r in rows]
+        return {
+            "section": "mesajlar",
+            "with_account_id": peer,
+            "me_account_id": me,
+            "items": rows,
+            "latest_id": max(ids + [int(after_id or 0)]),
+            "next_before_id": ((min(ids) if ids else floor) if has_more and not forward else None),
+            "has_more": has_more,
+        }
+    finally:
+        conn.close()
+
+
+_SUPPORT_STATE: Dict[str, Any] = {"id": None}
+
+
+def _support_account_id(conn) -> Optional[int]:
+    if not SUPPORT_ACCOUNT_EMAIL:
+        return None
+    if _SUPPORT_STATE["id"] is None:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM accounts WHERE LOWER(email)=LOWER(%s) LIMIT 1", (SUPPORT_ACCOUNT_EMAIL,))
+        row = cur.fetchone()
+        if row:
+            _SUPPORT_STATE["id"] = int(row["id"])
+    return _SUPPORT_STATE["id"]
+
+
+def _parse_support_cursor(cursor: Optional[str]) -> Optional[tuple[int, int, int]]:
+    if not cursor:
+        return None
+    parts = cursor.split(":")
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+    return int(parts[0]), int(parts[1]), int(parts[2])
+
+
+def _support_phase(cur, me: int, unread: bool, before_id: int, lim: int) -> List[Dict[str, Any]]:
+    # Destek hesabı çiftin iki tarafında da olabilir; her taraf kendi indeksiyle taranır.
+    op = ">" if unread else "="
+    branches = []
+    for me_col, peer_col, unread_col in (("user_a_id", "user_b_id", "unread_a"), ("user_b_id", "user_a_id", "unread_b")):
+        branches.append(
+            f"""
+            (
+                SELECT {peer_col} AS peer_id, {unread_col} AS unread_count, last_message_id,
+                       last_message_at, last_sender_account_id, last_preview
+                FROM mobile_conversations
+                WHERE {me_col}=%(me)s AND {unread_col} {op} 0 AND last_message_id < %(before)s
+                ORDER BY last_message_id DESC
+                LIMIT %(lim)s
+            )
+            """
         )
-        rows = list(reversed(cur.fetchall() or []))
-        max_incoming_id = 0
+    cur.execute(
+        f"""
+        SELECT c.*, COALESCE(a.name,'') AS name, COALESCE(a.email,'') AS email
+        FROM (
+            {" UNION ALL ".join(branches)}
+            ORDER BY last_message_id DESC
+            LIMIT %(lim)s
+        ) c
+        LEFT JOIN accounts a ON a.id=c.peer_id
+        ORDER BY c.last_message_id DESC
+        """,
+        {"me": me, "before": before_id, "lim": lim},
+    )
+    return cur.fetchall() or []
+
+
+def _support_search(cur, me: int, q: str, after: Optional[tuple[int, int, int]], lim: int) -> List[Dict[str, Any]]:
+    # Aramada mesajlaşılmamış arkadaşlar da döner (yeni konuşma başlatmak için).
+    pattern = "%" + q.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    cur.execute(
+        """
+        SELECT *
+        FROM (
+            SELECT
+                a.id AS peer_id,
+                COALESCE(a.name,'') AS name,
+                COALESCE(a.email,'') AS email,
+                CASE WHEN c.user_a_id=%(me)s THEN c.unread_a ELSE COALESCE(c.unread_b, 0) END AS unread_count,
+                COALESCE(c.last_message_id, 0) AS last_message_id,
+                c.last_message_at,
+                c.last_sender_account_id,
+                COALESCE(c.last_preview, '') AS last_preview
+            FROM accounts a
+            LEFT JOIN mobile_conversations c
+              ON c.user_a_id=LEAST(%(me)s, a.id) AND c.user_b_id=GREATEST(%(me)s, a.id)
+            WHERE a.id <> %(me)s
+              AND (LOWER(COALESCE(a.name, '')) LIKE %(pattern)s OR LOWER(COALESCE(a.email, '')) LIKE %(pattern)s)
+              AND (
+                  c.user_a_id IS NOT NULL
+                  OR EXISTS (
+                      SELECT 1 FROM mobile_friendships f
+                      WHERE f.user_a_id=LEAST(%(me)s, a.id) AND f.user_b_id=GREATEST(%(me)s, a.id)
+                  )
+              )
+        ) t
+        WHERE (%(has_after)s = FALSE
+               OR ((t.unread_count > 0)::int, t.last_message_id, t.peer_id) < (%(cu)s, %(cl)s, %(cp)s))
+        ORDER BY (t.unread_count > 0) DESC, t.last_message_id DESC, t.peer_id DESC
+        LIMIT %(lim)s
+        """,
+        {
+            "me": me,
+            "pattern": pattern,
+            "has_after": after is not None,
+            "cu": after[0] if after else 0,
+            "cl": after[1] if after else 0,
+            "cp": after[2] if after else 0,
+            "lim": lim,
+        },
+    )
+    return cur.fetchall() or []
+
+
+@router.get("/support/inbox", summary="Destek hesabı gelen kutusu")
+def support_inbox(
+    limit: int = Query(default=50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    q: Optional[str] = Query(default=None, max_length=100),
+    authorization: Optional[str] = Header(default=None),
+):
+    # Ad/e-posta araması trigram indeksine dayanır; 3 karakterden kısa sorgu tüm tabloyu tarar.
+    term = (q or "").strip()
+    if term and len(term) < 3:
+        raise HTTPException(status_code=400, detail="Arama en az 3 karakter olmalı")
+    conn = _db_conn()
+    try:
+        me = _require_account_id(conn, authorization)
+        if me != _support_account_id(conn):
+            raise HTTPException(status_code=403, detail="Sadece destek hesabı erişebilir")
+        after = _parse_support_cursor(cursor)
+        cur = conn.cursor()
+        if term:
+            rows = _support_search(cur, me, term, after, limit)
+        else:
+            # Önce okunmamış konuşmalar, sonra diğerleri; her grup son mesaja göre yeniden eskiye.
+            rows = []
+            max_id = 2**63 - 1
+            if after is None or after[0] == 1:
+                rows = _support_phase(cur, me, True, after[1] if after else max_id, limit)
+            if len(rows) < limit:
+                before = after[1] if after is not None and after[0] == 0 else max_id
+                rows += _support_phase(cur, me, False, before, limit - len(rows))
+        out: List[Dict[str, Any]] = []
         for r in rows:
-            if int(r.get("sender_account_id") or 0) == peer and int(r.get("receiver_account_id") or 0) == me:
-                max_incoming_id = max(max_incoming_id, int(r.get("id") or 0))
-        if max_incoming_id > 0:
-            cur.execute(
-                """
-                INSERT INTO mobile_message_read_state (account_id, peer_account_id, last_read_message_id, last_read_at)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (account_id, peer_account_id) DO UPDATE
-                SET last_read_message_id = GREATEST(mobile_message_read_state.last_read_message_id, EXCLUDED.last_read_message_id),
-                    last_read_at = EXCLUDED.last_read_at
-                """,
-                (me, peer, max_incoming_id, _iso_now()),
+            out.append(
+                {
+                    "account_id": int(r["peer_id"]),
+                    "name": _display_name(r["name"], r["email"]),
+                    "email": r["email"],
+                    "last_at": (r.get("last_message_at") or ""),
+                    "last_message_id": int(r["last_message_id"] or 0) or None,
+                    "last_preview": r.get("last_preview") or "",
+                    "last_sender_account_id": r.get("last_sender_account_id"),
+                    "unread_count": int(r.get("unread_count") or 0),
+                }
             )
-            conn.commit()
-        return {"section": "mesajlar", "with_account_id": peer, "me_account_id": me, "items": rows}
+        has_more = len(out) == limit
+        next_cursor = None
+        if has_more:
+            last = out[-1]
+            next_cursor = f"{1 if last['unread_count'] > 0 else 0}:{last['last_message_id'] or 0}:{last['account_id']}"
+        return {
+            "section": "destek",
+            "items": out,
+            "unread_count": unread_messages_count(conn, me),
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+        }
+    finally:
+        conn.close()
+
+
+def _fold(text: str) -> str:
+    return text.translate(_FOLD_TABLE).lower()
+
+
+def _search_snippet(body: str, headline: str, folded_q: str) -> Dict[str, Any]:
+    # ts_headline işaretleri (\x01..\x02) metinden ayıklanıp [başlangıç, bitiş) aralıklarına çevrilir.
+    text_parts: List[str] = []
+    highlights: List[List[int]] = []
+    pos = 0
+    for i, chunk in enumerate((headline or "").split(_HL_START)):
+        if i == 0:
+            text_parts.append(chunk)
+            pos += len(chunk)
+            continue
+        marked, _, rest = chunk.partition(_HL_STOP)
+        highlights.append([pos, pos + len(marked)])
+        text_parts.append(marked + rest)
+        pos += len(marked) + len(rest)
+    if highlights:
+        return {"snippet": "".join(text_parts), "highlights": highlights}
+    # Yalnızca trigram ile eşleşti; parçanın geçtiği yerin çevresi gösterilir.
+    folded = _fold(body)
+    at = folded.find(folded_q) if folded_q and len(folded) == len(body) else -1
+    if at < 0:
+        return {"snippet": body[:CONVERSATION_PREVIEW_CHARS], "highlights": []}
+    start = max(0, at - CONVERSATION_PREVIEW_CHARS // 2)
+    snippet = body[start:start + CONVERSATION_PREVIEW_CHARS]
+    end = min(at + len(folded_q), start + len(snippet))
+    prefix = "…" if start > 0 else ""
+    return {
+        "snippet": prefix + snippet,
+        "highlights": [[at - start + len(prefix), end - start + len(prefix)]],
+    }
+
+
+@router.get("/search", summary="Mesajlarda ara")
+def search_messages(
+    q: str = Query(min_length=2, max_length=100),
+    limit: int = Query(default=20, ge=1, le=50),
+    before_id: Optional[int] = Query(default=None, ge=1),
+    authorization: Optional[str] = Header(default=None),
+):
+    """
+    Kullanıcının kendi konuşmalarında arar (en yeniden eskiye, before_id ile sayfalanır).
+    Türkçe tam metin eşleşmesine ek olarak 3+ karakterli sorgularda aksansız parça
+    eşleşmesi (trigram) de kabul edilir. Arşive taşınmış bölümler aranmaz.
+    """
+    term = q.strip()
+    if len(term) < 2:
+        raise HTTPException(status_code=400, detail="Arama en az 2 karakter olmalı")
+    folded_q = _fold(term)
+    use_trgm = len(folded_q) >= 3
+    conn = _db_conn()
+    try:
+        me = _require_account_id(conn, authorization)
+        cur = conn.cursor()
+        match = f"{_SEARCH_TSV} @@ websearch_to_tsquery('turkish', %(q)s)"
+        if use_trgm:
+            match = f"({match} OR {_SEARCH_FOLD} LIKE %(pattern)s)"
+        cur.execute(
+            f"""
+            SELECT
+                m.id, m.sender_account_id, m.receiver_account_id, m.body, m.created_at,
+                COALESCE(a.name,'') AS name, COALESCE(a.email,'') AS email,
+                ts_headline('turkish', m.body, websearch_to_tsquery('turkish', %(q)s), %(hl)s) AS headline
+            FROM (
+                SELECT id, sender_account_id, receiver_account_id, body, created_at
+                FROM mobile_direct_messages
+                WHERE (sender_account_id=%(me)s OR receiver_account_id=%(me)s)
+                  AND id < %(before)s
+                  AND {match}
+                ORDER BY id DESC
+                LIMIT %(lim)s
+            ) m
+            LEFT JOIN accounts a
+              ON a.id = CASE WHEN m.sender_account_id=%(me)s THEN m.receiver_account_id ELSE m.sender_account_id END
+            ORDER BY m.id DESC
+            """,
+            {
+                "me": me,
+                "q": term,
+                "pattern": "%" + folded_q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",
+                "before": int(before_id) if before_id is not None else 2**63 - 1,
+                "lim": limit,
+                "hl": f'StartSel="{_HL_START}", StopSel="{_HL_STOP}", MaxWords=20, MinWords=6, MaxFragments=2, FragmentDelimiter=" … "',
+            },
+        )
+        out: List[Dict[str, Any]] = []
+        for r in cur.fetchall() or []:
+            peer = int(r["receiver_account_id"]) if int(r["sender_account_id"]) == me else int(r["sender_account_id"])
+            item = {
+                "id": int(r["id"]),
+                "peer_account_id": peer,
+                "peer_name": _display_name(r["name"], r["email"]),
+                "sender_account_id": int(r["sender_account_id"]),
+                "created_at": r.get("created_at") or "",
+            }
+            item.update(_search_snippet(r.get("body") or "", r.get("headline") or "", folded_q))
+            out.append(item)
+        has_more = len(out) == limit
+        return {
+            "section": "mesajlar",
+            "q": term,
+            "items": out,
+            "next_before_id": (out[-1]["id"] if has_more else None),
+            "has_more": has_more,
+        }
+    finally:
+        conn.close()
+
+
+def _wait_prepare(authorization: Optional[str], with_account_id: int) -> tuple[int, int]:
+    conn = _db_conn()
+    try:
+        me = _require_account_id(conn, authorization)
+        peer = int(with_account_id)
+        if peer == me:
+            raise HTTPException(status_code=400, detail="Kendinizle mesajlaşamazsınız")
+        if not _is_friend(conn, me, peer):
+            raise HTTPException(status_code=403, detail="Sadece arkadaşlar arasında mesajlaşma açık")
+        return me, peer
+    finally:
+        conn.close()
+
+
+def _messages_after(me: int, peer: int, after_id: int, limit: int) -> List[Dict[str, Any]]:
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            f"""
+            SELECT id, sender_account_id, receiver_account_id, body, created_at
+            FROM mobile_direct_messages
+            WHERE {_PAIR_FILTER}
+              AND id > %s
+            ORDER BY id ASC
+            LIMIT %s
+            """,
+            (min(me, peer), max(me, peer), int(after_id), int(limit)),
+        )
+        rows = cur.fetchall() or []
+        _mark_read(conn, me, peer, rows)
+        return rows
     finally:
         conn.close()
 
 
+@router.get("/wait", summary="Yeni mesajı bekle (long-poll)")
+async def wait_messages(
+    with_account_id: int,
+    after_id: int = 0,
+    timeout: float = Query(default=MESSAGE_WAIT_MAX_SEC, ge=0, le=MESSAGE_WAIT_MAX_SEC),
+    limit: int = Query(default=100, ge=1, le=500),
+    authorization: Optional[str] = Header(default=None),
+):
+    me, peer = await run_in_threadpool(_wait_prepare, authorization, with_account_id)
+    # Bekleyen kayıt DB kontrolünden önce yapılır; arada gelen mesaj kaçmaz.
+    waiter = _Waiter()
+    _add_waiter(me, waiter)
+    try:
+        deadline = time.monotonic() + float(timeout)
+        while True:
+            waiter.event.clear()
+            rows = await run_in_threadpool(_messages_after, me, peer, after_id, limit)
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                break
+            step = remaining if pg_listener.is_connected() else min(remaining, MESSAGE_WAIT_FALLBACK_POLL_SEC)
+            try:
+                await asyncio.wait_for(waiter.event.wait(), timeout=step)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        _remove_waiter(me, waiter)
+    latest_id = max([int(after_id)] + [int(r["id"]) for r in rows])
+    return {
+        "section": "mesajlar",
+        "with_account_id": peer,
+        "me_account_id": me,
+        "items": rows,
+        "latest_id": latest_id,
+        "timed_out": not rows,
+    }
+
+
 @router.post("/send", summary="Arkadaşa mesaj gönder")
 def send_message(payload: SendMessageRequest, authorization: Optional[str] = Header(default=None)):
     body = (payload.body or "").strip()
@@ -264,14 +1138,67 @@ def send_message(payload: SendMessageRequest, authorization: Optional[str] = Hea
         cur = conn.cursor()
         cur.execute(
             """
-            INSERT INTO mobile_direct_messages (sender_account_id, receiver_account_id, body, created_at)
-            VALUES (%s,%s,%s,%s)
-            RETURNING id
+            WITH ins AS (
+                INSERT INTO mobile_direct_messages (sender_account_id, receiver_account_id, body, created_at)
+                VALUES (%(me)s, %(to)s, %(body)s, %(now)s)
+                RETURNING id, created_at
+            ),
+            conv AS (
+                INSERT INTO mobile_conversations AS c (
+                    user_a_id, user_b_id, last_message_id, last_message_at,
+                    last_sender_account_id, last_preview, unread_a, unread_b
+                )
+                SELECT %(lo)s, %(hi)s, ins.id, ins.created_at, %(me)s, LEFT(%(body)s, %(preview)s),
+                       CASE WHEN %(to)s=%(lo)s THEN 1 ELSE 0 END,
+                       CASE WHEN %(to)s=%(hi)s THEN 1 ELSE 0 END
+                FROM ins
+                ON CONFLICT (user_a_id, user_b_id) DO UPDATE
+                SET last_message_id = GREATEST(c.last_message_id, EXCLUDED.last_message_id),
+                    last_message_at = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                           THEN EXCLUDED.last_message_at ELSE c.last_message_at END,
+                    last_sender_account_id = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                                  THEN EXCLUDED.last_sender_account_id ELSE c.last_sender_account_id END,
+                    last_preview = CASE WHEN EXCLUDED.last_message_id > c.last_message_id
+                                        THEN EXCLUDED.last_preview ELSE c.last_preview END,
+                    unread_a = c.unread_a + EXCLUDED.unread_a,
+                    unread_b = c.unread_b + EXCLUDED.unread_b
+            ),
+            badge AS (
+                INSERT INTO mobile_badge_counters AS bc (account_id, unread_messages)
+                SELECT %(to)s, 1 FROM ins
+                ON CONFLICT (account_id) DO UPDATE
+                SET unread_messages = bc.unread_messages + 1, updated_at = NOW()
+            )
+            SELECT id FROM ins
             """,
-            (me, to_id, body, _iso_now()),
+            {
+                "me": me,
+                "to": to_id,
+                "lo": min(me, to_id),
+                "hi": max(me, to_id),
+                "body": body,
+                "now": _iso_now(),
+                "preview": CONVERSATION_PREVIEW_CHARS,
+            },
         )
         mid = int(cur.fetchone()["id"])
         conn.commit()
         return {"ok": True, "message_id": mid}
     finally:
         conn.close()
+
+
+@router.post("/typing", summary="Yazıyor bilgisini gönder")
+def send_typing(payload: TypingRequest, authorization: Optional[str] = Header(default=None)):
+    conn = _db_conn()
+    try:
+        me = _require_account_id(conn, authorization)
+        to_id = int(payload.to_account_id)
+        if to_id == me or not _is_friend(conn, me, to_id):
+            raise HTTPException(status_code=403, detail="Sadece arkadaşlar arasında mesajlaşma açık")
+        cur = conn.cursor()
+        publish_chat_event(cur, {"type": "typing", "from_account_id": me, "to_account_id": to_id, "is_typing": bool(payload.is_typing)})
+        conn.commit()
+        return {"ok": True}
+    finally:
+        conn.close()
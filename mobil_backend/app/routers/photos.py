@@ -1,15 +1,83 @@
+import base64
+import hashlib
+import json
+import logging
+import math
 import os
-from typing import Any, Dict, List, Optional
+import re
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+from urllib.parse import quote
 
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
 from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+
+from app import pg_listener
+from app.jobs import start_periodic_job, try_job_lock
+from app.reaction_shards import (
+    REACTION_SHARD_COUNT,
+    hot_items_sql,
+    maybe_promote,
+    pick_shard,
+    shard_rows_sql,
+    shard_sum_sql,
+)
+from app.zipstream import ZipLayout, stat_entry
 
 router = APIRouter(prefix="/photos", tags=["Fotoğraflar"])
 
 DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
 PUBLIC_MEDIA_BASE = os.getenv("PUBLIC_MEDIA_BASE", "https://foto.dansmagazin.net").rstrip("/")
 PUBLIC_WEB_BASE = os.getenv("PUBLIC_WEB_BASE", "https://foto.dansmagazin.net").rstrip("/")
+PHOTOS_DB_POOL_MAX = int(os.getenv("PHOTOS_DB_POOL_MAX", "20"))
+PHOTO_REACTION_BATCH_MAX = 200
+PHOTO_LIKE_CACHE_ACCOUNTS = int(os.getenv("PHOTO_LIKE_CACHE_ACCOUNTS", "5000"))
+PHOTO_LIKE_CACHE_MAX_IDS = int(os.getenv("PHOTO_LIKE_CACHE_MAX_IDS", "50000"))
+PHOTO_LIKES_CHANNEL = "photo_likes_changed"
+PHOTO_MEDIA_ROOT = os.path.realpath(os.getenv("PHOTO_MEDIA_ROOT", "/home/ubuntu/etkinlik_fotograf_projesi/media"))
+PHOTO_ZIP_MAX_CONCURRENT = int(os.getenv("PHOTO_ZIP_MAX_CONCURRENT", "2"))
+PHOTO_ZIP_MAX_FILES = int(os.getenv("PHOTO_ZIP_MAX_FILES", "5000"))
+PHOTO_ZIP_CHUNK_BYTES = 256 * 1024
+ALBUM_STATS_RECONCILE_INTERVAL_SEC = int(os.getenv("ALBUM_STATS_RECONCILE_INTERVAL_SEC", "3600"))
+ALBUM_STATS_RECONCILE_RETRIES = 3
+TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "24"))
+TRENDING_REFRESH_SEC = int(os.getenv("TRENDING_REFRESH_SEC", "60"))
+TRENDING_ALBUM_PHOTO_WEIGHT = float(os.getenv("TRENDING_ALBUM_PHOTO_WEIGHT", "0.25"))
+TRENDING_SEED_DAYS = 7
+# Aynı hesabın aynı öğeyi bu süre içinde tekrar beğenmesi (beğen/geri al/beğen) puana eklenmez.
+TRENDING_RELIKE_WINDOW_DAYS = TRENDING_SEED_DAYS
+
+logger = logging.getLogger(__name__)
+
+_DB_POOL: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+_DB_POOL_LOCK = threading.Lock()
+
+_LIKE_CACHE: "OrderedDict[int, _LikedSet]" = OrderedDict()
+_LIKE_CACHE_EPOCH: Dict[int, int] = {}
+# Epoch sözlüğü her sıfırlandığında artar; yükleme (nesil, epoch) çiftini karşılaştırır.
+_LIKE_CACHE_GEN = {"value": 0}
+_LIKE_CACHE_LOCK = threading.Lock()
+_ZIP_SLOTS = threading.BoundedSemaphore(max(1, PHOTO_ZIP_MAX_CONCURRENT))
+
+
+class PhotoReactionOp(BaseModel):
+    photo_id: int
+    like: bool
+
+
+class PhotoReactionBatchRequest(BaseModel):
+    operations: List[PhotoReactionOp] = Field(default_factory=list)
 
 
 def _db_conn():
@@ -22,6 +90,50 @@ def _db_conn():
     )
 
 
+def _db_pool() -> Optional[psycopg2.pool.ThreadedConnectionPool]:
+    global _DB_POOL
+    if not DATABASE_URL:
+        return None
+    if _DB_POOL is None:
+        with _DB_POOL_LOCK:
+            if _DB_POOL is None:
+                _DB_POOL = psycopg2.pool.ThreadedConnectionPool(
+                    1,
+                    max(1, PHOTOS_DB_POOL_MAX),
+                    DATABASE_URL,
+                    connect_timeout=3,
+                    cursor_factory=psycopg2.extras.RealDictCursor,
+                )
+    return _DB_POOL
+
+
+@contextmanager
+def _pooled_conn() -> Iterator[Any]:
+    pool = _db_pool()
+    if pool is None:
+        yield None
+        return
+    try:
+        conn = pool.getconn()
+    except psycopg2.pool.PoolError:
+        # Havuz doluysa isteği düşürmek yerine geçici bağlantı aç.
+        conn = _db_conn()
+        try:
+            yield conn
+        finally:
+            conn.close()
+        return
+    try:
+        yield conn
+    finally:
+        if not conn.closed:
+            try:
+                conn.rollback()
+            except Exception:
+                pass
+        pool.putconn(conn, close=bool(conn.closed))
+
+
 def init_photo_reaction_tables():
     conn = _db_conn()
     if not conn:
@@ -67,6 +179,356 @@ def init_photo_reaction_tables():
             """
         )
         conn.commit()
+        # Trending yenilemesi yeni beğenileri created_at aralığıyla okur. Var olan büyük
+        # tablolarda yazmaları kilitlememek için CONCURRENTLY (transaction dışında).
+        conn.autocommit = True
+        for table in ("photo_item_user_likes", "photo_album_user_likes"):
+            name = f"idx_{table}_created_at"
+            try:
+                # Yarıda kalmış (INVALID) kurulum IF NOT EXISTS'e takılmasın.
+                cur.execute("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(%s)", (name,))
+                row = cur.fetchone()
+                if row and not row["indisvalid"]:
+                    cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                cur.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {table}(created_at)")
+            except Exception:
+                pass
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def init_photo_zip_tables():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        # Toplu indirmede merkezi dizin her dosyanın CRC'sini ister; (yol, boyut, mtime)
+        # değişmedikçe bir kez hesaplanan değer tüm worker'larda ve yeniden başlatmada kullanılır.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS photo_zip_crcs (
+                path TEXT NOT NULL,
+                size BIGINT NOT NULL,
+                mtime_ns BIGINT NOT NULL,
+                crc BIGINT NOT NULL,
+                PRIMARY KEY (path, size, mtime_ns)
+            )
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def _load_zip_crcs(conn, entries) -> Dict[tuple, int]:
+    cur = conn.cursor()
+    try:
+        cur.execute(
+            """
+            SELECT c.path, c.size, c.mtime_ns, c.crc
+            FROM photo_zip_crcs c
+            JOIN unnest(%s::text[], %s::bigint[], %s::bigint[]) AS k(path, size, mtime_ns)
+              ON c.path = k.path AND c.size = k.size AND c.mtime_ns = k.mtime_ns
+            """,
+            ([e.path for e in entries], [e.size for e in entries], [e.mtime_ns for e in entries]),
+        )
+        rows = cur.fetchall() or []
+    except Exception:
+        conn.rollback()
+        return {}
+    return {(r["path"], int(r["size"]), int(r["mtime_ns"])): int(r["crc"]) for r in rows}
+
+
+def _save_zip_crcs(crcs: Dict[tuple, int]):
+    if not crcs:
+        return
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        keys = list(crcs)
+        cur = conn.cursor()
+        cur.execute(
+            """
+            INSERT INTO photo_zip_crcs (path, size, mtime_ns, crc)
+            SELECT * FROM unnest(%s::text[], %s::bigint[], %s::bigint[], %s::bigint[])
+            ON CONFLICT (path, size, mtime_ns) DO NOTHING
+            """,
+            ([k[0] for k in keys], [k[1] for k in keys], [k[2] for k in keys], [crcs[k] for k in keys]),
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def init_album_stats_table():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS album_stats (
+                event_id TEXT PRIMARY KEY,
+                photo_count INTEGER NOT NULL DEFAULT 0,
+                max_photo_id BIGINT NOT NULL DEFAULT 0,
+                cover_path TEXT,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_album_stats_max_photo ON album_stats(max_photo_id DESC)")
+        # Fonksiyonlarda kolon yerine dizi event_photos.event_id tipine çevrilir (indeks kullanılsın).
+        cur.execute(
+            """
+            SELECT format_type(atttypid, atttypmod) AS t FROM pg_attribute
+            WHERE attrelid = to_regclass('event_photos') AND attname = 'event_id' AND NOT attisdropped
+            """
+        )
+        etype = (cur.fetchone() or {}).get("t") or "text"
+        # Tam yeniden hesap; ilk doldurma ve reconcile işi kullanır.
+        cur.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION album_stats_refresh(ids TEXT[]) RETURNS void AS $$
+            BEGIN
+                DELETE FROM album_stats s
+                WHERE s.event_id = ANY(ids)
+                  AND NOT EXISTS (SELECT 1 FROM event_photos ep WHERE ep.event_id = s.event_id::{etype});
+                INSERT INTO album_stats (event_id, photo_count, max_photo_id, cover_path, updated_at)
+                SELECT agg.event_id, agg.photo_count, agg.max_photo_id, ep.file_path, NOW()
+                FROM (
+                    SELECT event_id::text AS event_id, COUNT(*)::INTEGER AS photo_count, MAX(id) AS max_photo_id
+                    FROM event_photos
+                    WHERE event_id = ANY(ids::{etype}[])
+                    GROUP BY event_id
+                ) agg
+                JOIN event_photos ep ON ep.id = agg.max_photo_id
+                ON CONFLICT (event_id) DO UPDATE
+                SET photo_count = EXCLUDED.photo_count,
+                    max_photo_id = EXCLUDED.max_photo_id,
+                    cover_path = EXCLUDED.cover_path,
+                    updated_at = NOW();
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        # Eklemede tam sayım yapılmaz; toplu yüklemeler tek statement içinde birleştirilir.
+        cur.execute(
+            """
+            CREATE OR REPLACE FUNCTION album_stats_add(eids TEXT[], pids BIGINT[], paths TEXT[]) RETURNS void AS $$
+            BEGIN
+                INSERT INTO album_stats (event_id, photo_count, max_photo_id, cover_path, updated_at)
+                SELECT
+                    r.eid,
+                    COUNT(*)::INTEGER,
+                    MAX(r.pid),
+                    (ARRAY_AGG(r.path ORDER BY r.pid DESC))[1],
+                    NOW()
+                FROM unnest(eids, pids, paths) AS r(eid, pid, path)
+                WHERE r.eid IS NOT NULL
+                GROUP BY r.eid
+                ORDER BY r.eid
+                ON CONFLICT (event_id) DO UPDATE
+                SET photo_count = album_stats.photo_count + EXCLUDED.photo_count,
+                    cover_path = CASE
+                        WHEN EXCLUDED.max_photo_id >= album_stats.max_photo_id THEN EXCLUDED.cover_path
+                        ELSE album_stats.cover_path
+                    END,
+                    max_photo_id = GREATEST(album_stats.max_photo_id, EXCLUDED.max_photo_id),
+                    updated_at = NOW();
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        # Silmede de sayı farkla düşülür (yeniden sayım eşzamanlı eklemenin artışını ezerdi).
+        # Kapak yalnızca silinen fotoğraf kapaksa seçilir; bu statement satır kilidinden
+        # sonra yeni snapshot aldığı için araya giren ekleme de görülür.
+        cur.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION album_stats_remove(eids TEXT[], pids BIGINT[]) RETURNS void AS $$
+            BEGIN
+                UPDATE album_stats s
+                SET photo_count = GREATEST(0, s.photo_count - d.n), updated_at = NOW()
+                FROM (
+                    SELECT r.eid, COUNT(*)::INTEGER AS n
+                    FROM unnest(eids, pids) AS r(eid, pid)
+                    WHERE r.eid IS NOT NULL
+                    GROUP BY r.eid
+                ) d
+                WHERE s.event_id = d.eid;
+                UPDATE album_stats s
+                SET max_photo_id = COALESCE(top.id, 0), cover_path = top.file_path, updated_at = NOW()
+                FROM unnest(eids, pids) AS r(eid, pid)
+                LEFT JOIN LATERAL (
+                    SELECT ep.id, ep.file_path FROM event_photos ep
+                    WHERE ep.event_id = r.eid::{etype}
+                    ORDER BY ep.id DESC
+                    LIMIT 1
+                ) top ON TRUE
+                WHERE s.event_id = r.eid AND s.max_photo_id = r.pid;
+                DELETE FROM album_stats s
+                WHERE s.event_id = ANY(eids) AND s.photo_count <= 0
+                  AND NOT EXISTS (SELECT 1 FROM event_photos ep WHERE ep.event_id = s.event_id::{etype});
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        cur.execute(
+            """
+            CREATE OR REPLACE FUNCTION album_stats_after_insert() RETURNS trigger AS $$
+            DECLARE
+                eids TEXT[];
+                pids BIGINT[];
+                paths TEXT[];
+            BEGIN
+                SELECT ARRAY_AGG(n.event_id::text), ARRAY_AGG(n.id), ARRAY_AGG(n.file_path)
+                INTO eids, pids, paths
+                FROM album_stats_new_rows n;
+                PERFORM album_stats_add(eids, pids, paths);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        cur.execute(
+            """
+            CREATE OR REPLACE FUNCTION album_stats_after_delete() RETURNS trigger AS $$
+            DECLARE
+                eids TEXT[];
+                pids BIGINT[];
+            BEGIN
+                SELECT ARRAY_AGG(o.event_id::text), ARRAY_AGG(o.id) INTO eids, pids
+                FROM album_stats_old_rows o;
+                PERFORM album_stats_remove(eids, pids);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        # Güncelleme: değişen satırlar eski haliyle silinmiş, yeni haliyle eklenmiş sayılır.
+        cur.execute(
+            """
+            CREATE OR REPLACE FUNCTION album_stats_after_update() RETURNS trigger AS $$
+            DECLARE
+                eids TEXT[];
+                pids BIGINT[];
+                paths TEXT[];
+            BEGIN
+                SELECT ARRAY_AGG(x.eid), ARRAY_AGG(x.pid) INTO eids, pids
+                FROM (
+                    SELECT o.event_id::text AS eid, o.id AS pid, o.file_path FROM album_stats_old_rows o
+                    EXCEPT ALL
+                    SELECT n.event_id::text, n.id, n.file_path FROM album_stats_new_rows n
+                ) x;
+                IF eids IS NOT NULL THEN
+                    PERFORM album_stats_remove(eids, pids);
+                END IF;
+                SELECT ARRAY_AGG(x.eid), ARRAY_AGG(x.pid), ARRAY_AGG(x.path) INTO eids, pids, paths
+                FROM (
+                    SELECT n.event_id::text AS eid, n.id AS pid, n.file_path AS path FROM album_stats_new_rows n
+                    EXCEPT ALL
+                    SELECT o.event_id::text, o.id, o.file_path FROM album_stats_old_rows o
+                ) x;
+                IF eids IS NOT NULL THEN
+                    PERFORM album_stats_add(eids, pids, paths);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+            """
+        )
+        cur.execute(
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_album_stats_insert') THEN
+                    CREATE TRIGGER trg_album_stats_insert
+                    AFTER INSERT ON event_photos
+                    REFERENCING NEW TABLE AS album_stats_new_rows
+                    FOR EACH STATEMENT EXECUTE PROCEDURE album_stats_after_insert();
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_album_stats_delete') THEN
+                    CREATE TRIGGER trg_album_stats_delete
+                    AFTER DELETE ON event_photos
+                    REFERENCING OLD TABLE AS album_stats_old_rows
+                    FOR EACH STATEMENT EXECUTE PROCEDURE album_stats_after_delete();
+                END IF;
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_album_stats_update') THEN
+                    CREATE TRIGGER trg_album_stats_update
+                    AFTER UPDATE ON event_photos
+                    REFERENCING OLD TABLE AS album_stats_old_rows NEW TABLE AS album_stats_new_rows
+                    FOR EACH STATEMENT EXECUTE PROCEDURE album_stats_after_update();
+                END IF;
+            END$$;
+            """
+        )
+        # İlk kurulumda tablo boşsa mevcut arşivden doldur. Trigger aynı transaction'da
+        # oluşturulduğu için bu arada gelen eklemeler commit'e kadar bekler.
+        cur.execute(
+            """
+            SELECT album_stats_refresh(ARRAY_AGG(DISTINCT event_id::text))
+            FROM event_photos
+            WHERE NOT EXISTS (SELECT 1 FROM album_stats)
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def init_trending_tables():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        # score, epoch_at anına göre exp(λ·(t - epoch_at)) toplamıdır; sıralama zamandan
+        # bağımsız kalır, okurken ortak çarpanla bugüne indirgenir.
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS trending_scores (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                score DOUBLE PRECISION NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+                PRIMARY KEY (kind, key)
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_trending_scores_rank ON trending_scores(kind, score DESC, key DESC)")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS trending_like_seen (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                account_id INTEGER NOT NULL,
+                seen_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                PRIMARY KEY (kind, key, account_id)
+            )
+            """
+        )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_trending_like_seen_at ON trending_like_seen(seen_at)")
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS trending_state (
+                id SMALLINT PRIMARY KEY DEFAULT 1,
+                epoch_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                watermark TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+                refreshed_at TIMESTAMPTZ
+            )
+            """
+        )
+        conn.commit()
     except Exception:
         conn.rollback()
     finally:
@@ -90,10 +552,14 @@ def _media_url(path: str) -> str:
     return f"{b}/media/{p}"
 
 
-def _account_id_from_auth(conn, authorization: Optional[str]) -> Optional[int]:
+def _bearer_token(authorization: Optional[str]) -> str:
     if not authorization or not authorization.lower().startswith("bearer "):
-        return None
-    token = authorization.split(" ", 1)[1].strip()
+        return ""
+    return authorization.split(" ", 1)[1].strip()
+
+
+def _account_id_from_auth(conn, authorization: Optional[str]) -> Optional[int]:
+    token = _bearer_token(authorization)
     if not token:
         return None
     cur = conn.cursor()
@@ -120,6 +586,118 @@ def _require_account_id(conn, authorization: Optional[str]) -> int:
     return account_id
 
 
+class _LikedSet:
+    __slots__ = ("photo_ids", "album_slugs")
+
+    def __init__(self, photo_ids: array, album_slugs: set):
+        self.photo_ids = photo_ids  # sıralı int64 dizi
+        self.album_slugs = album_slugs
+
+    def has_photo(self, photo_id: int) -> bool:
+        i = bisect_left(self.photo_ids, photo_id)
+        return i < len(self.photo_ids) and self.photo_ids[i] == photo_id
+
+    def set_photo(self, photo_id: int, liked: bool):
+        i = bisect_left(self.photo_ids, photo_id)
+        present = i < len(self.photo_ids) and self.photo_ids[i] == photo_id
+        if liked and not present:
+            insort(self.photo_ids, photo_id)
+        elif not liked and present:
+            del self.photo_ids[i]
+
+    def set_album(self, slug: str, liked: bool):
+        if liked:
+            self.album_slugs.add(slug)
+        else:
+            self.album_slugs.discard(slug)
+
+
+def _bump_like_epoch(account_id: int):
+    # _LIKE_CACHE_LOCK tutulurken çağrılır.
+    if len(_LIKE_CACHE_EPOCH) > 50000:
+        _LIKE_CACHE_EPOCH.clear()
+        _LIKE_CACHE_GEN["value"] += 1
+    _LIKE_CACHE_EPOCH[account_id] = _LIKE_CACHE_EPOCH.get(account_id, 0) + 1
+
+
+def _like_cache_evict(account_id: int):
+    with _LIKE_CACHE_LOCK:
+        _LIKE_CACHE.pop(account_id, None)
+        _bump_like_epoch(account_id)
+
+
+def _like_cache_clear():
+    with _LIKE_CACHE_LOCK:
+        _LIKE_CACHE.clear()
+        _LIKE_CACHE_EPOCH.clear()
+        _LIKE_CACHE_GEN["value"] += 1
+
+
+def _on_likes_changed(payload: str):
+    worker, _, account = (payload or "").partition(":")
+    if worker == pg_listener.WORKER_ID or not account.isdigit():
+        return
+    _like_cache_evict(int(account))
+
+
+def init_photo_like_cache():
+    # Diğer worker'lardaki beğeniler bu worker'ın önbelleğini geçersiz kılar.
+    if PHOTO_LIKE_CACHE_ACCOUNTS > 0:
+        pg_listener.subscribe(PHOTO_LIKES_CHANNEL, _on_likes_changed, on_reset=_like_cache_clear)
+
+
+def _like_cache_ready() -> bool:
+    # Listener bağlı değilken invalidation kaçabilir; önbellek kullanılmaz.
+    return PHOTO_LIKE_CACHE_ACCOUNTS > 0 and pg_listener.is_connected()
+
+
+def _liked_set(conn, account_id: int) -> Optional[_LikedSet]:
+    if not _like_cache_ready():
+        return None
+    aid = int(account_id)
+    with _LIKE_CACHE_LOCK:
+        cached = _LIKE_CACHE.get(aid)
+        if cached is not None:
+            _LIKE_CACHE.move_to_end(aid)
+            return cached
+        epoch = (_LIKE_CACHE_GEN["value"], _LIKE_CACHE_EPOCH.get(aid, 0))
+    cur = conn.cursor()
+    cur.execute(
+        "SELECT photo_id FROM photo_item_user_likes WHERE account_id=%s ORDER BY photo_id LIMIT %s",
+        (aid, PHOTO_LIKE_CACHE_MAX_IDS + 1),
+    )
+    photo_rows = cur.fetchall() or []
+    if len(photo_rows) > PHOTO_LIKE_CACHE_MAX_IDS:
+        return None
+    cur.execute("SELECT album_slug FROM photo_album_user_likes WHERE account_id=%s", (aid,))
+    liked = _LikedSet(
+        array("q", (int(r["photo_id"]) for r in photo_rows)),
+        {(r.get("album_slug") or "").strip() for r in cur.fetchall() or []},
+    )
+    with _LIKE_CACHE_LOCK:
+        # Yükleme sırasında invalidation geldiyse eski veriyi saklama.
+        if (_LIKE_CACHE_GEN["value"], _LIKE_CACHE_EPOCH.get(aid, 0)) != epoch:
+            return liked
+        _LIKE_CACHE[aid] = liked
+        _LIKE_CACHE.move_to_end(aid)
+        while len(_LIKE_CACHE) > PHOTO_LIKE_CACHE_ACCOUNTS:
+            _LIKE_CACHE.popitem(last=False)
+    return liked
+
+
+def _like_cache_apply(account_id: int, kind: str, key: Any, liked: bool):
+    with _LIKE_CACHE_LOCK:
+        # Önbellekte yokken de epoch artar; o sırada süren bir yükleme eski listeyi saklamaz.
+        _bump_like_epoch(int(account_id))
+        cached = _LIKE_CACHE.get(int(account_id))
+        if cached is None:
+            return
+        if kind == "album":
+            cached.set_album(str(key), liked)
+        else:
+            cached.set_photo(int(key), liked)
+
+
 def _album_reactions_for(conn, slugs: List[str], account_id: Optional[int]) -> Dict[str, Dict[str, Any]]:
     out: Dict[str, Dict[str, Any]] = {s: {"like_count": 0, "liked_by_me": False} for s in slugs if s}
     clean = [s for s in slugs if s]
@@ -127,7 +705,11 @@ def _album_reactions_for(conn, slugs: List[str], account_id: Optional[int]) -> D
         return out
     cur = conn.cursor()
     cur.execute(
-        "SELECT album_slug, like_count FROM photo_album_reactions WHERE album_slug = ANY(%s)",
+        f"""
+        SELECT r.album_slug, GREATEST(0, r.like_count + {shard_sum_sql("album", "r.album_slug")}) AS like_count
+        FROM photo_album_reactions r
+        WHERE r.album_slug = ANY(%s)
+        """,
         (clean,),
     )
     for r in cur.fetchall() or []:
@@ -136,7 +718,12 @@ def _album_reactions_for(conn, slugs: List[str], account_id: Optional[int]) -> D
             continue
         out.setdefault(slug, {"like_count": 0, "liked_by_me": False})
         out[slug]["like_count"] = int(r.get("like_count") or 0)
-    if account_id:
+    liked = _liked_set(conn, account_id) if account_id else None
+    if liked is not None:
+        for slug in clean:
+            out.setdefault(slug, {"like_count": 0, "liked_by_me": False})
+            out[slug]["liked_by_me"] = slug in liked.album_slugs
+    elif account_id:
         cur.execute(
             "SELECT album_slug FROM photo_album_user_likes WHERE account_id=%s AND album_slug = ANY(%s)",
             (int(account_id), clean),
@@ -156,7 +743,11 @@ def _photo_reactions_for(conn, photo_ids: List[int], account_id: Optional[int])
         return out
     cur = conn.cursor()
     cur.execute(
-        "SELECT photo_id, like_count FROM photo_item_reactions WHERE photo_id = ANY(%s)",
+        f"""
+        SELECT r.photo_id, GREATEST(0, r.like_count + {shard_sum_sql("photo", "r.photo_id")}) AS like_count
+        FROM photo_item_reactions r
+        WHERE r.photo_id = ANY(%s)
+        """,
         (clean,),
     )
     for r in cur.fetchall() or []:
@@ -165,7 +756,12 @@ def _photo_reactions_for(conn, photo_ids: List[int], account_id: Optional[int])
             continue
         out.setdefault(pid, {"like_count": 0, "liked_by_me": False})
         out[pid]["like_count"] = int(r.get("like_count") or 0)
-    if account_id:
+    liked = _liked_set(conn, account_id) if account_id else None
+    if liked is not None:
+        for pid in clean:
+            out.setdefault(pid, {"like_count": 0, "liked_by_me": False})
+            out[pid]["liked_by_me"] = liked.has_photo(pid)
+    elif account_id:
         cur.execute(
             "SELECT photo_id FROM photo_item_user_likes WHERE account_id=%s AND photo_id = ANY(%s)",
             (int(account_id), clean),
@@ -178,162 +774,314 @@ def _photo_reactions_for(conn, photo_ids: List[int], account_id: Optional[int])
     return out
 
 
-def _album_like_count(conn, slug: str) -> int:
-    cur = conn.cursor()
-    cur.execute("SELECT like_count FROM photo_album_reactions WHERE album_slug=%s", (slug,))
-    row = cur.fetchone()
-    return int((row or {}).get("like_count") or 0)
-
+_LIKE_TARGETS = {
+    "album": ("photo_album_user_likes", "photo_album_reactions", "album_slug"),
+    "photo": ("photo_item_user_likes", "photo_item_reactions", "photo_id"),
+}
 
-def _photo_like_count(conn, photo_id: int) -> int:
-    cur = conn.cursor()
-    cur.execute("SELECT like_count FROM photo_item_reactions WHERE photo_id=%s", (int(photo_id),))
-    row = cur.fetchone()
-    return int((row or {}).get("like_count") or 0)
 
-
-def _set_album_like(conn, account_id: int, slug: str, like: bool) -> Dict[str, Any]:
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO photo_album_reactions (album_slug, like_count) VALUES (%s, 0) ON CONFLICT (album_slug) DO NOTHING",
-        (slug,),
-    )
-    changed = False
+def _toggle_like(conn, token: str, kind: str, key: Any, like: bool) -> Dict[str, Any]:
+    # Oturum, beğeni satırı ve sayaç tek data-modifying CTE ile; sayaç yalnızca
+    # kullanıcı satırı gerçekten değiştiyse güncellenir. Sıcak öğelerde ana satır
+    # yerine rastgele bir shard satırı artırılır (bkz. app.reaction_shards).
+    if not token:
+        raise HTTPException(status_code=401, detail="Giriş gerekli")
+    user_table, counter_table, key_col = _LIKE_TARGETS[kind]
     if like:
-        cur.execute(
-            """
-            INSERT INTO photo_album_user_likes (account_id, album_slug)
-            VALUES (%s, %s)
-            ON CONFLICT (account_id, album_slug) DO NOTHING
-            RETURNING account_id
-            """,
-            (int(account_id), slug),
-        )
-        changed = bool(cur.fetchone())
-        if changed:
-            cur.execute(
-                """
-                UPDATE photo_album_reactions
-                SET like_count = like_count + 1, updated_at = NOW()
-                WHERE album_slug=%s
-                """,
-                (slug,),
-            )
+        change_sql = f"""
+            INSERT INTO {user_table} (account_id, {key_col})
+            SELECT me.account_id, %(key)s FROM me
+            ON CONFLICT (account_id, {key_col}) DO NOTHING
+            RETURNING 1
+        """
+        counter_sql = f"""
+            INSERT INTO {counter_table} ({key_col}, like_count)
+            SELECT %(key)s, 1 FROM changed WHERE NOT EXISTS (SELECT 1 FROM hot)
+            ON CONFLICT ({key_col}) DO UPDATE
+            SET like_count = {counter_table}.like_count + 1, updated_at = NOW()
+            RETURNING like_count
+        """
     else:
-        cur.execute(
-            "DELETE FROM photo_album_user_likes WHERE account_id=%s AND album_slug=%s RETURNING account_id",
-            (int(account_id), slug),
+        change_sql = f"""
+            DELETE FROM {user_table} ul
+            USING me
+            WHERE ul.account_id = me.account_id AND ul.{key_col} = %(key)s
+            RETURNING 1
+        """
+        counter_sql = f"""
+            UPDATE {counter_table}
+            SET like_count = GREATEST(0, like_count - 1), updated_at = NOW()
+            WHERE {key_col} = %(key)s AND EXISTS (SELECT 1 FROM changed) AND NOT EXISTS (SELECT 1 FROM hot)
+            RETURNING like_count
+        """
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        WITH me AS (
+            SELECT s.account_id
+            FROM sessions s
+            JOIN accounts a ON a.id=s.account_id
+            WHERE s.session_token=%(token)s AND s.session_token <> '' AND COALESCE(a.is_active,1)=1
+            LIMIT 1
+        ),
+        hot AS ({hot_items_sql("%(kind)s", "key=%(key)s::text")}),
+        changed AS ({change_sql}),
+        counter AS ({counter_sql}),
+        shard AS (
+            INSERT INTO reaction_counter_shards (kind, key, shard, delta)
+            SELECT %(kind)s, %(key)s::text, %(shard)s, %(delta)s
+            FROM changed
+            WHERE EXISTS (SELECT 1 FROM hot)
+            ON CONFLICT (kind, key, shard) DO UPDATE
+            SET delta = reaction_counter_shards.delta + EXCLUDED.delta
+            RETURNING delta
+        ),
+        notified AS (
+            SELECT pg_notify(%(channel)s, %(worker)s || ':' || me.account_id::text)
+            FROM me
+            WHERE EXISTS (SELECT 1 FROM changed)
+        ),
+        base AS (
+            SELECT
+                COALESCE((SELECT like_count FROM {counter_table} WHERE {key_col} = %(key)s), 0) AS main_count,
+                COALESCE(SUM(sh.delta) FILTER (WHERE sh.shard <> %(shard)s), 0) AS other_shards,
+                COALESCE(SUM(sh.delta), 0) AS all_shards
+            FROM {shard_rows_sql()} sh
+            WHERE sh.kind=%(kind)s AND sh.key=%(key)s::text
         )
-        changed = bool(cur.fetchone())
-        if changed:
-            cur.execute(
-                """
-                UPDATE photo_album_reactions
-                SET like_count = GREATEST(0, like_count - 1), updated_at = NOW()
-                WHERE album_slug=%s
-                """,
-                (slug,),
-            )
+        SELECT
+            (SELECT account_id FROM me) AS account_id,
+            EXISTS (SELECT 1 FROM changed) AS changed,
+            (SELECT COUNT(*) FROM notified) AS notified,
+            GREATEST(0, CASE
+                WHEN EXISTS (SELECT 1 FROM shard)
+                    THEN base.main_count + base.other_shards + (SELECT delta FROM shard)
+                ELSE COALESCE((SELECT like_count FROM counter), base.main_count) + base.all_shards
+            END) AS like_count
+        FROM base
+        """,
+        {
+            "token": token,
+            "key": key,
+            "kind": kind,
+            "shard": pick_shard(),
+            "delta": 1 if like else -1,
+            "channel": PHOTO_LIKES_CHANNEL,
+            "worker": pg_listener.WORKER_ID,
+        },
+    )
+    row = cur.fetchone() or {}
+    if row.get("account_id") is None:
+        conn.rollback()
+        raise HTTPException(status_code=401, detail="Giriş gerekli")
     conn.commit()
-    return {"album_slug": slug, "like_count": _album_like_count(conn, slug), "liked_by_me": like if changed else like}
+    _like_cache_apply(int(row["account_id"]), kind, key, like)
+    if row.get("changed"):
+        maybe_promote(conn, kind, key)
+    return {
+        "like_count": int(row.get("like_count") or 0),
+        "liked_by_me": bool(like),
+        "changed": bool(row.get("changed")),
+    }
 
 
-def _set_photo_like(conn, account_id: int, photo_id: int, like: bool) -> Dict[str, Any]:
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO photo_item_reactions (photo_id, like_count) VALUES (%s, 0) ON CONFLICT (photo_id) DO NOTHING",
-        (int(photo_id),),
-    )
-    changed = False
-    if like:
-        cur.execute(
-            """
+def _set_album_like(conn, token: str, slug: str, like: bool) -> Dict[str, Any]:
+    return {"album_slug": slug, **_toggle_like(conn, token, "album", slug, like)}
+
+
+def _set_photo_like(conn, token: str, photo_id: int, like: bool) -> Dict[str, Any]:
+    return {"photo_id": int(photo_id), **_toggle_like(conn, token, "photo", int(photo_id), like)}
+
+
+def _apply_photo_like_batch(conn, account_id: int, ops: List[PhotoReactionOp]) -> List[int]:
+    # Aynı fotoğraf için birden fazla işlem gelirse son işlem geçerlidir.
+    final: Dict[int, bool] = {}
+    for op in ops:
+        if int(op.photo_id) > 0:
+            final[int(op.photo_id)] = bool(op.like)
+    if not final:
+        return []
+    # Sayaç satırları her istekte aynı (artan id) sırayla kilitlenir; ortak fotoğraflı iki
+    # toplu istek birbirini kilitlemez. Yine de deadlock olursa bir kez yeniden denenir.
+    ids = sorted(final)
+    sql = f"""
+        WITH ops AS (
+            SELECT o.photo_id, o.liked
+            FROM unnest(%(ids)s::bigint[], %(likes)s::boolean[]) AS o(photo_id, liked)
+        ),
+        ins AS (
             INSERT INTO photo_item_user_likes (account_id, photo_id)
-            VALUES (%s, %s)
+            SELECT %(me)s, photo_id FROM ops WHERE liked
+            ORDER BY photo_id
             ON CONFLICT (account_id, photo_id) DO NOTHING
-            RETURNING account_id
-            """,
-            (int(account_id), int(photo_id)),
-        )
-        changed = bool(cur.fetchone())
-        if changed:
-            cur.execute(
-                """
-                UPDATE photo_item_reactions
-                SET like_count = like_count + 1, updated_at = NOW()
-                WHERE photo_id=%s
-                """,
-                (int(photo_id),),
-            )
-    else:
-        cur.execute(
-            "DELETE FROM photo_item_user_likes WHERE account_id=%s AND photo_id=%s RETURNING account_id",
-            (int(account_id), int(photo_id)),
+            RETURNING photo_id
+        ),
+        del AS (
+            DELETE FROM photo_item_user_likes ul
+            USING ops
+            WHERE ul.account_id = %(me)s AND ul.photo_id = ops.photo_id AND NOT ops.liked
+            RETURNING ul.photo_id
+        ),
+        deltas AS (
+            SELECT photo_id, SUM(d)::INTEGER AS d
+            FROM (
+                SELECT photo_id, 1 AS d FROM ins
+                UNION ALL
+                SELECT photo_id, -1 AS d FROM del
+            ) x
+            GROUP BY photo_id
+        ),
+        hot AS ({hot_items_sql("'photo'", "key = ANY(%(ids)s::bigint[]::text[])")}),
+        counter AS (
+            INSERT INTO photo_item_reactions (photo_id, like_count)
+            SELECT photo_id, GREATEST(0, d) FROM deltas
+            WHERE photo_id::text NOT IN (SELECT key FROM hot)
+            ORDER BY photo_id
+            ON CONFLICT (photo_id) DO UPDATE
+            SET like_count = GREATEST(
+                    0,
+                    photo_item_reactions.like_count
+                    + (SELECT dd.d FROM deltas dd WHERE dd.photo_id = EXCLUDED.photo_id)
+                ),
+                updated_at = NOW()
+            RETURNING photo_id
+        ),
+        shard AS (
+            INSERT INTO reaction_counter_shards (kind, key, shard, delta)
+            SELECT 'photo', photo_id::text, floor(random() * %(shards)s)::SMALLINT, d FROM deltas
+            WHERE photo_id::text IN (SELECT key FROM hot)
+            ORDER BY photo_id
+            ON CONFLICT (kind, key, shard) DO UPDATE
+            SET delta = reaction_counter_shards.delta + EXCLUDED.delta
+            RETURNING key
         )
-        changed = bool(cur.fetchone())
-        if changed:
-            cur.execute(
-                """
-                UPDATE photo_item_reactions
-                SET like_count = GREATEST(0, like_count - 1), updated_at = NOW()
-                WHERE photo_id=%s
-                """,
-                (int(photo_id),),
-            )
-    conn.commit()
-    return {"photo_id": int(photo_id), "like_count": _photo_like_count(conn, int(photo_id)), "liked_by_me": like if changed else like}
+        SELECT photo_id FROM deltas
+    """
+    params = {
+        "ids": ids,
+        "likes": [final[pid] for pid in ids],
+        "me": int(account_id),
+        "shards": REACTION_SHARD_COUNT,
+    }
+    cur = conn.cursor()
+    for attempt in range(2):
+        try:
+            cur.execute(sql, params)
+            changed = [int(r["photo_id"]) for r in cur.fetchall() or []]
+            if changed:
+                pg_listener.notify(cur, PHOTO_LIKES_CHANNEL, f"{pg_listener.WORKER_ID}:{int(account_id)}")
+            conn.commit()
+            break
+        except psycopg2.errors.DeadlockDetected:
+            conn.rollback()
+            if attempt:
+                raise
+    for pid, liked in final.items():
+        _like_cache_apply(account_id, "photo", pid, liked)
+    for pid in changed:
+        maybe_promote(conn, "photo", pid)
+    return list(final.keys())
 
 
-def _albums(limit: int) -> List[Dict[str, Any]]:
-    conn = _db_conn()
-    if not conn:
-        return []
-    try:
-        cur = conn.cursor()
-        cur.execute(
-            """
+def _feed(conn, token: str, albums_limit: int, latest_limit: int) -> Dict[str, Any]:
+    # Albümler, son fotoğraflar, oturum ve iki beğeni sorgusu tek statement / tek snapshot.
+    # liked_by_me her zaman SQL'de (sayfa başına birkaç PK araması) hesaplanır; hesap SQL'den
+    # önce bilinmediği için soğuk beğeni önbelleğini yüklemek ek sorgu demek olurdu.
+    cur = conn.cursor()
+    cur.execute(
+        f"""
+        SET TRANSACTION READ ONLY;
+        WITH me AS (
+            SELECT s.account_id
+            FROM sessions s
+            JOIN accounts a ON a.id=s.account_id
+            WHERE s.session_token=%(token)s AND s.session_token <> '' AND COALESCE(a.is_active,1)=1
+            LIMIT 1
+        ),
+        albums AS (
             SELECT
-                stats.event_id AS slug,
-                COALESCE(se.name, stats.event_id) AS name,
+                st.event_id AS slug,
+                COALESCE(se.name, st.event_id) AS name,
+                st.cover_path AS file_path,
+                ep.created_at,
+                st.photo_count,
+                st.max_photo_id,
+                GREATEST(0, COALESCE(r.like_count, 0) + {shard_sum_sql("album", "st.event_id")}) AS like_count,
+                EXISTS (
+                    SELECT 1 FROM photo_album_user_likes ul JOIN me ON me.account_id = ul.account_id
+                    WHERE ul.album_slug = st.event_id
+                ) AS liked_by_me
+            FROM album_stats st
+            LEFT JOIN event_photos ep ON ep.id = st.max_photo_id
+            LEFT JOIN saas_events se ON se.slug = st.event_id
+            LEFT JOIN photo_album_reactions r ON r.album_slug = st.event_id
+            ORDER BY st.max_photo_id DESC
+            LIMIT %(albums_limit)s
+        ),
+        latest AS (
+            SELECT
+                ep.id,
+                ep.event_id AS slug,
+                COALESCE(se.name, ep.event_id) AS event_name,
                 ep.file_path,
                 ep.created_at,
-                stats.photo_count
-            FROM (
-                SELECT event_id, MAX(id) AS max_photo_id, COUNT(*) AS photo_count
-                FROM event_photos
-                GROUP BY event_id
-                ORDER BY MAX(id) DESC
-                LIMIT %s
-            ) stats
-            JOIN event_photos ep ON ep.id = stats.max_photo_id
-            LEFT JOIN saas_events se ON se.slug = stats.event_id
+                GREATEST(0, COALESCE(r.like_count, 0) + {shard_sum_sql("photo", "ep.id")}) AS like_count,
+                EXISTS (
+                    SELECT 1 FROM photo_item_user_likes ul JOIN me ON me.account_id = ul.account_id
+                    WHERE ul.photo_id = ep.id
+                ) AS liked_by_me
+            FROM event_photos ep
+            LEFT JOIN saas_events se ON se.slug = ep.event_id
+            LEFT JOIN photo_item_reactions r ON r.photo_id = ep.id
             ORDER BY ep.id DESC
-            LIMIT %s
-            """,
-            (int(limit), int(limit)),
+            LIMIT %(latest_limit)s
         )
-        rows = cur.fetchall() or []
-        out = []
-        for r in rows:
-            fp = r.get("file_path") or ""
-            out.append(
-                {
-                    "slug": r.get("slug"),
-                    "name": r.get("name"),
-                    "cover": _media_url(fp),
-                    "photo_count": int(r.get("photo_count") or 0),
-                    "created_at": r.get("created_at"),
-                    "link": f"{PUBLIC_WEB_BASE}/e/{r.get('slug')}/all" if r.get("slug") else "",
-                }
-            )
-        return out
-    except Exception:
-        return []
-    finally:
-        conn.close()
+        SELECT
+            (SELECT account_id FROM me) AS account_id,
+            COALESCE((SELECT json_agg(a ORDER BY a.max_photo_id DESC) FROM albums a), '[]'::json) AS albums,
+            COALESCE((SELECT json_agg(l ORDER BY l.id DESC) FROM latest l), '[]'::json) AS latest
+        """,
+        {
+            "token": token,
+            "albums_limit": int(albums_limit),
+            "latest_limit": int(latest_limit),
+        },
+    )
+    row = cur.fetchone() or {}
+    account_id = row.get("account_id")
+    albums = []
+    for r in row.get("albums") or []:
+        slug = r.get("slug")
+        albums.append(
+            {
+                "slug": slug,
+                "name": r.get("name"),
+                "cover": _media_url(r.get("file_path") or ""),
+                "photo_count": int(r.get("photo_count") or 0),
+                "created_at": r.get("created_at"),
+                "link": f"{PUBLIC_WEB_BASE}/e/{slug}/all" if slug else "",
+                "like_count": int(r.get("like_count") or 0),
+                "liked_by_me": bool(r.get("liked_by_me")),
+            }
+        )
+    latest = []
+    for r in row.get("latest") or []:
+        pid = int(r.get("id") or 0)
+        latest.append(
+            {
+                "id": pid,
+                "slug": r.get("slug"),
+                "event_name": r.get("event_name"),
+                "image": _media_url(r.get("file_path") or ""),
+                "created_at": r.get("created_at"),
+                "like_count": int(r.get("like_count") or 0),
+                "liked_by_me": bool(r.get("liked_by_me")),
+            }
+        )
+    return {"account_id": account_id, "albums": albums, "latest": latest}
 
 
-def _latest(limit: int) -> List[Dict[str, Any]]:
+def _event_photos(slug: str, limit: int) -> List[Dict[str, Any]]:
     conn = _db_conn()
     if not conn:
         return []
@@ -341,13 +1089,13 @@ def _latest(limit: int) -> List[Dict[str, Any]]:
         cur = conn.cursor()
         cur.execute(
             """
-            SELECT ep.id, ep.event_id, ep.file_path, ep.created_at, COALESCE(se.name, ep.event_id) AS event_name
-            FROM event_photos ep
-            LEFT JOIN saas_events se ON se.slug = ep.event_id
-            ORDER BY ep.id DESC
+            SELECT id, file_path, created_at
+            FROM event_photos
+            WHERE event_id=%s
+            ORDER BY id DESC
             LIMIT %s
             """,
-            (int(limit),),
+            (slug, int(limit)),
         )
         rows = cur.fetchall() or []
         out = []
@@ -356,8 +1104,6 @@ def _latest(limit: int) -> List[Dict[str, Any]]:
             out.append(
                 {
                     "id": int(r.get("id") or 0),
-                    "slug": r.get("event_id"),
-                    "event_name": r.get("event_name"),
                     "image": _media_url(fp),
                     "created_at": r.get("created_at"),
                 }
@@ -369,69 +1115,272 @@ def _latest(limit: int) -> List[Dict[str, Any]]:
         conn.close()
 
 
-def _event_photos(slug: str, limit: int) -> List[Dict[str, Any]]:
+def _media_fs_path(path: str) -> str:
+    p = _norm_media_path(path)
+    if not p:
+        return ""
+    abs_path = os.path.realpath(os.path.join(PHOTO_MEDIA_ROOT, p))
+    if not abs_path.startswith(PHOTO_MEDIA_ROOT + os.sep):
+        return ""
+    return abs_path
+
+
+class _ZipSlot:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._held = _ZIP_SLOTS.acquire(blocking=False)
+
+    @property
+    def held(self) -> bool:
+        return self._held
+
+    def release(self):
+        # Hem stream bitişinde hem background task'ta çağrılır; tek sefer bırakılır.
+        with self._lock:
+            if self._held:
+                self._held = False
+                _ZIP_SLOTS.release()
+
+
+def _parse_byte_range(range_header: Optional[str], total: int) -> Optional[tuple[int, int]]:
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", range_header or "")
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    if m.group(1):
+        start = int(m.group(1))
+        end = int(m.group(2)) if m.group(2) else total - 1
+    else:
+        start = max(0, total - int(m.group(2)))
+        end = total - 1
+    if start >= total or start > end:
+        raise HTTPException(status_code=416, detail="Geçersiz aralık", headers={"Content-Range": f"bytes */{total}"})
+    return start, min(end, total - 1)
+
+
+def _trending_lambda() -> float:
+    return math.log(2) / max(1.0, TRENDING_HALF_LIFE_HOURS * 3600.0)
+
+
+def _refresh_trending(conn) -> bool:
+    cur = conn.cursor()
+    if not try_job_lock(cur, "photo_trending"):
+        conn.rollback()
+        return False
+    lam = _trending_lambda()
+    cur.execute(
+        """
+        INSERT INTO trending_state (id, epoch_at, watermark)
+        VALUES (1, LOCALTIMESTAMP, LOCALTIMESTAMP - (%s * INTERVAL '1 day'))
+        ON CONFLICT (id) DO NOTHING
+        """,
+        (TRENDING_SEED_DAYS,),
+    )
+    # Çok uzun süre sonra exp() taşmasın diye referans anı ileri alınır.
+    cur.execute(
+        """
+        SELECT epoch_at, watermark, EXTRACT(EPOCH FROM (LOCALTIMESTAMP - epoch_at)) AS age_sec
+        FROM trending_state WHERE id=1 FOR UPDATE
+        """
+    )
+    state = cur.fetchone()
+    if float(state["age_sec"] or 0) * lam > 200:
+        cur.execute(
+            "UPDATE trending_scores SET score = score * exp(-%s * %s)",
+            (lam, float(state["age_sec"])),
+        )
+        cur.execute("UPDATE trending_state SET epoch_at = LOCALTIMESTAMP WHERE id=1 RETURNING epoch_at")
+        state["epoch_at"] = cur.fetchone()["epoch_at"]
+    # Commit gecikmesiyle kaçan satır olmasın diye son birkaç saniye bir sonraki tura kalır.
+    cur.execute("SELECT LOCALTIMESTAMP - INTERVAL '5 seconds' AS hi")
+    hi = cur.fetchone()["hi"]
+    params = {
+        "lam": lam,
+        "epoch": state["epoch_at"],
+        "lo": state["watermark"],
+        "hi": hi,
+        "photo_w": TRENDING_ALBUM_PHOTO_WEIGHT,
+        "window_days": TRENDING_RELIKE_WINDOW_DAYS,
+    }
+    # Yalnızca pencere içinde (hesap, öğe) için ilk beğeni sayılır; geri alınıp tekrar
+    # beğenilen yeni satır trending_like_seen'de çakışır ve RETURNING'e düşmez.
+    cur.execute(
+        """
+        WITH photo_likes AS (
+            INSERT INTO trending_like_seen AS s (kind, key, account_id, seen_at)
+            SELECT 'photo', photo_id::text, account_id, created_at
+            FROM photo_item_user_likes
+            WHERE created_at > %(lo)s AND created_at <= %(hi)s
+            ON CONFLICT (kind, key, account_id) DO UPDATE SET seen_at = EXCLUDED.seen_at
+            WHERE s.seen_at < EXCLUDED.seen_at - (%(window_days)s * INTERVAL '1 day')
+            RETURNING key, seen_at
+        ),
+        album_likes AS (
+            INSERT INTO trending_like_seen AS s (kind, key, account_id, seen_at)
+            SELECT 'album', album_slug, account_id, created_at
+            FROM photo_album_user_likes
+            WHERE created_at > %(lo)s AND created_at <= %(hi)s
+            ON CONFLICT (kind, key, account_id) DO UPDATE SET seen_at = EXCLUDED.seen_at
+            WHERE s.seen_at < EXCLUDED.seen_at - (%(window_days)s * INTERVAL '1 day')
+            RETURNING key, seen_at
+        ),
+        photo_scores AS (
+            INSERT INTO trending_scores (kind, key, score, updated_at)
+            SELECT 'photo', key, SUM(exp(%(lam)s * EXTRACT(EPOCH FROM (seen_at - %(epoch)s)))), NOW()
+            FROM photo_likes
+            GROUP BY key
+            ON CONFLICT (kind, key) DO UPDATE
+            SET score = trending_scores.score + EXCLUDED.score, updated_at = NOW()
+        )
+        INSERT INTO trending_scores (kind, key, score, updated_at)
+        SELECT 'album', x.slug, SUM(x.w * exp(%(lam)s * EXTRACT(EPOCH FROM (x.seen_at - %(epoch)s)))), NOW()
+        FROM (
+            SELECT key AS slug, seen_at, 1.0::DOUBLE PRECISION AS w
+            FROM album_likes
+            UNION ALL
+            SELECT ep.event_id::text, pl.seen_at, %(photo_w)s::DOUBLE PRECISION
+            FROM photo_likes pl
+            JOIN event_photos ep ON ep.id = pl.key::bigint
+        ) x
+        GROUP BY x.slug
+        ON CONFLICT (kind, key) DO UPDATE
+        SET score = trending_scores.score + EXCLUDED.score, updated_at = NOW()
+        """,
+        params,
+    )
+    cur.execute(
+        "DELETE FROM trending_like_seen WHERE seen_at < %s - (%s * INTERVAL '1 day')",
+        (hi, TRENDING_RELIKE_WINDOW_DAYS),
+    )
+    # Bugüne indirgenmiş değeri önemsizleşenler atılır.
+    cur.execute(
+        "DELETE FROM trending_scores WHERE score * exp(-%s * EXTRACT(EPOCH FROM (LOCALTIMESTAMP - %s))) < 0.01",
+        (lam, state["epoch_at"]),
+    )
+    cur.execute("UPDATE trending_state SET watermark=%s, refreshed_at=NOW() WHERE id=1", (hi,))
+    conn.commit()
+    return True
+
+
+def _trending_job():
     conn = _db_conn()
     if not conn:
-        return []
+        return
     try:
-        cur = conn.cursor()
-        cur.execute(
-            """
-            SELECT id, file_path, created_at
+        _refresh_trending(conn)
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def start_photo_trending_job():
+    start_periodic_job("photo_trending", TRENDING_REFRESH_SEC, _trending_job)
+
+
+def reconcile_album_stats(conn) -> int:
+    """
+    album_stats'ı event_photos ile karşılaştırıp kayan albümleri yeniden hesaplar.
+    Her albüm ayrı REPEATABLE READ transaction'ında düzeltilir; arada trigger satırı
+    güncellediyse eski sayımla üzerine yazılmaz, birkaç deneme sonra sonraki tura kalır.
+    """
+    cur = conn.cursor()
+    if not try_job_lock(cur, "album_stats_reconcile"):
+        conn.rollback()
+        return 0
+    cur.execute(
+        """
+        SELECT COALESCE(t.event_id, s.event_id) AS event_id
+        FROM (
+            SELECT event_id::text AS event_id, COUNT(*)::INTEGER AS photo_count, MAX(id) AS max_photo_id
             FROM event_photos
-            WHERE event_id=%s
-            ORDER BY id DESC
-            LIMIT %s
-            """,
-            (slug, int(limit)),
+            WHERE event_id IS NOT NULL
+            GROUP BY event_id
+        ) t
+        FULL JOIN album_stats s ON s.event_id = t.event_id
+        WHERE t.event_id IS NULL OR s.event_id IS NULL
+           OR s.photo_count <> t.photo_count OR s.max_photo_id <> t.max_photo_id
+        """
+    )
+    drifted = [r["event_id"] for r in cur.fetchall() or []]
+
+    # Job kilidi conn'un transaction'ında açık kalır; düzeltmeler ayrı bağlantıda yapılır.
+    repaired = 0
+    skipped: List[str] = []
+    work = _db_conn()
+    try:
+        work.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ)
+        wcur = work.cursor()
+        for event_id in drifted:
+            for _ in range(ALBUM_STATS_RECONCILE_RETRIES):
+                try:
+                    wcur.execute("SELECT album_stats_refresh(%s::text[])", ([event_id],))
+                    work.commit()
+                    repaired += 1
+                    break
+                except psycopg2.errors.SerializationFailure:
+                    work.rollback()
+            else:
+                skipped.append(event_id)
+    finally:
+        work.close()
+        conn.rollback()
+    if skipped:
+        logger.warning(
+            "album_stats reconcile: %d albüm eşzamanlı güncelleme nedeniyle atlandı: %s",
+            len(skipped),
+            ",".join(skipped[:50]),
         )
-        rows = cur.fetchall() or []
-        out = []
-        for r in rows:
-            fp = r.get("file_path") or ""
-            out.append(
-                {
-                    "id": int(r.get("id") or 0),
-                    "image": _media_url(fp),
-                    "created_at": r.get("created_at"),
-                }
-            )
-        return out
+    return repaired
+
+
+def _album_stats_reconcile_job():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        reconcile_album_stats(conn)
     except Exception:
-        return []
+        conn.rollback()
     finally:
         conn.close()
 
 
+def start_album_stats_reconcile_job():
+    start_periodic_job("album_stats_reconcile", ALBUM_STATS_RECONCILE_INTERVAL_SEC, _album_stats_reconcile_job)
+
+
+def _encode_cursor(score: float, key: str) -> str:
+    raw = json.dumps([score, key], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Optional[tuple[float, str]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        score, key = json.loads(raw.decode("utf-8"))
+        return float(score), str(key)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+
+
 @router.get("", summary="Fotoğraf akışı")
 def list_photos(
     albums_limit: int = Query(default=20, ge=1, le=100),
     latest_limit: int = Query(default=60, ge=1, le=200),
     authorization: Optional[str] = Header(default=None),
 ):
-    albums = _albums(albums_limit)
-    latest = _latest(latest_limit)
-    conn = _db_conn()
-    account_id = None
-    if conn:
-        try:
-            account_id = _account_id_from_auth(conn, authorization)
-            album_slugs = [str(a.get("slug") or "").strip() for a in albums]
-            album_react = _album_reactions_for(conn, album_slugs, account_id)
-            latest_ids = [int(p.get("id") or 0) for p in latest]
-            photo_react = _photo_reactions_for(conn, latest_ids, account_id)
-            for a in albums:
-                slug = str(a.get("slug") or "").strip()
-                rs = album_react.get(slug, {})
-                a["like_count"] = int(rs.get("like_count") or 0)
-                a["liked_by_me"] = bool(rs.get("liked_by_me") or False)
-            for p in latest:
-                pid = int(p.get("id") or 0)
-                rs = photo_react.get(pid, {})
-                p["like_count"] = int(rs.get("like_count") or 0)
-                p["liked_by_me"] = bool(rs.get("liked_by_me") or False)
-        finally:
-            conn.close()
+    albums: List[Dict[str, Any]] = []
+    latest: List[Dict[str, Any]] = []
+    with _pooled_conn() as conn:
+        if conn:
+            try:
+                feed = _feed(conn, _bearer_token(authorization), albums_limit, latest_limit)
+                albums = feed["albums"]
+                latest = feed["latest"]
+            except Exception:
+                conn.rollback()
     return {
         "section": "fotograflar",
         "albums": albums,
@@ -445,6 +1394,96 @@ def list_photos(
     }
 
 
+@router.get("/trending", summary="Popüler fotoğraflar / albümler")
+def trending(
+    kind: str = Query(default="photos", pattern="^(photos|albums)$"),
+    limit: int = Query(default=30, ge=1, le=100),
+    cursor: str = "",
+):
+    after = _decode_cursor(cursor)
+    with _pooled_conn() as conn:
+        if not conn:
+            return {"kind": kind, "items": [], "next_cursor": None}
+        cur = conn.cursor()
+        params: Dict[str, Any] = {"lam": _trending_lambda(), "limit": int(limit) + 1}
+        where = ""
+        if after:
+            where = "AND (t.score, t.key) < (%(after_score)s, %(after_key)s)"
+            params.update({"after_score": after[0], "after_key": after[1]})
+        if kind == "photos":
+            cur.execute(
+                f"""
+                SELECT
+                    t.key, t.score,
+                    t.score * exp(-%(lam)s * EXTRACT(EPOCH FROM (LOCALTIMESTAMP - ts.epoch_at))) AS trend,
+                    ep.id, ep.event_id AS slug, ep.file_path, ep.created_at,
+                    COALESCE(se.name, ep.event_id) AS event_name,
+                    GREATEST(0, COALESCE(r.like_count, 0) + {shard_sum_sql("photo", "ep.id")}) AS like_count
+                FROM trending_scores t
+                CROSS JOIN trending_state ts
+                JOIN event_photos ep ON ep.id = t.key::bigint
+                LEFT JOIN saas_events se ON se.slug = ep.event_id
+                LEFT JOIN photo_item_reactions r ON r.photo_id = ep.id
+                WHERE t.kind='photo' AND ts.id=1 {where}
+                ORDER BY t.score DESC, t.key DESC
+                LIMIT %(limit)s
+                """,
+                params,
+            )
+        else:
+            cur.execute(
+                f"""
+                SELECT
+                    t.key, t.score,
+                    t.score * exp(-%(lam)s * EXTRACT(EPOCH FROM (LOCALTIMESTAMP - ts.epoch_at))) AS trend,
+                    st.event_id AS slug, COALESCE(se.name, st.event_id) AS name,
+                    st.cover_path, st.photo_count,
+                    GREATEST(0, COALESCE(r.like_count, 0) + {shard_sum_sql("album", "st.event_id")}) AS like_count
+                FROM trending_scores t
+                CROSS JOIN trending_state ts
+                JOIN album_stats st ON st.event_id = t.key
+                LEFT JOIN saas_events se ON se.slug = st.event_id
+                LEFT JOIN photo_album_reactions r ON r.album_slug = st.event_id
+                WHERE t.kind='album' AND ts.id=1 {where}
+                ORDER BY t.score DESC, t.key DESC
+                LIMIT %(limit)s
+                """,
+                params,
+            )
+        rows = cur.fetchall() or []
+    has_more = len(rows) > int(limit)
+    rows = rows[: int(limit)]
+    items: List[Dict[str, Any]] = []
+    for r in rows:
+        if kind == "photos":
+            items.append(
+                {
+                    "id": int(r["id"]),
+                    "slug": r.get("slug"),
+                    "event_name": r.get("event_name"),
+                    "image": _media_url(r.get("file_path") or ""),
+                    "created_at": r.get("created_at"),
+                    "like_count": int(r.get("like_count") or 0),
+                    "trend_score": round(float(r.get("trend") or 0), 3),
+                }
+            )
+        else:
+            slug = r.get("slug")
+            items.append(
+                {
+                    "slug": slug,
+                    "name": r.get("name"),
+                    "cover": _media_url(r.get("cover_path") or ""),
+                    "photo_count": int(r.get("photo_count") or 0),
+                    "link": f"{PUBLIC_WEB_BASE}/e/{slug}/all" if slug else "",
+                    "like_count": int(r.get("like_count") or 0),
+                    "trend_score": round(float(r.get("trend") or 0), 3),
+                }
+            )
+    next_cursor = _encode_cursor(float(rows[-1]["score"]), str(rows[-1]["key"])) if has_more and rows else None
+    return {"kind": kind, "items": items, "next_cursor": next_cursor}
+
+
 @router.get("/albums/{slug}", summary="Albüm fotoğrafları")
 def album_photos(
     slug: str,
@@ -478,6 +1517,83 @@ def album_photos(
     }
 
 
+@router.get("/albums/{slug}/download", summary="Albümü ZIP olarak indir")
+def album_download(
+    slug: str,
+    range_header: Optional[str] = Header(default=None, alias="range"),
+    if_range: Optional[str] = Header(default=None),
+):
+    with _pooled_conn() as conn:
+        if not conn:
+            raise HTTPException(status_code=500, detail="DB bağlantısı yok")
+        cur = conn.cursor()
+        # Sıra deterministik olmalı; Range ile devam eden indirme aynı yerleşimi görür.
+        cur.execute(
+            """
+            SELECT id, file_path
+            FROM event_photos
+            WHERE event_id=%s
+            ORDER BY id ASC
+            LIMIT %s
+            """,
+            (slug, PHOTO_ZIP_MAX_FILES + 1),
+        )
+        rows = cur.fetchall() or []
+        if len(rows) > PHOTO_ZIP_MAX_FILES:
+            # Yerleşim (Range için) tüm dosyaları önceden bilmeli; eksik ZIP vermek yerine reddedilir.
+            raise HTTPException(
+                status_code=413,
+                detail=f"Albüm toplu indirme için çok büyük (en fazla {PHOTO_ZIP_MAX_FILES} fotoğraf)",
+            )
+        entries = []
+        for r in rows:
+            abs_path = _media_fs_path(r.get("file_path") or "")
+            if not abs_path:
+                continue
+            entry = stat_entry(f"{int(r['id'])}_{os.path.basename(abs_path)}", abs_path)
+            if entry:
+                entries.append(entry)
+        if not entries:
+            raise HTTPException(status_code=404, detail="Albüm bulunamadı")
+        known_crcs = _load_zip_crcs(conn, entries)
+    layout = ZipLayout(entries, known_crcs)
+    digest = hashlib.md5(repr((slug, [(e.name, e.size, e.mtime_ns) for e in entries])).encode("utf-8")).hexdigest()
+    etag = f'"{digest}"'
+    byte_range = None
+    if range_header and (not if_range or if_range.strip() == etag):
+        byte_range = _parse_byte_range(range_header, layout.total_size)
+    start, end = byte_range if byte_range else (0, layout.total_size - 1)
+
+    slot = _ZipSlot()
+    if not slot.held:
+        raise HTTPException(status_code=429, detail="Şu anda çok fazla albüm indiriliyor, lütfen biraz sonra tekrar deneyin")
+
+    def _stream():
+        try:
+            yield from layout.iter_range(start, end, PHOTO_ZIP_CHUNK_BYTES)
+        finally:
+            slot.release()
+            # İlk tam geçişte hesaplanan CRC'ler kalıcı yazılır; yarıda kesilen akışın
+            # hesapladıkları da (tamamı okunmuş dosyalar) kaybolmaz.
+            _save_zip_crcs(layout.new_crcs)
+
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Length": str(end - start + 1),
+        "Content-Disposition": f"attachment; filename*=UTF-8''{quote(slug)}.zip",
+    }
+    if byte_range:
+        headers["Content-Range"] = f"bytes {start}-{end}/{layout.total_size}"
+    return StreamingResponse(
+        _stream(),
+        status_code=206 if byte_range else 200,
+        headers=headers,
+        media_type="application/zip",
+        background=BackgroundTask(slot.release),
+    )
+
+
 @router.get("/albums/{slug}/reactions", summary="Albüm beğeni bilgisi")
 def album_reactions(slug: str, authorization: Optional[str] = Header(default=None)):
     conn = _db_conn()
@@ -493,26 +1609,40 @@ def album_reactions(slug: str, authorization: Optional[str] = Header(default=Non
 
 @router.post("/albums/{slug}/like", summary="Albüm beğen")
 def album_like(slug: str, authorization: Optional[str] = Header(default=None)):
-    conn = _db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="DB bağlantısı yok")
-    try:
-        account_id = _require_account_id(conn, authorization)
-        return _set_album_like(conn, account_id, slug, True)
-    finally:
-        conn.close()
+    with _pooled_conn() as conn:
+        if not conn:
+            raise HTTPException(status_code=500, detail="DB bağlantısı yok")
+        return _set_album_like(conn, _bearer_token(authorization), slug, True)
 
 
 @router.post("/albums/{slug}/unlike", summary="Albüm beğeniyi geri al")
 def album_unlike(slug: str, authorization: Optional[str] = Header(default=None)):
-    conn = _db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="DB bağlantısı yok")
-    try:
+    with _pooled_conn() as conn:
+        if not conn:
+            raise HTTPException(status_code=500, detail="DB bağlantısı yok")
+        return _set_album_like(conn, _bearer_token(authorization), slug, False)
+
+
+@router.post("/items/reactions:batch", summary="Toplu fotoğraf beğen / beğeniyi geri al")
+def photo_reactions_batch(payload: PhotoReactionBatchRequest, authorization: Optional[str] = Header(default=None)):
+    if len(payload.operations) > PHOTO_REACTION_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"En fazla {PHOTO_REACTION_BATCH_MAX} işlem gönderilebilir")
+    with _pooled_conn() as conn:
+        if not conn:
+            raise HTTPException(status_code=500, detail="DB bağlantısı yok")
         account_id = _require_account_id(conn, authorization)
-        return _set_album_like(conn, account_id, slug, False)
-    finally:
-        conn.close()
+        photo_ids = _apply_photo_like_batch(conn, account_id, payload.operations)
+        reactions = _photo_reactions_for(conn, photo_ids, account_id)
+        return {
+            "items": [
+                {
+                    "photo_id": pid,
+                    "like_count": int(reactions.get(pid, {}).get("like_count") or 0),
+                    "liked_by_me": bool(reactions.get(pid, {}).get("liked_by_me") or False),
+                }
+                for pid in photo_ids
+            ]
+        }
 
 
 @router.get("/items/{photo_id}/reactions", summary="Fotoğraf beğeni bilgisi")
@@ -530,23 +1660,15 @@ def photo_reactions(photo_id: int, authorization: Optional[str] = Header(default
 
 @router.post("/items/{photo_id}/like", summary="Fotoğraf beğen")
 def photo_like(photo_id: int, authorization: Optional[str] = Header(default=None)):
-    conn = _db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="DB bağlantısı yok")
-    try:
-        account_id = _require_account_id(conn, authorization)
-        return _set_photo_like(conn, account_id, int(photo_id), True)
-    finally:
-        conn.close()
+    with _pooled_conn() as conn:
+        if not conn:
+            raise HTTPException(status_code=500, detail="DB bağlantısı yok")
+        return _set_photo_like(conn, _bearer_token(authorization), int(photo_id), True)
 
 
 @router.post("/items/{photo_id}/unlike", summary="Fotoğraf beğeniyi geri al")
 def photo_unlike(photo_id: int, authorization: Optional[str] = Header(default=None)):
-    conn = _db_conn()
-    if not conn:
-        raise HTTPException(status_code=500, detail="DB bağlantısı yok")
-    try:
-        account_id = _require_account_id(conn, authorization)
-        return _set_photo_like(conn, account_id, int(photo_id), False)
-    finally:
-        conn.close()
+    with _pooled_conn() as conn:
+        if not conn:
+            raise HTTPException(status_code=500, detail="DB bağlantısı yok")
+        return _set_photo_like(conn, _bearer_token(authorization), int(photo_id), False)
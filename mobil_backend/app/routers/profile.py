@@ -1,14 +1,29 @@
+import asyncio
+import json
 import os
-from typing import Any, Dict, List, Optional
+import threading
+from typing import Any, Dict, List, Optional, Set
 
 import psycopg2
 import psycopg2.extras
-from fastapi import APIRouter, Header, HTTPException
+from fastapi import APIRouter, Header, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from app.routers.messages import unread_messages_count
+from starlette.concurrency import run_in_threadpool
+
+from app import pg_listener
+from app.badge_counters import badge_counts
+from app.friend_cache import apply_friendship_change, is_friend
+from app.routers.messages import CHAT_EVENT_CHANNEL, MESSAGE_CHANNEL
+from app.timestamp_columns import ts_column
 
 router = APIRouter(prefix="/profile", tags=["Profil"])
 DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+FRIEND_REQUEST_CHANNEL = "mobile_friend_request"
+NOTIFICATION_STREAM_KEEPALIVE_SEC = float(os.getenv("NOTIFICATION_STREAM_KEEPALIVE_SEC", "20"))
+# LISTEN bağlantısı yokken sayaçlar eski polling aralığıyla yeniden hesaplanır.
+NOTIFICATION_STREAM_FALLBACK_SEC = 20.0
+NOTIFICATION_STREAM_DEBOUNCE_SEC = 0.25
 
 
 def _db_conn():
@@ -122,10 +137,10 @@ def profile_summary(authorization: Optional[str] = Header(default=None)):
         cur.execute(
             """
             SELECT COUNT(*) AS cnt
-            FROM mobile_friendships
-            WHERE user_a_id=%s OR user_b_id=%s
+            FROM mobile_friend_edges
+            WHERE account_id=%s
             """,
-            (account_id, account_id),
+            (account_id,),
         )
         fcnt = int((cur.fetchone() or {}).get("cnt") or 0)
         return {
@@ -147,15 +162,19 @@ def profile_friends(limit: int = 200, authorization: Optional[str] = Header(defa
         cur = conn.cursor()
         cur.execute(
             """
-            SELECT
-                CASE WHEN mf.user_a_id=%s THEN mf.user_b_id ELSE mf.user_a_id END AS friend_account_id,
-                mf.created_at
-            FROM mobile_friendships mf
-            WHERE mf.user_a_id=%s OR mf.user_b_id=%s
-            ORDER BY mf.created_at DESC
-            LIMIT %s
+            SELECT e.friend_id AS friend_account_id, mf.created_at
+            FROM (
+                SELECT friend_id, created_at
+                FROM mobile_friend_edges
+                WHERE account_id=%(me)s
+                ORDER BY created_at DESC NULLS LAST, friend_id DESC
+                LIMIT %(lim)s
+            ) e
+            LEFT JOIN mobile_friendships mf
+              ON mf.user_a_id=LEAST(%(me)s, e.friend_id) AND mf.user_b_id=GREATEST(%(me)s, e.friend_id)
+            ORDER BY e.created_at DESC NULLS LAST, e.friend_id DESC
             """,
-            (account_id, account_id, account_id, max(1, min(int(limit), 500))),
+            {"me": account_id, "lim": max(1, min(int(limit), 500))},
         )
         rows = cur.fetchall() or []
         friend_ids = [int(r["friend_account_id"]) for r in rows]
@@ -197,19 +216,20 @@ def profile_friend_detail(friend_account_id: int, authorization: Optional[str] =
         if fid == account_id:
             raise HTTPException(status_code=400, detail="Bu endpoint arkadaş profili içindir")
 
-        cur = conn.cursor()
-        a, b = (account_id, fid) if account_id < fid else (fid, account_id)
-        cur.execute(
-            "SELECT created_at FROM mobile_friendships WHERE user_a_id=%s AND user_b_id=%s LIMIT 1",
-            (a, b),
-        )
-        fr = cur.fetchone()
-        if not fr:
+        if not is_friend(conn, account_id, fid):
             raise HTTPException(status_code=403, detail="Bu kullanıcı arkadaş listende değil")
 
+        cur = conn.cursor()
+        a, b = _friend_pair(account_id, fid)
         cur.execute(
-            "SELECT id, COALESCE(name,'') AS name, COALESCE(email,'') AS email FROM accounts WHERE id=%s LIMIT 1",
-            (fid,),
+            """
+            SELECT ac.id, COALESCE(ac.name,'') AS name, COALESCE(ac.email,'') AS email, mf.created_at AS friends_since
+            FROM accounts ac
+            LEFT JOIN mobile_friendships mf ON mf.user_a_id=%s AND mf.user_b_id=%s
+            WHERE ac.id=%s
+            LIMIT 1
+            """,
+            (a, b, fid),
         )
         row = cur.fetchone()
         if not row:
@@ -218,7 +238,49 @@ def profile_friend_detail(friend_account_id: int, authorization: Optional[str] =
             "account_id": int(row["id"]),
             "name": _display_name((row.get("name") or ""), (row.get("email") or "")),
             "email": (row.get("email") or ""),
-            "friends_since": (fr.get("created_at") or ""),
+            "friends_since": (row.get("friends_since") or ""),
+        }
+    finally:
+        conn.close()
+
+
+@router.get("/friend-suggestions", summary="Arkadaş önerileri")
+def profile_friend_suggestions(limit: int = 20, authorization: Optional[str] = Header(default=None)):
+    conn = _db_conn()
+    try:
+        account_id = _require_account_id(conn, authorization)
+        cur = conn.cursor()
+        # Öneriler arka planda hesaplanır; o arada arkadaş olunan/istek gönderilen hesaplar burada elenir.
+        cur.execute(
+            """
+            SELECT s.suggested_id, s.mutual_count, COALESCE(a.name,'') AS name, COALESCE(a.email,'') AS email
+            FROM mobile_friend_suggestions s
+            JOIN accounts a ON a.id=s.suggested_id AND COALESCE(a.is_active,1)=1
+            WHERE s.account_id=%(me)s
+              AND NOT EXISTS (
+                  SELECT 1 FROM mobile_friend_edges e
+                  WHERE e.account_id=%(me)s AND e.friend_id=s.suggested_id
+              )
+              AND NOT EXISTS (
+                  SELECT 1 FROM mobile_friend_requests r
+                  WHERE r.status='pending'
+                    AND ((r.requester_id=%(me)s AND r.target_id=s.suggested_id)
+                      OR (r.requester_id=s.suggested_id AND r.target_id=%(me)s))
+              )
+            ORDER BY s.mutual_count DESC, s.suggested_id
+            LIMIT %(lim)s
+            """,
+            {"me": account_id, "lim": max(1, min(int(limit), 50))},
+        )
+        return {
+            "items": [
+                {
+                    "account_id": int(r["suggested_id"]),
+                    "name": _display_name((r.get("name") or ""), (r.get("email") or "")),
+                    "mutual_friend_count": int(r["mutual_count"]),
+                }
+                for r in cur.fetchall() or []
+            ]
         }
     finally:
         conn.close()
@@ -322,6 +384,8 @@ def accept_friend_request(request_id: int, authorization: Optional[str] = Header
             (int(request_id),),
         )
         conn.commit()
+        # Diğer worker'lara trigger bildirimiyle gider; bu worker hemen görsün.
+        apply_friendship_change(a, b, True)
         return {"ok": True, "request_id": int(request_id), "status": "accepted"}
     finally:
         conn.close()
@@ -332,9 +396,10 @@ def profile_tickets(limit: int = 200, authorization: Optional[str] = Header(defa
     conn = _db_conn()
     try:
         account_id = _require_account_id(conn, authorization)
+        created = ts_column(conn, "mobile_tickets", "created_at")
         cur = conn.cursor()
         cur.execute(
-            """
+            f"""
             SELECT
                 t.id,
                 t.submission_id,
@@ -347,7 +412,7 @@ def profile_tickets(limit: int = 200, authorization: Optional[str] = Header(defa
                 t.used_at
             FROM mobile_tickets t
             WHERE t.account_id=%s
-            ORDER BY t.created_at DESC, t.id DESC
+            ORDER BY t.{created} DESC, t.id DESC
             LIMIT %s
             """,
             (int(account_id), max(1, min(int(limit), 1000))),
@@ -520,28 +585,183 @@ def update_profile_settings(
     return profile_settings(authorization=authorization)
 
 
+def _notification_counts(conn, account_id: int) -> Dict[str, Any]:
+    counts = badge_counts(conn, account_id)
+    incoming_friend_requests = counts["pending_friend_requests"]
+    unread_messages = counts["unread_messages"]
+    return {
+        "account_id": int(account_id),
+        "total_count": int(incoming_friend_requests + unread_messages),
+        "incoming_friend_requests_count": incoming_friend_requests,
+        "unread_messages_count": unread_messages,
+    }
+
+
 @router.get("/notifications", summary="Bildirim özeti")
 def profile_notifications(authorization: Optional[str] = Header(default=None)):
     conn = _db_conn()
     try:
         account_id = _require_account_id(conn, authorization)
+        return _notification_counts(conn, account_id)
+    finally:
+        conn.close()
+
+
+class _BadgeWatcher:
+    __slots__ = ("loop", "event")
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+
+_BADGE_WATCHERS: Dict[int, Set[_BadgeWatcher]] = {}
+_BADGE_WATCHERS_LOCK = threading.Lock()
+
+
+def _wake_badge_watchers(account_ids: List[int]):
+    with _BADGE_WATCHERS_LOCK:
+        if account_ids:
+            targets = [w for aid in account_ids for w in _BADGE_WATCHERS.get(int(aid), ())]
+        else:
+            targets = [w for ws in _BADGE_WATCHERS.values() for w in ws]
+    for w in targets:
+        try:
+            w.wake()
+        except RuntimeError:
+            pass
+
+
+def _on_badge_message(payload: str):
+    # Yeni mesaj yalnızca alıcının okunmamış sayacını değiştirir.
+    if payload == "*":
+        _wake_badge_watchers([])
+        return
+    parts = (payload or "").split(":")
+    if len(parts) == 3 and parts[2].isdigit():
+        _wake_badge_watchers([int(parts[2])])
+
+
+def _on_badge_chat_event(payload: str):
+    try:
+        event = json.loads(payload or "{}")
+    except ValueError:
+        return
+    if event.get("type") == "read" and event.get("account_id"):
+        _wake_badge_watchers([int(event["account_id"])])
+
+
+def _on_badge_friend_request(payload: str):
+    if (payload or "").isdigit():
+        _wake_badge_watchers([int(payload)])
+
+
+def init_notification_stream():
+    conn = _db_conn()
+    try:
         cur = conn.cursor()
         cur.execute(
+            f"""
+            CREATE OR REPLACE FUNCTION mobile_friend_request_notify() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    PERFORM pg_notify('{FRIEND_REQUEST_CHANNEL}', OLD.target_id::text);
+                END IF;
+                IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.target_id IS DISTINCT FROM OLD.target_id) THEN
+                    PERFORM pg_notify('{FRIEND_REQUEST_CHANNEL}', NEW.target_id::text);
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
             """
-            SELECT COUNT(*) AS cnt
-            FROM mobile_friend_requests
-            WHERE target_id=%s AND status='pending'
-            """,
-            (int(account_id),),
         )
-        incoming_friend_requests = int((cur.fetchone() or {}).get("cnt") or 0)
-        unread_messages = int(unread_messages_count(conn, account_id))
-        total_count = int(incoming_friend_requests + unread_messages)
-        return {
-            "account_id": int(account_id),
-            "total_count": total_count,
-            "incoming_friend_requests_count": incoming_friend_requests,
-            "unread_messages_count": unread_messages,
-        }
+        cur.execute(
+            """
+            DO $$
+            BEGIN
+                IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname='trg_mobile_friend_request_notify') THEN
+                    CREATE TRIGGER trg_mobile_friend_request_notify
+                    AFTER INSERT OR UPDATE OF status, target_id OR DELETE ON mobile_friend_requests
+                    FOR EACH ROW EXECUTE PROCEDURE mobile_friend_request_notify();
+                END IF;
+            END$$;
+            """
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
     finally:
         conn.close()
+    # Bağlantı koparsa bildirim kaçmış olabilir; tüm akışlar sayaçları yeniden okur.
+    pg_listener.subscribe(MESSAGE_CHANNEL, _on_badge_message, on_reset=lambda: _wake_badge_watchers([]))
+    pg_listener.subscribe(CHAT_EVENT_CHANNEL, _on_badge_chat_event)
+    pg_listener.subscribe(FRIEND_REQUEST_CHANNEL, _on_badge_friend_request)
+
+
+def _stream_account_id(authorization: Optional[str]) -> int:
+    conn = _db_conn()
+    try:
+        return _require_account_id(conn, authorization)
+    finally:
+        conn.close()
+
+
+def _stream_counts(account_id: int) -> Dict[str, Any]:
+    conn = _db_conn()
+    try:
+        return _notification_counts(conn, account_id)
+    finally:
+        conn.close()
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+@router.get("/notifications/stream", summary="Bildirim sayaçları (SSE)")
+async def profile_notifications_stream(request: Request, authorization: Optional[str] = Header(default=None)):
+    account_id = await run_in_threadpool(_stream_account_id, authorization)
+
+    async def events():
+        watcher = _BadgeWatcher()
+        with _BADGE_WATCHERS_LOCK:
+            _BADGE_WATCHERS.setdefault(account_id, set()).add(watcher)
+        last: Optional[Dict[str, Any]] = None
+        try:
+            while True:
+                watcher.event.clear()
+                counts = await run_in_threadpool(_stream_counts, account_id)
+                if counts != last:
+                    last = counts
+                    yield _sse("badges", counts)
+                while True:
+                    polling = not pg_listener.is_connected()
+                    step = NOTIFICATION_STREAM_FALLBACK_SEC if polling else NOTIFICATION_STREAM_KEEPALIVE_SEC
+                    try:
+                        await asyncio.wait_for(watcher.event.wait(), timeout=step)
+                        # Art arda gelen değişiklikler tek sorguda toplanır.
+                        await asyncio.sleep(NOTIFICATION_STREAM_DEBOUNCE_SEC)
+                        break
+                    except asyncio.TimeoutError:
+                        pass
+                    if await request.is_disconnected():
+                        return
+                    if polling:
+                        break
+                    yield ": keepalive\n\n"
+        finally:
+            with _BADGE_WATCHERS_LOCK:
+                ws = _BADGE_WATCHERS.get(account_id)
+                if ws is not None:
+                    ws.discard(watcher)
+                    if not ws:
+                        _BADGE_WATCHERS.pop(account_id, None)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,263 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from fastapi import APIRouter, HTTPException, WebSocket
+from starlette.concurrency import run_in_threadpool
+
+from app import pg_listener
+from app.routers.messages import (
+    CHAT_EVENT_CHANNEL,
+    MESSAGE_CHANNEL,
+    _db_conn,
+    _is_friend,
+    _require_account_id,
+    publish_chat_event,
+    record_read_advance,
+)
+
+router = APIRouter(tags=["Gerçek zamanlı"])
+
+WS_SEND_QUEUE_MAX = int(os.getenv("WS_SEND_QUEUE_MAX", "100"))
+WS_PING_INTERVAL_SEC = float(os.getenv("WS_PING_INTERVAL_SEC", "25"))
+WS_IDLE_TIMEOUT_SEC = float(os.getenv("WS_IDLE_TIMEOUT_SEC", "75"))
+
+_CLIENTS: Dict[int, Set["_Client"]] = {}
+_CLIENTS_LOCK = threading.Lock()
+_STATE: Dict[str, Any] = {"loop": None}
+
+
+class _Client:
+    def __init__(self, ws: WebSocket, account_id: int):
+        self.ws = ws
+        self.account_id = account_id
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max(1, WS_SEND_QUEUE_MAX))
+        self.last_seen = time.monotonic()
+        self.closing = False
+
+    def offer(self, text: str, droppable: bool = False):
+        # Event loop içinde çalışır. Kuyruk doluysa "yazıyor" gibi olaylar düşer;
+        # diğerlerinde yavaş istemci kapatılır, yeniden bağlanınca HTTP ile eşitlenir.
+        if self.closing:
+            return
+        try:
+            self.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            if not droppable:
+                self.close(1013)
+
+    def close(self, code: int):
+        # Bekleyen gönderimler atılır; sender aynı kuyrukta kapanış kodunu görünce soketi kapatır.
+        if self.closing:
+            return
+        self.closing = True
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(code)
+
+    def offer_threadsafe(self, text: str, droppable: bool = False):
+        try:
+            self.loop.call_soon_threadsafe(self.offer, text, droppable)
+        except RuntimeError:
+            pass
+
+
+def _register(client: _Client):
+    with _CLIENTS_LOCK:
+        _CLIENTS.setdefault(client.account_id, set()).add(client)
+
+
+def _unregister(client: _Client):
+    with _CLIENTS_LOCK:
+        cs = _CLIENTS.get(client.account_id)
+        if cs is not None:
+            cs.discard(client)
+            if not cs:
+                _CLIENTS.pop(client.account_id, None)
+
+
+def _clients_for(*account_ids: int) -> list:
+    with _CLIENTS_LOCK:
+        return [c for aid in account_ids for c in _CLIENTS.get(int(aid), ())]
+
+
+def _send_to(account_ids, event: Dict[str, Any], droppable: bool = False):
+    clients = _clients_for(*account_ids)
+    if not clients:
+        return
+    text = json.dumps(event, separators=(",", ":"), default=str)
+    for c in clients:
+        c.offer_threadsafe(text, droppable)
+
+
+def _fetch_message(message_id: int) -> Optional[Dict[str, Any]]:
+    conn = _db_conn()
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            SELECT id, sender_account_id, receiver_account_id, body, created_at
+            FROM mobile_direct_messages
+            WHERE id=%s
+            """,
+            (int(message_id),),
+        )
+        row = cur.fetchone()
+        return dict(row) if row else None
+    finally:
+        conn.close()
+
+
+async def _deliver_message(message_id: int, sender_id: int, receiver_id: int):
+    msg = await run_in_threadpool(_fetch_message, message_id)
+    if msg:
+        _send_to((sender_id, receiver_id), {"type": "message", "message": msg})
+
+
+def _on_message_notify(payload: str):
+    # Listener thread'inde çalışır; DB okuması event loop'a devredilir.
+    if payload == "*":
+        with _CLIENTS_LOCK:
+            everyone = list(_CLIENTS.keys())
+        _send_to(everyone, {"type": "resync"})
+        return
+    parts = (payload or "").split(":")
+    if len(parts) != 3 or not all(p.isdigit() for p in parts):
+        return
+    mid, sender_id, receiver_id = (int(p) for p in parts)
+    loop = _STATE["loop"]
+    if loop is None or not _clients_for(sender_id, receiver_id):
+        return
+    asyncio.run_coroutine_threadsafe(_deliver_message(mid, sender_id, receiver_id), loop)
+
+
+def _on_chat_event(payload: str):
+    try:
+        event = json.loads(payload or "{}")
+    except ValueError:
+        return
+    if event.get("type") == "typing":
+        _send_to((int(event.get("to_account_id") or 0),), event, droppable=True)
+    elif event.get("type") == "read":
+        _send_to((int(event.get("peer_account_id") or 0), int(event.get("account_id") or 0)), event)
+
+
+def init_realtime_gateway():
+    pg_listener.subscribe(MESSAGE_CHANNEL, _on_message_notify)
+    pg_listener.subscribe(CHAT_EVENT_CHANNEL, _on_chat_event)
+
+
+def _authenticate(token: str) -> int:
+    conn = _db_conn()
+    try:
+        return _require_account_id(conn, f"Bearer {token}")
+    finally:
+        conn.close()
+
+
+def _handle_typing(me: int, to_id: int, is_typing: bool):
+    conn = _db_conn()
+    try:
+        if to_id == me or not _is_friend(conn, me, to_id):
+            return
+        cur = conn.cursor()
+        publish_chat_event(cur, {"type": "typing", "from_account_id": me, "to_account_id": to_id, "is_typing": is_typing})
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _handle_read(me: int, peer: int, last_read_message_id: int):
+    conn = _db_conn()
+    try:
+        if peer == me or not _is_friend(conn, me, peer):
+            return
+        record_read_advance(conn, me, peer, last_read_message_id)
+    finally:
+        conn.close()
+
+
+async def _sender(client: _Client):
+    while True:
+        item = await client.queue.get()
+        if isinstance(item, int):
+            await client.ws.close(code=item)
+            return
+        await client.ws.send_text(item)
+
+
+async def _heartbeat(client: _Client):
+    while True:
+        await asyncio.sleep(WS_PING_INTERVAL_SEC)
+        if time.monotonic() - client.last_seen > WS_IDLE_TIMEOUT_SEC:
+            client.close(1001)
+            return
+        client.offer('{"type":"ping"}', droppable=True)
+
+
+async def _receiver(client: _Client):
+    while True:
+        raw = await client.ws.receive_text()
+        client.last_seen = time.monotonic()
+        try:
+            msg = json.loads(raw)
+        except ValueError:
+            continue
+        kind = msg.get("type") if isinstance(msg, dict) else None
+        if kind == "ping":
+            client.offer('{"type":"pong"}', droppable=True)
+        elif kind == "typing":
+            await run_in_threadpool(
+                _handle_typing,
+                client.account_id,
+                int(msg.get("to_account_id") or 0),
+                bool(msg.get("is_typing", True)),
+            )
+        elif kind == "read":
+            await run_in_threadpool(
+                _handle_read,
+                client.account_id,
+                int(msg.get("peer_account_id") or 0),
+                int(msg.get("last_read_message_id") or 0),
+            )
+
+
+@router.websocket("/ws")
+async def chat_socket(ws: WebSocket):
+    token = (ws.query_params.get("token") or "").strip()
+    if not token:
+        auth = ws.headers.get("authorization") or ""
+        if auth.lower().startswith("bearer "):
+            token = auth.split(" ", 1)[1].strip()
+    if not token:
+        await ws.close(code=4401)
+        return
+    try:
+        me = await run_in_threadpool(_authenticate, token)
+    except HTTPException:
+        await ws.close(code=4401)
+        return
+    await ws.accept()
+    _STATE["loop"] = asyncio.get_running_loop()
+    client = _Client(ws, me)
+    _register(client)
+    tasks = [
+        asyncio.create_task(_sender(client)),
+        asyncio.create_task(_receiver(client)),
+        asyncio.create_task(_heartbeat(client)),
+    ]
+    try:
+        client.offer(json.dumps({"type": "hello", "account_id": me}))
+        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        if client.closing and not tasks[0].done():
+            # Kapanış kodu (1001/1013) gönderilmeden görevler iptal edilmesin.
+            await asyncio.wait([tasks[0]], timeout=5)
+    finally:
+        _unregister(client)
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
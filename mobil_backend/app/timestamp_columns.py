@@ -0,0 +1,270 @@
+import os
+import time
+from typing import Dict, List, Tuple
+
+import psycopg2
+import psycopg2.extras
+
+from app.jobs import start_periodic_job, try_job_lock
+
+DATABASE_URL = os.getenv("DATABASE_URL", "").strip()
+TIMESTAMP_BACKFILL_INTERVAL_SEC = int(os.getenv("TIMESTAMP_BACKFILL_INTERVAL_SEC", "60"))
+TIMESTAMP_BACKFILL_BATCH = max(100, int(os.getenv("TIMESTAMP_BACKFILL_BATCH", "2000")))
+TIMESTAMP_BACKFILL_PAUSE_SEC = float(os.getenv("TIMESTAMP_BACKFILL_PAUSE_SEC", "0.05"))
+
+# Tablo -> (sıralama anahtarı kolonları, TEXT zaman kolonları). Her TEXT kolonun
+# yanına <kolon>_ts TIMESTAMPTZ eklenir; yazmalar trigger ile iki kolona birden gider.
+TIMESTAMP_COLUMNS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "mobile_direct_messages": (("id",), ("created_at",)),
+    "mobile_friendships": (("user_a_id", "user_b_id"), ("created_at",)),
+    "mobile_event_submissions": (("id",), ("created_at", "event_date", "start_at", "approved_at")),
+    "sessions": (("id",), ("created_at", "expires_at")),
+    "mobile_tickets": (("id",), ("created_at",)),
+}
+
+_INDEXES = [
+    # list_events: onaylı etkinlikler tarih sırasıyla.
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mobile_event_submissions_approved_when
+    ON mobile_event_submissions (COALESCE(event_date_ts, start_at_ts, approved_at_ts, created_at_ts))
+    WHERE status='approved'
+    """,
+    # Admin talep listesi.
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mobile_event_submissions_status_created
+    ON mobile_event_submissions (status, created_at_ts DESC)
+    """,
+    # profile_tickets.
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_mobile_tickets_account_created
+    ON mobile_tickets (account_id, created_at_ts DESC, id DESC)
+    """,
+    # Süresi dolan oturumların temizliği.
+    """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_sessions_expires_at_ts
+    ON sessions (expires_at_ts)
+    """,
+]
+
+_READY: Dict[str, bool] = {}
+
+
+def _db_conn():
+    if not DATABASE_URL:
+        return None
+    return psycopg2.connect(
+        DATABASE_URL,
+        connect_timeout=3,
+        cursor_factory=psycopg2.extras.RealDictCursor,
+    )
+
+
+def _ensure_table(cur, table: str, keys: Tuple[str, ...], columns: Tuple[str, ...]) -> bool:
+    cur.execute(
+        """
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema='public' AND table_name=%s
+        """,
+        (table,),
+    )
+    existing = {r["column_name"] for r in cur.fetchall() or []}
+    if not set(keys + columns) <= existing:
+        return False
+    for col in columns:
+        # Varsayılansız nullable kolon eklemek tabloyu yeniden yazmaz.
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {col}_ts TIMESTAMPTZ")
+    sync = "\n".join(
+        f"""
+                IF TG_OP = 'INSERT' OR NEW.{col} IS DISTINCT FROM OLD.{col} THEN
+                    NEW.{col}_ts := mobile_parse_ts(NEW.{col});
+                END IF;"""
+        for col in columns
+    )
+    cur.execute(
+        f"""
+        CREATE OR REPLACE FUNCTION {table}_ts_sync() RETURNS trigger AS $$
+        BEGIN
+            {sync}
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    cur.execute(
+        "SELECT 1 FROM pg_trigger WHERE tgrelid=to_regclass(%s) AND tgname=%s",
+        (table, f"trg_{table}_ts_sync"),
+    )
+    if not cur.fetchone():
+        cur.execute(
+            f"""
+            CREATE TRIGGER trg_{table}_ts_sync
+            BEFORE INSERT OR UPDATE ON {table}
+            FOR EACH ROW EXECUTE PROCEDURE {table}_ts_sync()
+            """
+        )
+    cur.execute(
+        "INSERT INTO mobile_ts_backfill (table_name) VALUES (%s) ON CONFLICT (table_name) DO NOTHING",
+        (table,),
+    )
+    return True
+
+
+def init_timestamp_columns():
+    """
+    TEXT zaman kolonlarının TIMESTAMPTZ'ye çevrimi (ilk aşama): tipli kolonlar ve
+    çift yazma trigger'ları eklenir; eski satırlar arka plan işiyle doldurulur.
+    Okumalar bir tablo tamamen dolunca (timestamps_ready) tipli kolona geçer.
+    """
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS mobile_ts_backfill (
+                table_name TEXT PRIMARY KEY,
+                last_key TEXT,
+                done_at TIMESTAMPTZ
+            )
+            """
+        )
+        # Serbest girilmiş tarihler (event_date vb.) çözülemezse NULL kalır.
+        cur.execute(
+            """
+            CREATE OR REPLACE FUNCTION mobile_parse_ts(t TEXT) RETURNS TIMESTAMPTZ AS $$
+            BEGIN
+                IF t IS NULL OR btrim(t) = '' THEN
+                    RETURN NULL;
+                END IF;
+                RETURN btrim(t)::timestamptz;
+            EXCEPTION WHEN others THEN
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql STABLE
+            """
+        )
+        conn.commit()
+        for table, (keys, columns) in TIMESTAMP_COLUMNS.items():
+            try:
+                cur.execute("SET LOCAL lock_timeout = '5s'")
+                _ensure_table(cur, table, keys, columns)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+        conn.autocommit = True
+        for sql in _INDEXES:
+            try:
+                cur.execute(sql)
+            except Exception:
+                pass
+    finally:
+        conn.close()
+
+
+def timestamps_ready(conn, table: str) -> bool:
+    """Tablonun tüm eski satırları doldurulduysa okumalar *_ts kolonlarını kullanabilir."""
+    if _READY.get(table):
+        return True
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT done_at FROM mobile_ts_backfill WHERE table_name=%s", (table,))
+        row = cur.fetchone()
+    except Exception:
+        conn.rollback()
+        return False
+    ready = bool(row and row.get("done_at"))
+    if ready:
+        _READY[table] = True
+    return ready
+
+
+def ts_column(conn, table: str, column: str) -> str:
+    return f"{column}_ts" if timestamps_ready(conn, table) else column
+
+
+def _backfill_batch(cur, table: str, keys: Tuple[str, ...], columns: Tuple[str, ...], last: List[int]):
+    key_list = ", ".join(keys)
+    sets = ", ".join(f"{c}_ts = mobile_parse_ts(x.{c})" for c in columns)
+    pending = " OR ".join(f"(x.{c}_ts IS NULL AND x.{c} IS NOT NULL)" for c in columns)
+    cur.execute(
+        f"""
+        WITH batch AS (
+            SELECT {key_list} FROM {table}
+            WHERE ({key_list}) > ({", ".join(["%s"] * len(keys))})
+            ORDER BY {key_list}
+            LIMIT %s
+        ),
+        upd AS (
+            UPDATE {table} x SET {sets}
+            FROM batch b
+            WHERE {" AND ".join(f"x.{k}=b.{k}" for k in keys)} AND ({pending})
+        )
+        SELECT {key_list} FROM batch ORDER BY {", ".join(f"{k} DESC" for k in keys)} LIMIT 1
+        """,
+        tuple(last) + (TIMESTAMP_BACKFILL_BATCH,),
+    )
+    row = cur.fetchone()
+    return [int(row[k]) for k in keys] if row else None
+
+
+def backfill_timestamp_columns(conn) -> int:
+    """Eski satırları anahtar sırasıyla küçük parçalar halinde doldurur; kaldığı yeri saklar."""
+    cur = conn.cursor()
+    if not try_job_lock(cur, "mobile_ts_backfill"):
+        conn.rollback()
+        return 0
+    cur.execute("SELECT table_name, last_key FROM mobile_ts_backfill WHERE done_at IS NULL")
+    todo = {r["table_name"]: r["last_key"] for r in cur.fetchall() or []}
+
+    # Job kilidi conn'un transaction'ında açık kalır; parçalar ayrı bağlantıda işlenir.
+    batches = 0
+    work = _db_conn()
+    try:
+        wcur = work.cursor()
+        for table, last_key in todo.items():
+            spec = TIMESTAMP_COLUMNS.get(table)
+            if not spec:
+                continue
+            keys, columns = spec
+            last = [int(x) for x in last_key.split(",")] if last_key else [-1] * len(keys)
+            while True:
+                nxt = _backfill_batch(wcur, table, keys, columns, last)
+                if nxt is None:
+                    wcur.execute(
+                        "UPDATE mobile_ts_backfill SET done_at=NOW() WHERE table_name=%s",
+                        (table,),
+                    )
+                    work.commit()
+                    break
+                last = nxt
+                wcur.execute(
+                    "UPDATE mobile_ts_backfill SET last_key=%s WHERE table_name=%s",
+                    (",".join(str(x) for x in last), table),
+                )
+                work.commit()
+                batches += 1
+                time.sleep(TIMESTAMP_BACKFILL_PAUSE_SEC)
+    except Exception:
+        work.rollback()
+        raise
+    finally:
+        work.close()
+        conn.rollback()
+    return batches
+
+
+def _backfill_job():
+    conn = _db_conn()
+    if not conn:
+        return
+    try:
+        backfill_timestamp_columns(conn)
+    except Exception:
+        conn.rollback()
+    finally:
+        conn.close()
+
+
+def start_timestamp_backfill_job():
+    start_periodic_job("mobile_ts_backfill", TIMESTAMP_BACKFILL_INTERVAL_SEC, _backfill_job)
@@ -0,0 +1,235 @@
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Store (sıkıştırmasız) ZIP'i dosya boyutlarından önceden hesaplanan deterministik bir
+# yerleşimle akıtır. Yerel başlıklarda CRC yoktur (bit 3, data descriptor); böylece arşivin
+# toplam boyutu ve her baytın konumu dosyalar okunmadan bilinir ve Range ile devam edilebilir.
+
+_FLAGS = 0x0808  # bit 3: data descriptor, bit 11: UTF-8 dosya adı
+_U32 = 0xFFFFFFFF
+_U16 = 0xFFFF
+_CRC_CACHE_MAX = 100_000
+_CRC_CACHE: "OrderedDict[Tuple[str, int, int], int]" = OrderedDict()
+_CRC_LOCK = threading.Lock()
+
+
+class ZipEntry(NamedTuple):
+    name: str
+    path: str
+    size: int
+    mtime_ns: int
+
+
+def _dos_datetime(mtime_ns: int) -> Tuple[int, int]:
+    t = time.localtime(mtime_ns / 1e9)
+    year = max(1980, t.tm_year)
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    return dos_time, dos_date
+
+
+def entry_key(entry: ZipEntry) -> Tuple[str, int, int]:
+    return (entry.path, entry.size, entry.mtime_ns)
+
+
+def _crc_cached(entry: ZipEntry) -> Optional[int]:
+    with _CRC_LOCK:
+        key = entry_key(entry)
+        crc = _CRC_CACHE.get(key)
+        if crc is not None:
+            _CRC_CACHE.move_to_end(key)
+        return crc
+
+
+def _crc_store(entry: ZipEntry, crc: int):
+    with _CRC_LOCK:
+        _CRC_CACHE[entry_key(entry)] = crc
+        while len(_CRC_CACHE) > _CRC_CACHE_MAX:
+            _CRC_CACHE.popitem(last=False)
+
+
+class ZipLayout:
+    def __init__(self, entries: List[ZipEntry], known_crcs: Optional[Dict[Tuple[str, int, int], int]] = None):
+        """
+        known_crcs: kalıcı depodan (entry_key -> CRC) okunmuş değerler. Bu akışta yeni
+        hesaplanan CRC'ler new_crcs'te toplanır; çağıran kalıcı depoya yazar.
+        """
+        self.entries = list(entries)
+        self.new_crcs: Dict[Tuple[str, int, int], int] = {}
+        for e in self.entries:
+            crc = (known_crcs or {}).get(entry_key(e))
+            if crc is not None:
+                _crc_store(e, crc)
+        self._names = [e.name.encode("utf-8") for e in self.entries]
+        self._offsets: List[int] = []
+        pos = 0
+        for e, n in zip(self.entries, self._names):
+            if e.size >= _U32:
+                raise ValueError("4GB üzeri tekil dosya desteklenmiyor")
+            self._offsets.append(pos)
+            pos += 30 + len(n) + e.size + 16
+        self.cd_offset = pos
+        self.cd_size = sum(46 + len(n) + (12 if off >= _U32 else 0) for n, off in zip(self._names, self._offsets))
+        self.zip64 = self.cd_offset >= _U32 or self.cd_size >= _U32 or len(self.entries) >= _U16
+        self.tail_size = self.cd_size + (56 + 20 if self.zip64 else 0) + 22
+        self.total_size = self.cd_offset + self.tail_size
+
+    def _local_header(self, i: int) -> bytes:
+        e, n = self.entries[i], self._names[i]
+        dos_time, dos_date = _dos_datetime(e.mtime_ns)
+        return struct.pack("<IHHHHHIIIHH", 0x04034B50, 20, _FLAGS, 0, dos_time, dos_date, 0, 0, 0, len(n), 0) + n
+
+    def _remember_crc(self, e: ZipEntry, crc: int):
+        _crc_store(e, crc)
+        self.new_crcs[entry_key(e)] = crc
+
+    def _entry_crc(self, i: int, chunk_size: int) -> int:
+        e = self.entries[i]
+        crc = _crc_cached(e)
+        if crc is not None:
+            return crc
+        crc = 0
+        read = 0
+        with open(e.path, "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                crc = zlib.crc32(chunk, crc)
+                read += len(chunk)
+        if read != e.size:
+            raise IOError(f"Dosya değişti: {e.name}")
+        self._remember_crc(e, crc)
+        return crc
+
+    def _tail(self, chunk_size: int) -> bytes:
+        parts = []
+        for i, (e, n) in enumerate(zip(self.entries, self._names)):
+            off = self._offsets[i]
+            extra = struct.pack("<HHQ", 0x0001, 8, off) if off >= _U32 else b""
+            dos_time, dos_date = _dos_datetime(e.mtime_ns)
+            parts.append(
+                struct.pack(
+                    "<IHHHHHHIIIHHHHHII",
+                    0x02014B50,
+                    (3 << 8) | 45,
+                    45 if extra else 20,
+                    _FLAGS,
+                    0,
+                    dos_time,
+                    dos_date,
+                    self._entry_crc(i, chunk_size),
+                    e.size,
+                    e.size,
+                    len(n),
+                    len(extra),
+                    0,
+                    0,
+                    0,
+                    0o100644 << 16,
+                    min(off, _U32),
+                )
+                + n
+                + extra
+            )
+        count = len(self.entries)
+        if self.zip64:
+            eocd64_offset = self.cd_offset + self.cd_size
+            parts.append(
+                struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, self.cd_size, self.cd_offset)
+            )
+            parts.append(struct.pack("<IIQI", 0x07064B50, 0, eocd64_offset, 1))
+        parts.append(
+            struct.pack(
+                "<IHHHHIIH",
+                0x06054B50,
+                0,
+                0,
+                min(count, _U16),
+                min(count, _U16),
+                min(self.cd_size, _U32),
+                min(self.cd_offset, _U32),
+                0,
+            )
+        )
+        return b"".join(parts)
+
+    def iter_range(self, start: int = 0, end: Optional[int] = None, chunk_size: int = 256 * 1024) -> Iterator[bytes]:
+        """[start, end] (dahil) aralığındaki baytları en fazla chunk_size bellekle üretir."""
+        end = self.total_size - 1 if end is None else min(end, self.total_size - 1)
+        if start > end:
+            return
+
+        def _slice(data: bytes, at: int) -> bytes:
+            lo = max(start, at) - at
+            hi = min(end + 1, at + len(data)) - at
+            return data[lo:hi] if hi > lo else b""
+
+        for i, e in enumerate(self.entries):
+            header = self._local_header(i)
+            h_at = self._offsets[i]
+            d_at = h_at + len(header)
+            desc_at = d_at + e.size
+            if desc_at + 16 <= start:
+                continue
+            if h_at > end:
+                return
+            piece = _slice(header, h_at)
+            if piece:
+                yield piece
+            if d_at + e.size > start and d_at <= end:
+                # CRC için dosya her zaman baştan okunur; yalnızca aralıktaki kısım gönderilir.
+                crc = 0
+                pos = d_at
+                with open(e.path, "rb") as f:
+                    while pos <= end:
+                        chunk = f.read(chunk_size)
+                        if not chunk:
+                            break
+                        crc = zlib.crc32(chunk, crc)
+                        piece = _slice(chunk, pos)
+                        if piece:
+                            yield piece
+                        pos += len(chunk)
+                    if desc_at <= end:
+                        # Tanımlayıcıya ulaşılacaksa kalan kısım da CRC için okunur.
+                        while True:
+                            chunk = f.read(chunk_size)
+                            if not chunk:
+                                break
+                            crc = zlib.crc32(chunk, crc)
+                            pos += len(chunk)
+                if pos - d_at == e.size:
+                    if _crc_cached(e) != crc:
+                        self._remember_crc(e, crc)
+                elif desc_at <= end:
+                    raise IOError(f"Dosya değişti: {e.name}")
+                if desc_at > end:
+                    return
+            else:
+                if d_at > end:
+                    return
+                crc = self._entry_crc(i, chunk_size)
+            piece = _slice(struct.pack("<IIII", 0x08074B50, crc, e.size, e.size), desc_at)
+            if piece:
+                yield piece
+        tail = self._tail(chunk_size)
+        for at in range(0, len(tail), chunk_size):
+            piece = _slice(tail[at : at + chunk_size], self.cd_offset + at)
+            if piece:
+                yield piece
+
+
+def stat_entry(name: str, path: str) -> Optional[ZipEntry]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not os.path.isfile(path):
+        return None
+    return ZipEntry(name=name, path=path, size=int(st.st_size), mtime_ns=int(st.st_mtime_ns))
@@ -0,0 +1,86 @@
+"""Tek worker'ın kaç boştaki /ws bağlantısını taşıyabildiğini ölçer.
+
+Kullanım:
+    python ops/ws_idle_bench.py --url ws://127.0.0.1:8100/ws --token <oturum> \
+        --count 5000 --pid <uvicorn worker pid>
+
+Bağlantılar aynı oturumla açılır, sunucu ping'lerine pong ile cevap verilir ve
+her adımda worker'ın RSS değeri (/proc/<pid>/status) raporlanır.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+import websockets
+
+
+def _rss_kb(pid: int) -> int:
+    if not pid:
+        return 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return 0
+
+
+async def _idle_client(url: str, stop: asyncio.Event, opened: list, failed: list):
+    try:
+        async with websockets.connect(url, open_timeout=30, ping_interval=None) as ws:
+            opened.append(1)
+            while not stop.is_set():
+                try:
+                    raw = await asyncio.wait_for(ws.recv(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                if json.loads(raw).get("type") == "ping":
+                    await ws.send('{"type":"pong"}')
+    except Exception:
+        failed.append(1)
+
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--url", default="ws://127.0.0.1:8100/ws")
+    ap.add_argument("--token", required=True)
+    ap.add_argument("--count", type=int, default=1000)
+    ap.add_argument("--step", type=int, default=500)
+    ap.add_argument("--hold", type=float, default=60.0, help="Son adımda bekleme süresi (sn)")
+    ap.add_argument("--pid", type=int, default=0, help="RSS ölçülecek uvicorn worker pid")
+    args = ap.parse_args()
+
+    url = f"{args.url}?token={args.token}"
+    stop = asyncio.Event()
+    opened: list = []
+    failed: list = []
+    tasks = []
+    base_rss = _rss_kb(args.pid)
+    print(f"başlangıç RSS: {base_rss} kB")
+
+    while len(tasks) < args.count:
+        batch = min(args.step, args.count - len(tasks))
+        started = time.monotonic()
+        for _ in range(batch):
+            tasks.append(asyncio.create_task(_idle_client(url, stop, opened, failed)))
+        while len(opened) + len(failed) < len(tasks):
+            await asyncio.sleep(0.2)
+        rss = _rss_kb(args.pid)
+        per_conn = (rss - base_rss) / max(1, len(opened))
+        print(
+            f"açık={len(opened)} hata={len(failed)} süre={time.monotonic() - started:.1f}s "
+            f"RSS={rss} kB (~{per_conn:.1f} kB/bağlantı)"
+        )
+
+    await asyncio.sleep(args.hold)
+    print(f"bekleme sonrası: açık={len(opened) - len(failed)} RSS={_rss_kb(args.pid)} kB")
+    stop.set()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
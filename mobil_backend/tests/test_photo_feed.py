@@ -0,0 +1,66 @@
+from app.routers import photos
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql, params=None):
+        self.conn.statements.append(sql)
+
+    def fetchone(self):
+        return self.conn.row
+
+    def fetchall(self):
+        return []
+
+
+class _FakeConn:
+    def __init__(self, row):
+        self.row = row
+        self.statements = []
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+
+def _feed_row(account_id):
+    return {
+        "account_id": account_id,
+        "albums": [{"slug": "gala", "name": "Gala", "file_path": "", "photo_count": 3, "like_count": 2, "liked_by_me": True}],
+        "latest": [{"id": 7, "slug": "gala", "event_name": "Gala", "file_path": "", "like_count": 1, "liked_by_me": False}],
+    }
+
+
+def test_feed_is_a_single_statement(monkeypatch):
+    monkeypatch.setattr(photos, "_like_cache_ready", lambda: False)
+    conn = _FakeConn(_feed_row(42))
+
+    feed = photos._feed(conn, "token", albums_limit=10, latest_limit=10)
+
+    assert len(conn.statements) == 1
+    assert feed["account_id"] == 42
+    assert feed["albums"][0]["liked_by_me"] is True
+    assert feed["latest"][0]["liked_by_me"] is False
+
+
+def test_feed_with_cold_like_cache_is_a_single_statement(monkeypatch):
+    # Üretimdeki yol: listener bağlı, hesabın beğeni önbelleği boş.
+    monkeypatch.setattr(photos, "_like_cache_ready", lambda: True)
+    monkeypatch.setattr(photos, "_LIKE_CACHE", photos.OrderedDict())
+    conn = _FakeConn(_feed_row(42))
+
+    feed = photos._feed(conn, "token", albums_limit=10, latest_limit=10)
+
+    assert len(conn.statements) == 1
+    assert feed["albums"][0]["liked_by_me"] is True
+    assert feed["latest"][0]["liked_by_me"] is False
+
+
+def test_feed_anonymous_is_a_single_statement(monkeypatch):
+    monkeypatch.setattr(photos, "_like_cache_ready", lambda: True)
+    conn = _FakeConn(_feed_row(None))
+
+    photos._feed(conn, "", albums_limit=10, latest_limit=10)
+
+    assert len(conn.statements) == 1